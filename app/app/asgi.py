@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# build the OpenAPI schema before the first request needs it
+from core.schema import warm_schema  # noqa: E402
+warm_schema()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +49,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.instrumentation.QueryInstrumentationMiddleware',
+    'core.db.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,15 +84,113 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# The core backends keep connections open for DB_CONN_MAX_AGE seconds and
+# check a reused connection with a cheap query before a request uses it,
+# so a connection dropped by a failover is replaced instead of failing the
+# request. Their metrics are served at /api/health/db/.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'NAME': os.environ.get('DB_NAME', 'postgres'),
         'USER': os.environ.get('DB_USER', 'user'),
         'PASSWORD': os.environ.get('DB_PASS', 'password'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            # notice dead peers of idle persistent connections
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10,
+            'keepalives_count': 3,
+        },
+    }
+}
+
+# Read replicas, DB_REPLICA_HOSTS=host1,host2 adds the replica1, replica2
+# aliases, the tests read them from the test database
+READ_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(f'replica{number}')
+
+# DB_ENGINE=sqlite runs the project and its tests without postgres,
+# DB_REPLICA_NAMES=replica.sqlite3 adds SQLite files standing in for
+# replicas, they aren't replicated so they only receive what's written
+# to them, e.g. by `migrate --database replica1` or the tests. Only
+# core.tests.test_routers is meant to run in that mode, the other tests
+# may only query the default database, which safe requests don't read:
+# DB_ENGINE=sqlite DB_REPLICA_NAMES=replica.sqlite3 python manage.py test core.tests.test_routers
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
+    READ_REPLICAS = []
+    for number, name in enumerate(filter(None, os.environ.get('DB_REPLICA_NAMES', '').split(',')), 1):
+        DATABASES[f'replica{number}'] = {'ENGINE': 'core.db.backends.sqlite3', 'NAME': name}
+        READ_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Reads of a user stay on the primary for this long after they write
+READ_REPLICA_PIN_SECONDS = int(os.environ.get('READ_REPLICA_PIN_SECONDS', 10))
+READ_REPLICA_PIN_COOKIE = 'read_primary_until'
+# Cache of the pins, it must be shared by every process serving the API,
+# checked by the core.E001 system check when READ_REPLICAS is set
+READ_REPLICA_PIN_CACHE_ALIAS = 'replica-pins'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # resolved auth tokens, shared between processes in production so a
+    # revoked token is dropped everywhere at once
+    # e.g. with AUTH_TOKEN_CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+    'auth': {
+        'BACKEND': os.environ.get('AUTH_TOKEN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('AUTH_TOKEN_CACHE_LOCATION', 'auth-tokens'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)),
+        },
+    },
+    # rendered recipe and tag reads, shared between processes in production
+    # e.g. with RESPONSE_CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+    'responses': {
+        'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'recipe-responses'),
+        'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+    },
+    # read-your-writes pins of the replica router, shared between processes
+    # e.g. with READ_REPLICA_PIN_CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+    'replica-pins': {
+        'BACKEND': os.environ.get('READ_REPLICA_PIN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('READ_REPLICA_PIN_CACHE_LOCATION', 'replica-pins'),
+    },
 }
+if os.environ.get('DB_ENGINE') == 'sqlite' and READ_REPLICAS and 'READ_REPLICA_PIN_CACHE_BACKEND' not in os.environ:
+    # the processes of a machine running the SQLite stand-ins share files
+    CACHES['replica-pins'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'recipe-replica-pins'),
+    }
+
+AUTH_TOKEN_CACHE_ALIAS = 'auth'
+# bounds how long another process may keep serving a revoked or
+# deactivated token, the signals only clear the cache of the process
+# that made the change, so it stays a few seconds unless the cache is shared
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get(
+    'AUTH_TOKEN_CACHE_TIMEOUT', 60 if 'AUTH_TOKEN_CACHE_BACKEND' in os.environ else 5
+))
+
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
 
 
 # Password validation
@@ -109,6 +211,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Passwords are hashed by a pool of worker processes, see core.hashing.
+# Stored hashes are upgraded to the first hasher on login.
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+# Hashes running or waiting before logins and signups answer 503
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 16))
+PASSWORD_HASHING_TIMEOUT = int(os.environ.get('PASSWORD_HASHING_TIMEOUT', 10))
+# Bulk user creation hashes this many passwords per task, on at most this
+# many workers, leaving the others to logins and signups
+PASSWORD_HASHING_BULK_CHUNK_SIZE = int(os.environ.get('PASSWORD_HASHING_BULK_CHUNK_SIZE', 4))
+PASSWORD_HASHING_BULK_WORKERS = int(
+    os.environ.get('PASSWORD_HASHING_BULK_WORKERS', max(PASSWORD_HASHING_WORKERS - 1, 1))
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -137,3 +252,68 @@ AUTH_USER_MODEL = 'core.User'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
+
+# Response compression, in the order of preference of the server, br and
+# zstd are used when the brotli and zstandard packages are installed
+COMPRESSION_ENCODINGS = ('br', 'zstd', 'gzip')
+# Smaller bodies aren't worth the CPU and the encoding headers
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# How /api/schema/ is built: 'off' introspects the API on every request,
+# 'memory' once per process, at startup or on the first request, and
+# 'file' loads SCHEMA_FILE written by the build_schema command
+SCHEMA_PRECOMPUTE = os.environ.get('SCHEMA_PRECOMPUTE', 'memory')
+SCHEMA_FILE = os.environ.get('SCHEMA_FILE', BASE_DIR / 'openapi-schema.json')
+
+# Page size of the recipe list, clients may ask for up to the max page size
+RECIPE_PAGE_SIZE = int(os.environ.get('RECIPE_PAGE_SIZE', 100))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 1000))
+# Largest list accepted by the bulk recipe endpoint
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 500))
+# Rows read per database round trip by the recipe export
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000))
+# Largest list accepted by the bulk user endpoint
+USER_BULK_MAX_ITEMS = int(os.environ.get('USER_BULK_MAX_ITEMS', 1000))
+# Recipes or tags deleted per transaction when an account is deleted
+ACCOUNT_DELETION_BATCH_SIZE = int(os.environ.get('ACCOUNT_DELETION_BATCH_SIZE', 500))
+# Most used tags listed by the recipe statistics
+RECIPE_STATS_TOP_TAGS = int(os.environ.get('RECIPE_STATS_TOP_TAGS', 20))
+
+# Background jobs, run by the run_jobs command: seconds a worker holds a
+# job before another may take it over, and the delay before the first
+# retry of a failed job, doubled on every failure up to the max delay
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 10))
+JOB_RETRY_MAX_DELAY = int(os.environ.get('JOB_RETRY_MAX_DELAY', 3600))
+
+# Admin changelists of at least this many rows show the query planner's
+# estimate instead of counting them, on postgres
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.environ.get('ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000))
+
+# Serve the recipe and tag reads from async views, for ASGI deployments
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '0') == '1'
+# Threads running the queries of async views, each holds a connection
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', 8))
+
+# Return the query count and database time in the Server-Timing and
+# X-DB-Queries headers
+QUERY_INSTRUMENTATION_HEADERS = os.environ.get('QUERY_INSTRUMENTATION_HEADERS', '0') == '1'
+# Largest number of queries a request to the route may run, per method
+# or for every method, exceeding it logs a warning, or raises when
+# QUERY_BUDGET_STRICT is set as in tests. The budgets include the token
+# lookup on an authentication cache miss.
+QUERY_BUDGETS = {
+    'user:create': 3,
+    # the first login after a hasher change also saves the upgraded hash
+    'user:token': 7,
+    'user:me': {'GET': 2, 'PUT': 5, 'PATCH': 5, 'DELETE': 10},
+    'user:deletion': {'GET': 2},
+    'user:bulk': {'POST': 7},
+    'recipe:recipe-list': {'GET': 4, 'POST': 12},
+    'recipe:recipe-detail': {'GET': 4, 'PUT': 13, 'PATCH': 13, 'DELETE': 6},
+    'recipe:recipe-bulk': {'POST': 11, 'PATCH': 12, 'DELETE': 9},
+    'recipe:tag-list': {'GET': 3},
+    'recipe:tag-popular': {'GET': 3},
+    'recipe:recipe-stats': {'GET': 5},
+}
+QUERY_BUDGET_STRICT = False
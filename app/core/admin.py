@@ -1,16 +1,95 @@
 """
 Django adming Customization
 """
+import json
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from core import models
 from django.utils.translation import gettext_lazy as _
+from recipe.search import get_search_backend
+
+
+def estimate_count(queryset):
+    """Return the query planner's estimate of the rows of a queryset, None without one"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.order_by().query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator trusting the planner's row estimate on large changelists.
+
+    Counting millions of rows scans the table or its index on every page,
+    the estimate of EXPLAIN is used instead once it reaches
+    ADMIN_ESTIMATED_COUNT_THRESHOLD rows, below it the rows are counted.
+    Backends without estimates always count.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000):
+            return super().count
+        return estimate
+
+
+class FastChangeListMixin:
+    """Changelists paginated on estimates, without counting the whole table again when filtered"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class OwnerFilter(admin.SimpleListFilter):
+    """
+    Filter by owner without listing every user.
 
+    Only the selected owner is shown, owners are picked from the links of
+    the user changelist.
+    """
+    title = _('owner')
+    parameter_name = 'owner'
 
-class UserAdmin(BaseUserAdmin):
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value:
+            return []
+        email = models.User.objects.filter(pk=value).values_list('email', flat=True).first() \
+            if value.isdigit() else None
+        # an unknown owner still filters, to nothing
+        return [(value, email or value)]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        return queryset.filter(user_id=value) if value.isdigit() else queryset.none()
+
+
+class UserAdmin(FastChangeListMixin, BaseUserAdmin):
     """Define user admin pages"""
     ordering = ['id']
-    list_display = ['email', 'name']
+    list_display = ['email', 'name', 'is_active', 'recipes']
+    # prefix searches, served by core_user_email_prefix_idx
+    search_fields = ['^email']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (
@@ -44,8 +123,52 @@ class UserAdmin(BaseUserAdmin):
         ),
     )
 
+    @admin.display(description=_('Recipes'))
+    def recipes(self, user):
+        url = reverse('admin:core_recipe_changelist')
+        return format_html('<a href="{}?{}={}">{}</a>', url, OwnerFilter.parameter_name, user.pk, _('Recipes'))
+
+
+class RecipeAdmin(FastChangeListMixin, admin.ModelAdmin):
+    """Recipe admin pages for tables of any size"""
+    ordering = ['-id']
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    list_select_related = ['user']
+    list_filter = [OwnerFilter]
+    # users and tags are picked by id rather than from a list of all of them
+    raw_id_fields = ['user', 'tags']
+    search_fields = ['title', 'description']
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search with the full text search of the API, indexed on postgres"""
+        if not search_term.strip():
+            return queryset, False
+        return get_search_backend().search(queryset, search_term.strip()), False
+
+
+class TagAdmin(FastChangeListMixin, admin.ModelAdmin):
+    """Tag admin pages for tables of any size"""
+    ordering = ['-id']
+    list_display = ['name', 'user', 'usage']
+    list_select_related = ['user']
+    list_filter = [OwnerFilter]
+    raw_id_fields = ['user']
+    # prefix searches, served by core_tag_name_prefix_idx
+    search_fields = ['^name']
+
+
+class JobAdmin(FastChangeListMixin, admin.ModelAdmin):
+    """Follow the background jobs, they are only changed by the workers"""
+    ordering = ['-id']
+    list_display = ['id', 'kind', 'status', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = [
+        'kind', 'payload', 'status', 'progress', 'attempts', 'max_attempts', 'run_after',
+        'locked_until', 'locked_by', 'last_error', 'created_at', 'updated_at', 'finished_at',
+    ]
+
 
 admin.site.register(models.User, UserAdmin)
-# if didn't pass the second argument, it will use the default admin which is Model.Recipe in this case
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
+admin.site.register(models.Job, JobAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, TagAdmin)
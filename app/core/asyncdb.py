@@ -0,0 +1,63 @@
+"""
+Database access from async views
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+
+_executor = None
+
+
+def get_executor():
+    """Return the thread pool running the queries of async views"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'ASYNC_DB_THREADS', 8), thread_name_prefix='async-db'
+        )
+    return _executor
+
+
+def shutdown_executor():
+    """Close the persistent connections of the pool threads and stop them"""
+    global _executor
+    executor, _executor = _executor, None
+    if executor is None:
+        return
+    workers = getattr(settings, 'ASYNC_DB_THREADS', 8)
+    # every thread blocks on the barrier, so each one runs a single close
+    barrier = threading.Barrier(workers)
+
+    def close():
+        connections.close_all()
+        barrier.wait(timeout=5)
+    for _ in range(workers):
+        executor.submit(close)
+    executor.shutdown(wait=True)
+
+
+def _run(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def database_sync_to_async(func):
+    """
+    Wrap a sync function touching the database for use in async code.
+
+    Django 3.2 has no async ORM, so the function runs on a dedicated pool
+    of ASYNC_DB_THREADS threads instead of the single thread shared by
+    every thread sensitive call. Queries of different requests run
+    concurrently, at most one database connection per thread is held and
+    expired connections are closed around every call like at the start
+    and end of a sync request.
+    """
+    return SyncToAsync(functools.partial(_run, func), thread_sensitive=False, executor=get_executor())
@@ -0,0 +1,125 @@
+"""
+Authentication shared by the API apps
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from core.asyncdb import database_sync_to_async
+from core.db import routers
+
+
+def get_token_cache():
+    """Return the cache holding resolved tokens"""
+    return caches[getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def token_cache_key(key):
+    """Return the cache key of a token, never storing the raw token"""
+    return 'auth-token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def invalidate_tokens(keys):
+    """Drop the given token keys from the token cache"""
+    keys = [token_cache_key(key) for key in keys]
+    if keys:
+        get_token_cache().delete_many(keys)
+
+
+def authenticated_user(user_id):
+    """
+    Return the user of a cached token, with every field but the id deferred.
+
+    Filtering on the user costs no query, other fields are loaded from the
+    database when first read, so nothing stale is read or saved back.
+    """
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, ['id'], [user_id])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps resolved tokens in a cache.
+
+    Repeat callers are authenticated without the Token + User join. Only
+    the user id and whether the user is active are cached, the user is
+    returned with its other fields deferred, read from the database when
+    used, since other processes may have changed them meanwhile.
+    Entries expire after AUTH_TOKEN_CACHE_TIMEOUT seconds and are dropped
+    by the signals in core.signals when a token is deleted or regenerated,
+    or when its user is saved. With the default per process cache the
+    signals only reach the process that made the change, the others keep
+    accepting a revoked token until their entry expires, a few seconds by
+    default, a shared AUTH_TOKEN_CACHE_BACKEND revokes it everywhere. `aauthenticate` is the same for async
+    views, it only leaves the event loop for the query on a cache miss.
+    Tokens missing from a read replica are looked up on the primary, and
+    the reads of users who wrote recently are sent to the primary.
+    """
+
+    def authenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return self.authenticate_credentials(key)
+
+    def authenticate_credentials(self, key):
+        cached = get_token_cache().get(token_cache_key(key))
+        if cached is None:
+            return self._load_token(key)
+        return self._cached_credentials(key, cached)
+
+    def _cached_credentials(self, key, cached):
+        user_id, is_active = cached
+        if not is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        routers.user_authenticated(user_id)
+        token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id'], [key, user_id])
+        return (authenticated_user(user_id), token)
+
+    def _load_token(self, key):
+        # inactive users raise here, so they never reach the cache
+        try:
+            user, token = super().authenticate_credentials(key)
+        except exceptions.AuthenticationFailed:
+            if not routers.reading_from_replica():
+                raise
+            # the token may be too recent for the replica
+            with routers.use_primary():
+                user, token = super().authenticate_credentials(key)
+        get_token_cache().set(
+            token_cache_key(key), (user.id, user.is_active), getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 5)
+        )
+        routers.user_authenticated(user.id)
+        return (user, token)
+
+    async def aauthenticate(self, request):
+        """Async version of `authenticate`"""
+        key = self.get_key(request)
+        if key is None:
+            return None
+        cached = get_token_cache().get(token_cache_key(key))
+        if cached is None:
+            return await database_sync_to_async(self._load_token)(key)
+        return self._cached_credentials(key, cached)
+
+    def get_key(self, request):
+        """Return the token of the Authorization header, None without one"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        elif len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.')
+            )
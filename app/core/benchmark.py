@@ -0,0 +1,207 @@
+"""
+Benchmark scenarios for the API endpoints
+"""
+import itertools
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import CollectionVersion, Recipe, Tag
+
+
+PASSWORD = 'benchmark-pass'
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+class Fixture:
+    """Seeded users, tags and recipes the scenarios run against"""
+
+    def __init__(self, run_id, users, recipes_per_user, tags_per_user):
+        self.domain = f'bench{run_id}.example.com'
+        self.users = users
+        self.recipes_per_user = recipes_per_user
+        self.tags_per_user = tags_per_user
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def next(self):
+        """Return a number unique to the run"""
+        with self.lock:
+            return next(self.counter)
+
+    def seed(self):
+        """Create the data with bulk inserts, one password hash for all users"""
+        User = get_user_model()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(email=f'user{i}@{self.domain}', name=f'User {i}', password=password)
+            for i in range(self.users)
+        ])
+        users = list(User.objects.filter(email__endswith='@' + self.domain).order_by('id'))
+        tokens = [Token(user=user, key=Token.generate_key()) for user in users]
+        Token.objects.bulk_create(tokens)
+        Tag.objects.bulk_create([
+            Tag(user=user, name=f'Tag {i}') for user in users for i in range(self.tags_per_user)
+        ])
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user, title=f'Recipe {i}', time_minutes=5 + i % 120, price=Decimal(i % 10000) / 100,
+                link=f'https://example.com/{i}', description=f'Benchmark recipe {i}',
+            )
+            for user in users for i in range(self.recipes_per_user)
+        ], batch_size=1000)
+        tags = {}
+        for tag_id, user_id in Tag.objects.filter(user__in=users).values_list('id', 'user_id'):
+            tags.setdefault(user_id, []).append(tag_id)
+        recipes = {}
+        for recipe_id, user_id in Recipe.objects.filter(user__in=users).values_list('id', 'user_id'):
+            recipes.setdefault(user_id, []).append(recipe_id)
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe_id, tag_id=tags[user_id][(recipe_id + j) % len(tags[user_id])])
+            for user_id, ids in recipes.items()
+            for recipe_id in ids
+            for j in range(min(2, len(tags.get(user_id, ()))))
+        ], batch_size=5000)
+        self.accounts = [
+            {'email': user.email, 'token': token.key, 'recipes': recipes.get(user.id, [])}
+            for user, token in zip(users, tokens)
+        ]
+
+    def account(self):
+        return self.accounts[self.next() % len(self.accounts)]
+
+    def cleanup(self):
+        """Delete everything created by the run"""
+        with CollectionVersion.objects.deferred():
+            get_user_model().objects.filter(email__endswith='@' + self.domain).delete()
+
+
+class Scenario:
+    """A request to one endpoint, built for every iteration"""
+
+    def __init__(self, name, method, build, authenticated=True, expected=200):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.authenticated = authenticated
+        self.expected = expected
+
+    def request(self, client, fixture):
+        account = fixture.account()
+        url, data = self.build(fixture, account)
+        headers = {'HTTP_AUTHORIZATION': f'Token {account["token"]}'} if self.authenticated else {}
+        if self.method == 'get':
+            return client.get(url, data, **headers)
+        return getattr(client, self.method)(url, data, content_type='application/json', **headers)
+
+
+def _recipe_detail(fixture, account):
+    recipe_id = account['recipes'][fixture.next() % len(account['recipes'])]
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+SCENARIOS = [
+    Scenario('user_create', 'post', lambda fixture, account: (reverse('user:create'), {
+        'email': f'new{fixture.next()}@{fixture.domain}', 'password': PASSWORD, 'name': 'New',
+    }), authenticated=False, expected=201),
+    Scenario('token_obtain', 'post', lambda fixture, account: (reverse('user:token'), {
+        'email': account['email'], 'password': PASSWORD,
+    }), authenticated=False),
+    Scenario('me', 'get', lambda fixture, account: (reverse('user:me'), None)),
+    Scenario('recipe_list', 'get', lambda fixture, account: (reverse('recipe:recipe-list'), None)),
+    Scenario('recipe_detail', 'get', lambda fixture, account: (_recipe_detail(fixture, account), None)),
+    Scenario('recipe_create', 'post', lambda fixture, account: (reverse('recipe:recipe-list'), {
+        'title': f'Created {fixture.next()}', 'time_minutes': 20, 'price': '7.50',
+        'description': 'Created by the benchmark', 'tags': [{'name': 'Tag 0'}, {'name': 'New tag'}],
+    }), expected=201),
+    Scenario('recipe_update', 'patch', lambda fixture, account: (_recipe_detail(fixture, account), {
+        'title': f'Updated {fixture.next()}', 'price': '8.25',
+    })),
+    Scenario('tag_list', 'get', lambda fixture, account: (reverse('recipe:tag-list'), None)),
+]
+
+
+def run_scenario(scenario, fixture, requests, concurrency, warmup):
+    """Run the scenario and return its throughput, latencies and query counts"""
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    def worker(count):
+        # server errors are counted, not raised
+        client = Client(raise_request_exception=False)
+        latencies, queries, errors = [], [], 0
+        try:
+            for _ in range(warmup):
+                scenario.request(client, fixture)
+            for _ in range(count):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    response = scenario.request(client, fixture)
+                    latencies.append(time.perf_counter() - started)
+                queries.append(len(ctx.captured_queries))
+                errors += response.status_code != scenario.expected
+        finally:
+            if concurrency > 1:
+                connections.close_all()
+        return latencies, queries, errors
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        outcomes = [worker(requests)]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            outcomes = list(executor.map(worker, per_worker))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    queries = [count for outcome in outcomes for count in outcome[1]]
+    return {
+        'requests': len(latencies),
+        'errors': sum(outcome[2] for outcome in outcomes),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_median': statistics.median(queries) if queries else 0,
+        'queries_max': max(queries, default=0),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return the regressions of the results against a baseline run"""
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p95 {previous["p95_ms"]} ms -> {current["p95_ms"]} ms')
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append(
+                f'{name}: throughput {previous["throughput_rps"]} -> {current["throughput_rps"]} req/s'
+            )
+        # query counts are deterministic, any increase is a regression
+        if current['queries_max'] > previous['queries_max']:
+            regressions.append(f'{name}: queries {previous["queries_max"]} -> {current["queries_max"]}')
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f'{name}: errors {previous.get("errors", 0)} -> {current["errors"]}')
+    return regressions
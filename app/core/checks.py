@@ -0,0 +1,23 @@
+"""
+System checks of the core settings
+"""
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+from core.db import routers
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Pins kept per process don't keep the reads of other processes on the primary"""
+    if not routers.get_replicas():
+        return []
+    if isinstance(routers.get_pin_cache(), (LocMemCache, DummyCache)):
+        return [Error(
+            'READ_REPLICAS is set but the READ_REPLICA_PIN_CACHE_ALIAS cache is not shared between processes.',
+            hint='Point the cache at a shared backend, e.g. with READ_REPLICA_PIN_CACHE_BACKEND and '
+                 'READ_REPLICA_PIN_CACHE_LOCATION, so clients read their own writes on every worker.',
+            id='core.E001',
+        )]
+    return []
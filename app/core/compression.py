@@ -0,0 +1,213 @@
+"""
+Response compression negotiated from Accept-Encoding
+"""
+import asyncio
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def _compressobj(self):
+        # wbits 31 writes the gzip header and trailer
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        compressor = self._compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self, chunks):
+        compressor = self._compressobj()
+        for chunk in chunks:
+            # flushed per chunk, clients get every chunk as it is produced
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ZstdEncoder:
+    name = 'zstd'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+# the encodings with their default level, in the order of preference of
+# the server when the client accepts several equally
+ENCODERS = {
+    'br': (BrotliEncoder, 4, lambda: brotli is not None),
+    'zstd': (ZstdEncoder, 3, lambda: zstandard is not None),
+    'gzip': (GzipEncoder, 6, lambda: True),
+}
+
+# already compressed, compressing them again only costs time
+INCOMPRESSIBLE_TYPES = (
+    'image/', 'audio/', 'video/', 'font/woff', 'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/zstd', 'application/x-bzip2', 'application/x-7z-compressed', 'application/pdf',
+)
+
+
+def get_encoders():
+    """Return the available encoders of COMPRESSION_ENCODINGS, by preference"""
+    levels = getattr(settings, 'COMPRESSION_LEVELS', {})
+    encoders = []
+    for name in getattr(settings, 'COMPRESSION_ENCODINGS', ('br', 'zstd', 'gzip')):
+        encoder_class, level, available = ENCODERS[name]
+        if available():
+            encoders.append(encoder_class(levels.get(name, level)))
+    return encoders
+
+
+def parse_accept_encoding(header):
+    """Return the quality of every coding of an Accept-Encoding header"""
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _sep, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def negotiate_encoder(header, encoders):
+    """Return the encoder the client prefers, the server's preference breaking ties"""
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoder in encoders:
+        quality = qualities.get(encoder.name, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoder, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the best encoding accepted by the client.
+
+    Brotli and zstd are offered when the `brotli` and `zstandard` packages
+    are installed, gzip always. Bodies under COMPRESSION_MIN_SIZE bytes,
+    already encoded responses and compressed media types are sent as
+    they are, and the compressed body is only used when it is smaller.
+    Streaming responses are compressed chunk by chunk as they are sent.
+    Bodies of the response cache are compressed once and kept in the
+    cache next to the uncompressed entry, under the same version.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        # the representation depends on Accept-Encoding, even uncompressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not self.compressible(request, response):
+            return response
+        encoder = negotiate_encoder(request.META.get('HTTP_ACCEPT_ENCODING', ''), get_encoders())
+        if encoder is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = encoder.stream(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = self.compress(response, encoder)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoder.name
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # the bytes differ from the identity encoding, like GZipMiddleware
+            response['ETag'] = 'W/' + etag
+        return response
+
+    @staticmethod
+    def compressible(request, response):
+        if response.has_header('Content-Encoding') or request.method == 'HEAD':
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.get('Content-Type', '').split(';')[0].strip().lower().startswith(INCOMPRESSIBLE_TYPES):
+            return False
+        return response.streaming or len(response.content) >= getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    @staticmethod
+    def compress(response, encoder):
+        # set by recipe.caching.ResponseCacheMixin on cached bodies
+        cache = getattr(response, 'response_cache', None)
+        if cache is None:
+            return encoder.compress(response.content)
+        key = f'{response.response_cache_key}:{encoder.name}'
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = encoder.compress(response.content)
+            cache.set(key, compressed)
+        return compressed
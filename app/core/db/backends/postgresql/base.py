@@ -0,0 +1,10 @@
+"""
+PostgreSQL backend reusing health checked connections
+"""
+from django.db.backends.postgresql import base
+
+from core.db.connections import HealthCheckedConnectionMixin
+
+
+class DatabaseWrapper(HealthCheckedConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,10 @@
+"""
+SQLite backend with the connection metrics of the PostgreSQL one
+"""
+from django.db.backends.sqlite3 import base
+
+from core.db.connections import HealthCheckedConnectionMixin
+
+
+class DatabaseWrapper(HealthCheckedConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,146 @@
+"""
+Persistent database connections with health checks and metrics
+"""
+import threading
+import time
+import weakref
+
+from django.utils.asyncio import async_unsafe
+
+
+class ConnectionMetrics:
+    """Process wide counters of the connections of every database alias"""
+
+    counters = (
+        'checkouts', 'reused', 'connections_opened', 'connections_closed',
+        'health_checks', 'health_check_failures', 'errors',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wrappers = weakref.WeakSet()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._aliases = {}
+
+    def _get(self, alias):
+        if alias not in self._aliases:
+            self._aliases[alias] = dict.fromkeys(self.counters, 0)
+            self._aliases[alias].update(wait_ms_total=0.0, wait_ms_max=0.0, age_at_checkout_s_max=0.0)
+        return self._aliases[alias]
+
+    def register(self, wrapper):
+        with self._lock:
+            self._wrappers.add(wrapper)
+
+    def increment(self, alias, name):
+        with self._lock:
+            self._get(alias)[name] += 1
+
+    def checkout(self, alias, wait, reused, age):
+        """Record a connection handed to a request, `wait` is the time it took"""
+        with self._lock:
+            metrics = self._get(alias)
+            metrics['checkouts'] += 1
+            metrics['reused'] += reused
+            metrics['wait_ms_total'] += wait * 1000
+            metrics['wait_ms_max'] = max(metrics['wait_ms_max'], wait * 1000)
+            metrics['age_at_checkout_s_max'] = max(metrics['age_at_checkout_s_max'], age)
+
+    def snapshot(self):
+        """Return the counters and the open connections of every alias"""
+        now = time.monotonic()
+        with self._lock:
+            aliases = {alias: dict(metrics) for alias, metrics in self._aliases.items()}
+            wrappers = list(self._wrappers)
+        for wrapper in wrappers:
+            if wrapper.connection is None or wrapper.connected_at is None:
+                continue
+            metrics = aliases.setdefault(wrapper.alias, {})
+            metrics['open'] = metrics.get('open', 0) + 1
+            metrics['oldest_s'] = max(metrics.get('oldest_s', 0.0), now - wrapper.connected_at)
+        for metrics in aliases.values():
+            metrics.setdefault('open', 0)
+            metrics.setdefault('oldest_s', 0.0)
+            for name in ('wait_ms_total', 'wait_ms_max', 'age_at_checkout_s_max', 'oldest_s'):
+                if name in metrics:
+                    metrics[name] = round(metrics[name], 3)
+        return aliases
+
+
+metrics = ConnectionMetrics()
+
+
+def get_connection_metrics():
+    """Return the connection metrics of this process, by database alias"""
+    return metrics.snapshot()
+
+
+class HealthCheckedConnectionMixin:
+    """
+    Database wrapper reusing connections between requests safely.
+
+    With CONN_MAX_AGE the connection of a thread outlives the request,
+    so the TCP and authentication setup is paid once per CONN_MAX_AGE
+    seconds instead of once per request. The first use of a reused
+    connection in a request, or in a call of core.asyncdb, checks it
+    with a `SELECT 1` unless CONN_HEALTH_CHECKS is off, and a connection
+    that fails, e.g. after a database failover or an idle timeout, is
+    replaced by a new one instead of failing the request. Connections
+    with errors are still dropped at the end of the request by Django.
+    Checkouts, the time they took, connection ages and errors are
+    recorded in `metrics`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checked_out = False
+        self.connected_at = None
+        metrics.register(self)
+
+    @property
+    def health_checks_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', True) and self.settings_dict['CONN_MAX_AGE'] != 0
+
+    def connect(self):
+        # setting up the new connection must not health check it
+        self.checked_out = True
+        super().connect()
+        self.connected_at = time.monotonic()
+        metrics.increment(self.alias, 'connections_opened')
+
+    @async_unsafe
+    def ensure_connection(self):
+        if self.checked_out and self.connection is not None:
+            return
+        started = time.perf_counter()
+        reused = self.connection is not None
+        if reused and self.health_checks_enabled and not self.in_atomic_block:
+            metrics.increment(self.alias, 'health_checks')
+            if not self.is_usable():
+                metrics.increment(self.alias, 'health_check_failures')
+                self.close()
+                reused = False
+        try:
+            super().ensure_connection()
+        except Exception:
+            metrics.increment(self.alias, 'errors')
+            raise
+        age = time.monotonic() - self.connected_at if reused and self.connected_at else 0.0
+        metrics.checkout(self.alias, time.perf_counter() - started, reused, age)
+        self.checked_out = True
+
+    def close_if_unusable_or_obsolete(self):
+        # called when a request starts and ends, the next use is a checkout
+        self.checked_out = False
+        if self.connection is not None and self.errors_occurred:
+            metrics.increment(self.alias, 'errors')
+        super().close_if_unusable_or_obsolete()
+
+    def _close(self):
+        if self.connection is not None:
+            metrics.increment(self.alias, 'connections_closed')
+            self.connected_at = None
+        return super()._close()
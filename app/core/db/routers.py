@@ -0,0 +1,165 @@
+"""
+Read replica routing with read-your-writes stickiness
+"""
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+
+# routing of the request being handled, None outside requests
+_routing = ContextVar('read_routing', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def get_replicas():
+    """Return the aliases of the read replicas"""
+    return getattr(settings, 'READ_REPLICAS', [])
+
+
+def get_pin_seconds():
+    return getattr(settings, 'READ_REPLICA_PIN_SECONDS', 10)
+
+
+def get_pin_cache():
+    return caches[getattr(settings, 'READ_REPLICA_PIN_CACHE_ALIAS', 'replica-pins')]
+
+
+def get_pin_cookie():
+    return getattr(settings, 'READ_REPLICA_PIN_COOKIE', 'read_primary_until')
+
+
+def pin_cache_key(user_id):
+    return f'read-primary:{user_id}'
+
+
+class ReadRouting:
+    """Whether the reads of a request may go to a replica"""
+
+    def __init__(self, replica_allowed):
+        self.replica_allowed = replica_allowed
+
+
+def reading_from_replica():
+    """Return whether reads are currently sent to a replica"""
+    routing = _routing.get()
+    return routing is not None and routing.replica_allowed and bool(get_replicas())
+
+
+@contextmanager
+def use_primary():
+    """Send the reads of the block to the primary"""
+    token = _routing.set(ReadRouting(replica_allowed=False))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def pin_user(user_id):
+    """Keep the reads of a user on the primary while their writes replicate"""
+    get_pin_cache().set(pin_cache_key(user_id), True, get_pin_seconds())
+
+
+def user_authenticated(user_id):
+    """Send the reads of the request to the primary if the user wrote recently"""
+    routing = _routing.get()
+    if routing is None or not routing.replica_allowed or not get_replicas():
+        return
+    if get_pin_cache().get(pin_cache_key(user_id)):
+        routing.replica_allowed = False
+
+
+class ReplicaRouter:
+    """
+    Route the reads of safe requests to a random READ_REPLICAS alias.
+
+    Everything else reads from and writes to the primary: unsafe
+    requests, management commands and the requests of users who wrote in
+    the last READ_REPLICA_PIN_SECONDS, so nobody reads their own writes
+    stale. ReplicaRoutingMiddleware decides per request.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return random.choice(get_replicas())
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # instances read from a replica are saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let the router send the reads of safe requests to replicas.
+
+    A successful unsafe request pins the reads of its user to the
+    primary for READ_REPLICA_PIN_SECONDS: in the pin cache, checked when
+    the token is authenticated, and in the READ_REPLICA_PIN_COOKIE
+    cookie for clients that keep cookies, which also covers processes
+    not sharing the cache.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _routing.set(ReadRouting(self.replica_allowed(request)))
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        token = _routing.set(ReadRouting(self.replica_allowed(request)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.process_response(request, response)
+
+    @staticmethod
+    def replica_allowed(request):
+        if request.method not in SAFE_METHODS:
+            return False
+        try:
+            pinned_until = float(request.COOKIES.get(get_pin_cookie(), 0))
+        except ValueError:
+            return True
+        # the cookie can't pin a client for longer than the window
+        return not time.time() < pinned_until <= time.time() + get_pin_seconds()
+
+    def process_response(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not get_replicas():
+            return response
+        pin_seconds = get_pin_seconds()
+        response.set_cookie(
+            get_pin_cookie(), str(time.time() + pin_seconds),
+            max_age=pin_seconds, httponly=True, samesite='Lax',
+        )
+        # set on the django request by DRF after authentication
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_user(user.id)
+        return response
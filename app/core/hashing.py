@@ -0,0 +1,207 @@
+"""
+Password hashing on a bounded pool of worker processes
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+
+
+class HashingUnavailable(exceptions.APIException):
+    """The hashing pool is full or didn't answer in time"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many password checks in progress, try again shortly.')
+    default_code = 'hashing_unavailable'
+    # sent as Retry-After by the DRF exception handler
+    wait = 1
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _make_passwords(passwords):
+    return [hashers.make_password(password) for password in passwords]
+
+
+def _check_password(password, encoded):
+    """
+    Return whether the password matches, and its new hash when the stored
+    one isn't from the preferred hasher or its settings changed.
+    """
+    if encoded is None or not hashers.is_password_usable(encoded):
+        return False, None
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False, None
+    is_correct = hasher.verify(password, encoded)
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    if not is_correct and not hasher_changed and must_update:
+        # same as django's check_password, hide how outdated the hash is
+        hasher.harden_runtime(password, encoded)
+    if is_correct and must_update:
+        return True, hashers.make_password(password)
+    return is_correct, None
+
+
+class HashingPool:
+    """
+    Run password hashing away from the request threads.
+
+    At most PASSWORD_HASHING_WORKERS processes hash at once, and at most
+    PASSWORD_HASHING_QUEUE hashes are running or waiting for a worker;
+    past that, or when a hash takes longer than PASSWORD_HASHING_TIMEOUT
+    seconds, HashingUnavailable is raised right away so a burst of logins
+    answers 503 instead of holding every request thread. With 0 workers
+    the hashes run on the calling thread, still bounded by the queue.
+    """
+
+    def __init__(self, workers, queue, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max(queue, 0))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def submit(self, func, *args):
+        """Start func on a worker, HashingUnavailable when the queue is full"""
+        if not self.slots.acquire(blocking=False):
+            raise HashingUnavailable()
+        try:
+            future = self.get_executor().submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # the slot is held until the worker is done, even after a timeout
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    def result(self, future, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            raise HashingUnavailable()
+        except BrokenProcessPool:
+            # a worker died, start a new pool for the next calls
+            self.shutdown(wait=False)
+            raise HashingUnavailable()
+
+    def run(self, func, *args):
+        if not self.workers:
+            if not self.slots.acquire(blocking=False):
+                raise HashingUnavailable()
+            try:
+                return func(*args)
+            finally:
+                self.slots.release()
+        return self.result(self.submit(func, *args), self.timeout)
+
+    def run_chunks(self, func, items, chunk_size, concurrency):
+        """
+        Run func on the items in chunks of chunk_size, with at most
+        concurrency chunks submitted at once, and return the concatenated
+        results. The hashes of other requests queue behind one small chunk
+        at most instead of a whole batch, and a concurrency below the
+        number of workers keeps workers free for them. Each chunk takes a
+        queue slot and gets the timeout once per item.
+        """
+        chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+        if not self.workers:
+            return [result for chunk in chunks for result in self.run(func, chunk)]
+        results = [None] * len(chunks)
+        pending = {}
+        submitted = 0
+        try:
+            while submitted < len(chunks) or pending:
+                while submitted < len(chunks) and len(pending) < concurrency:
+                    pending[self.submit(func, chunks[submitted])] = submitted
+                    submitted += 1
+                done, _not_done = wait(pending, timeout=self.timeout * chunk_size, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise HashingUnavailable()
+                for future in done:
+                    results[pending.pop(future)] = self.result(future, 0)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+        return [result for chunk in results for result in chunk]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the hashing pool configured by the settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2),
+                queue=getattr(settings, 'PASSWORD_HASHING_QUEUE', 16),
+                timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 10),
+            )
+        return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    """Start new workers after the hashing settings change, as tests do"""
+    global _pool
+    if setting.startswith('PASSWORD_HASH'):
+        with _pool_lock:
+            pool, _pool = _pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+def make_password(password):
+    """Hash a password on the pool, unusable passwords need no hashing"""
+    if password is None:
+        return hashers.make_password(None)
+    return get_hashing_pool().run(_make_password, password)
+
+
+def make_passwords(passwords):
+    """
+    Hash many passwords on the pool, in order.
+
+    The batch is hashed a few passwords at a time on at most
+    PASSWORD_HASHING_BULK_WORKERS workers, one less than the pool by
+    default, so logins and signups keep being answered meanwhile.
+    """
+    pool = get_hashing_pool()
+    return pool.run_chunks(
+        _make_passwords, list(passwords),
+        chunk_size=max(getattr(settings, 'PASSWORD_HASHING_BULK_CHUNK_SIZE', 4), 1),
+        concurrency=max(getattr(settings, 'PASSWORD_HASHING_BULK_WORKERS', pool.workers - 1), 1),
+    )
+
+
+def check_password(password, encoded):
+    """Return whether the password matches the hash and its upgraded hash, if any"""
+    if password is None:
+        return False, None
+    return get_hashing_pool().run(_check_password, password, encoded)
@@ -0,0 +1,144 @@
+"""
+Per-request query instrumentation and query budgets
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+logger = logging.getLogger('core.queries')
+
+# stats of the request being handled, context variables follow the
+# request into the threads of sync_to_async
+active_query_stats = ContextVar('active_query_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more queries than the budget of its route"""
+
+
+class QueryStats:
+    """Count, time and duplicates of the queries run by one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        """Number of queries repeating an earlier one with the same parameters"""
+        return sum(count - 1 for count in self.statements.values())
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_time_ms': round(self.duration * 1000, 3),
+            'duplicate_queries': self.duplicates,
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper adding the query to the stats of the current request"""
+    stats = active_query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """Record the queries of every connection, whichever thread opened it"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_query_budget(route, method):
+    """Return the query budget of a route name and method, None when it has none"""
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(route)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record the queries run while handling a request.
+
+    The count, total database time and duplicates are logged to
+    `core.queries` and, with QUERY_INSTRUMENTATION_HEADERS, returned in
+    the Server-Timing and X-DB-Queries headers. Routes listed in
+    QUERY_BUDGETS log a warning when they run more queries than their
+    budget, or raise QueryBudgetExceeded with QUERY_BUDGET_STRICT, as
+    the tests do. Queries run while a streaming response is consumed
+    happen after the middleware returns and aren't counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = active_query_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            active_query_stats.reset(token)
+        return self.process_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = active_query_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            active_query_stats.reset(token)
+        return self.process_stats(request, response, stats)
+
+    def process_stats(self, request, response, stats):
+        match = request.resolver_match
+        route = match.view_name if match else None
+        response.query_stats = stats
+        if getattr(settings, 'QUERY_INSTRUMENTATION_HEADERS', False):
+            response['Server-Timing'] = (
+                f'db;dur={stats.duration * 1000:.3f};desc="{stats.count} queries, {stats.duplicates} duplicates"'
+            )
+            response['X-DB-Queries'] = str(stats.count)
+        fields = {'method': request.method, 'path': request.path, 'route': route, **stats.as_dict()}
+        logger.debug(
+            'queries=%(queries)d db_time_ms=%(db_time_ms).3f duplicates=%(duplicate_queries)d '
+            'route=%(route)s method=%(method)s path=%(path)s', fields, extra={'query_stats': fields}
+        )
+        self.check_budget(route, request.method, stats, fields)
+        return response
+
+    def check_budget(self, route, method, stats, fields):
+        budget = get_query_budget(route, method)
+        if budget is None or stats.count <= budget:
+            return
+        message = f'{method} {route} ran {stats.count} queries, its budget is {budget}'
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message, extra={'query_stats': {**fields, 'budget': budget}})
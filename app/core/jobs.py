@@ -0,0 +1,156 @@
+"""
+Local database backed job runner
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# the step functions of each kind of job, filled by `register`
+_handlers = {}
+
+
+def register(kind):
+    """
+    Register the step function of a kind of job.
+
+    The function receives the job, does a bounded amount of work and
+    returns True once the job is complete. It may update `job.progress`,
+    which is saved in the transaction of the step.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    return _handlers.get(kind)
+
+
+def enqueue(kind, payload=None, **fields):
+    """Create a job of the given kind, run by the next free worker"""
+    return Job.objects.create(kind=kind, payload=payload or {}, **fields)
+
+
+def get_lease_seconds():
+    return getattr(settings, 'JOB_LEASE_SECONDS', 300)
+
+
+def retry_delay(attempts):
+    """Return the seconds to wait before the next attempt, doubling with each failure"""
+    delay = getattr(settings, 'JOB_RETRY_DELAY', 10) * 2 ** max(attempts - 1, 0)
+    return min(delay, getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600))
+
+
+class LeaseLost(Exception):
+    """The job was claimed by another worker after the lease expired"""
+
+
+class JobRunner:
+    """
+    Claim runnable jobs and run them step by step.
+
+    Claiming is a conditional UPDATE, so concurrent workers never run the
+    same job, and a job whose worker died is claimed again once its lease
+    expires. Every step runs in its own transaction with the progress it
+    made and renews the lease, a worker that lost its lease rolls the
+    step back and leaves the job to the new one.
+    """
+
+    def __init__(self, worker=None, lease_seconds=None):
+        self.worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+        self.lease_seconds = lease_seconds or get_lease_seconds()
+
+    def claimable(self, now):
+        return Job.objects.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            status__in=(Job.PENDING, Job.RUNNING), run_after__lte=now,
+        )
+
+    def claim(self, kinds=None):
+        """Return the next runnable job, leased to this worker, None without one"""
+        now = timezone.now()
+        candidates = self.claimable(now).order_by('run_after', 'id')
+        if kinds:
+            candidates = candidates.filter(kind__in=kinds)
+        for job_id in candidates.values_list('id', flat=True)[:10]:
+            claimed = self.claimable(now).filter(pk=job_id).update(
+                status=Job.RUNNING, attempts=F('attempts') + 1, locked_by=self.worker,
+                locked_until=now + timedelta(seconds=self.lease_seconds), updated_at=now,
+            )
+            if claimed:
+                return Job.objects.get(pk=job_id)
+        return None
+
+    def run(self, job):
+        """Run the steps of a claimed job until it completes or fails"""
+        try:
+            handler = get_handler(job.kind)
+            if handler is None:
+                raise LookupError(f'No handler registered for jobs of kind {job.kind!r}')
+            if job.attempts > job.max_attempts:
+                # the workers of the previous attempts died with the lease
+                raise RuntimeError(f'Gave up after {job.max_attempts} attempts')
+            done = False
+            while not done:
+                with transaction.atomic():
+                    done = handler(job)
+                    if done:
+                        job.status = Job.SUCCEEDED
+                        job.finished_at = timezone.now()
+                        job.locked_until = None
+                    else:
+                        job.locked_until = timezone.now() + timedelta(seconds=self.lease_seconds)
+                    self._save(job)
+        except LeaseLost:
+            logger.warning('Lost the lease of job %s, left to its new worker', job.pk)
+        except Exception:
+            logger.exception('Job %s failed on attempt %s', job.pk, job.attempts)
+            self._fail(job, traceback.format_exc())
+        return job
+
+    def _fail(self, job, error):
+        job.last_error = error
+        job.locked_until = None
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        # the progress of the failed step was rolled back with it
+        job.progress = Job.objects.filter(pk=job.pk).values_list('progress', flat=True).first() or {}
+        try:
+            self._save(job)
+        except LeaseLost:
+            logger.warning('Lost the lease of job %s, left to its new worker', job.pk)
+
+    def _save(self, job):
+        fields = ('status', 'progress', 'last_error', 'run_after', 'locked_until', 'finished_at')
+        updated = Job.objects.filter(pk=job.pk, locked_by=self.worker, attempts=job.attempts).update(
+            updated_at=timezone.now(), **{field: getattr(job, field) for field in fields}
+        )
+        if not updated:
+            raise LeaseLost(job.pk)
+
+    def run_pending(self, max_jobs=None, kinds=None):
+        """Run runnable jobs until there are none left, return how many ran"""
+        count = 0
+        while max_jobs is None or count < max_jobs:
+            job = self.claim(kinds)
+            if job is None:
+                break
+            self.run(job)
+            count += 1
+        return count
@@ -0,0 +1,108 @@
+"""
+Django command to benchmark the API endpoints
+"""
+import json
+import platform
+import uuid
+from typing import Any
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.benchmark import SCENARIOS, Fixture, compare, run_scenario
+
+
+class Command(BaseCommand):
+    """Measure throughput, latency and query counts of the API endpoints"""
+    help = (
+        'Seed users, tags and recipes, run every endpoint scenario through '
+        'the Django test client and report throughput, p50/p95/p99 latency '
+        'and SQL query counts. Results are written as JSON and can be '
+        'compared against a baseline run. The seeded data is deleted at '
+        'the end. Runs against the configured database, SQLite or Postgres.'
+    )
+
+    def add_arguments(self, parser):
+        names = [scenario.name for scenario in SCENARIOS]
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes-per-user', type=int, default=200)
+        parser.add_argument('--tags-per-user', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per worker')
+        parser.add_argument('--concurrency', type=int, default=1, help='client threads per endpoint')
+        parser.add_argument('--endpoint', action='append', choices=names, help='defaults to every endpoint')
+        parser.add_argument('--output', help='write the results as JSON to this file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2, help='tolerated relative slowdown')
+        parser.add_argument('--no-response-cache', action='store_true', help='disable the response cache')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        for option in ('users', 'recipes_per_user', 'requests', 'concurrency'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be positive')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        if options['concurrency'] > 1 and connection.vendor == 'sqlite':
+            self.stderr.write('SQLite serializes writes, concurrent write endpoints will report errors')
+        scenarios = [s for s in SCENARIOS if not options['endpoint'] or s.name in options['endpoint']]
+        fixture = Fixture(uuid.uuid4().hex[:12], options['users'], options['recipes_per_user'],
+                          options['tags_per_user'])
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if options['no_response_cache']:
+            overrides['RESPONSE_CACHE_ENABLED'] = False
+
+        results = {
+            'meta': {
+                'started': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'response_cache': not options['no_response_cache'],
+                **{key: options[key] for key in (
+                    'users', 'recipes_per_user', 'tags_per_user', 'requests', 'warmup', 'concurrency'
+                )},
+            },
+            'endpoints': {},
+        }
+        self.stdout.write(f'Seeding {options["users"]} users with {options["recipes_per_user"]} recipes each')
+        fixture.seed()
+        try:
+            with override_settings(**overrides):
+                for scenario in scenarios:
+                    result = run_scenario(
+                        scenario, fixture, options['requests'], options['concurrency'], options['warmup']
+                    )
+                    results['endpoints'][scenario.name] = result
+                    self.stdout.write(
+                        f'{scenario.name:<15}{result["throughput_rps"]:>9.1f} req/s'
+                        f'  p50 {result["p50_ms"]:>8.2f} ms  p95 {result["p95_ms"]:>8.2f} ms'
+                        f'  p99 {result["p99_ms"]:>8.2f} ms  queries {result["queries_median"]:g}'
+                        f'{"  errors " + str(result["errors"]) if result["errors"] else ""}'
+                    )
+        finally:
+            fixture.cleanup()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if baseline is not None:
+            differing = [
+                key for key in ('database', 'users', 'recipes_per_user', 'concurrency', 'response_cache')
+                if baseline.get('meta', {}).get(key) != results['meta'][key]
+            ]
+            if differing:
+                self.stderr.write(f'The baseline was run with different {", ".join(differing)}')
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(f'Regression {regression}')
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -0,0 +1,70 @@
+"""
+Django command to check the email validation runs in linear time
+"""
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.validators import is_valid_email
+
+
+# inputs that make nested regular expression repetitions backtrack
+ADVERSARIAL_EMAILS = {
+    'long local part': lambda n: 'a' * n + '!',
+    'separated local part': lambda n: 'a.' * (n // 2) + '!',
+    'digits and capitals': lambda n: '0A' * (n // 2) + '@',
+    'long domain label': lambda n: 'a@' + 'a' * n + '!',
+    'many domain labels': lambda n: 'a@a' + '.aa' * (n // 3) + '!',
+    'valid address': lambda n: 'a.' * (n // 4) + 'a@example' + '.com' * (n // 8),
+}
+
+
+def time_validation(email, repeat):
+    """Return the best time of validating the email, without the length limit"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        is_valid_email(email, max_length=None)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    """Benchmark the email validation on adversarial inputs"""
+    help = (
+        'Time the email validation of the user manager on inputs of growing '
+        'length crafted to backtrack, and fail when the time per character '
+        'grows with the length instead of staying flat.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated input lengths')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--max-growth', type=float, default=5.0,
+                            help='tolerated growth of the time per character, largest against smallest input')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',')})
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of lengths')
+        if not sizes or sizes[0] < 10 or options['repeat'] < 1:
+            raise CommandError('--sizes must be at least 10 and --repeat positive')
+
+        failures = []
+        for name, build in ADVERSARIAL_EMAILS.items():
+            per_char = []
+            for size in sizes:
+                email = build(size)
+                elapsed = time_validation(email, options['repeat'])
+                per_char.append(elapsed / len(email) * 1e9)
+                self.stdout.write(
+                    f'{name:<22}{len(email):>9} chars {elapsed * 1e6:>10.1f} us {per_char[-1]:>8.1f} ns/char'
+                )
+            growth = per_char[-1] / max(per_char[0], 1e-3)
+            if growth > options['max_growth']:
+                failures.append(f'{name}: {growth:.1f}x slower per character')
+        if failures:
+            raise CommandError('Validation is not linear, ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Validation time grows linearly with the input'))
@@ -0,0 +1,85 @@
+"""
+Django command to compare the serializer and fast paths of the recipe list
+"""
+import time
+import uuid
+from decimal import Decimal
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe, Tag
+from recipe.fastpath import RowConverter
+from recipe.renderers import FastJSONRenderer, orjson
+from recipe.serializers import RecipeSerializer, tags_prefetch
+
+
+class Command(BaseCommand):
+    """Benchmark rendering a recipe list page"""
+    help = (
+        'Seed recipes for a throwaway user and time rendering them through '
+        'RecipeSerializer and the JSON renderer against the fast path. '
+        'Everything is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=3, help='tags per recipe')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive')
+        with transaction.atomic():
+            queryset = self._seed(options['rows'], options['tags'])
+            converter = RowConverter(RecipeSerializer(), queryset._prefetch_related_lookups)
+
+            def serializer_path():
+                return JSONRenderer().render(RecipeSerializer(list(queryset), many=True).data)
+
+            def fast_path():
+                rows = list(queryset.prefetch_related(None).values(*converter.columns))
+                return FastJSONRenderer().render(converter.convert(rows))
+
+            if serializer_path() != fast_path():
+                raise CommandError('The fast path output differs from the serializer output')
+            slow = self._time(serializer_path, options['repeat'])
+            fast = self._time(fast_path, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{options["rows"]} recipes, {options["tags"]} tags each, best of {options["repeat"]}')
+        self.stdout.write(f'{"serializer + JSONRenderer":<28}{slow * 1000:8.1f} ms')
+        self.stdout.write(f'{"fast path + " + ("orjson" if orjson else "json"):<28}{fast * 1000:8.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'speedup: {slow / fast:.1f}x'))
+
+    def _seed(self, rows, tags_per_recipe):
+        """Create the recipes and return the list queryset"""
+        user = get_user_model().objects.create_user(f'benchmark.{uuid.uuid4().hex}@example.com', None)
+        tags = Tag.objects.get_or_create_many(user, [f'Tag {i}' for i in range(max(tags_per_recipe, 1) * 4)])
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user, title=f'Recipe {i}', time_minutes=i % 120,
+                price=Decimal(i % 10000) / 100, link=f'https://example.com/{i}', description='Benchmark recipe',
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        ids = Recipe.objects.filter(user=user).values_list('id', flat=True)
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe_id, tag_id=tags[(recipe_id + j) % len(tags)].id)
+            for recipe_id in ids
+            for j in range(tags_per_recipe)
+        ], batch_size=5000)
+        return Recipe.objects.filter(user=user).order_by('-id').defer('search_vector').prefetch_related(tags_prefetch())
+
+    @staticmethod
+    def _time(func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
@@ -0,0 +1,42 @@
+"""
+Django command to precompute the OpenAPI schema
+"""
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.schema import SchemaDocument, get_schema_file
+
+
+class Command(BaseCommand):
+    """Generate the OpenAPI schema served by /api/schema/"""
+    help = (
+        'Introspect the API once and write every rendering of the schema to '
+        'SCHEMA_FILE, loaded by the processes when SCHEMA_PRECOMPUTE is '
+        '"file". Run it on deploy, --check fails when the file is outdated.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='defaults to SCHEMA_FILE')
+        parser.add_argument('--check', action='store_true', help='compare with the file instead of writing it')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path = options['output'] or get_schema_file()
+        if not path:
+            raise CommandError('Set SCHEMA_FILE or pass --output')
+        started = time.perf_counter()
+        document = SchemaDocument.generate()
+        elapsed = (time.perf_counter() - started) * 1000
+        if options['check']:
+            if SchemaDocument.load(path) != document:
+                raise CommandError(f'{path} is missing or outdated, run build_schema')
+            self.stdout.write(self.style.SUCCESS(f'{path} is up to date'))
+            return
+        document.save(path)
+        for media_type, representation in document.representations.items():
+            self.stdout.write(
+                f'{media_type:<36}{len(representation.content):>9} bytes'
+                f'{len(representation.gzipped):>9} gzipped  {representation.etag}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Schema generated in {elapsed:.0f} ms and written to {path}'))
@@ -0,0 +1,251 @@
+"""
+Django command to import users, tags and recipes from a JSONL or CSV file
+"""
+import csv
+import io
+import json
+import os
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import CollectionVersion, ImportProgress, Recipe, Tag
+from core.validators import is_valid_email
+
+
+COPY_STAGING_TABLES = '''
+CREATE TEMPORARY TABLE IF NOT EXISTS import_recipe (
+    seq bigint PRIMARY KEY,
+    email text NOT NULL,
+    user_name text NOT NULL,
+    title text NOT NULL,
+    time_minutes integer NOT NULL,
+    price numeric(5, 2) NOT NULL,
+    link text NOT NULL,
+    description text NOT NULL,
+    user_id bigint,
+    recipe_id bigint
+);
+CREATE TEMPORARY TABLE IF NOT EXISTS import_recipe_tag (
+    seq bigint NOT NULL,
+    name text NOT NULL
+);
+TRUNCATE import_recipe, import_recipe_tag;
+'''
+
+# set based upserts from the staging tables, users and tags already in
+# the database are kept, every staged row becomes a new recipe
+COPY_UPSERTS = '''
+INSERT INTO {user} (password, is_superuser, email, name, is_active, is_staff)
+SELECT DISTINCT ON (email) '!' || md5(random()::text), false, email, user_name, true, false
+FROM import_recipe ORDER BY email, seq
+ON CONFLICT (email) DO NOTHING;
+
+UPDATE import_recipe s SET user_id = u.id FROM {user} u WHERE u.email = s.email;
+
+UPDATE import_recipe SET recipe_id = nextval(pg_get_serial_sequence('{recipe}', 'id'));
+
+INSERT INTO {recipe} (id, user_id, title, time_minutes, price, link, description)
+SELECT recipe_id, user_id, title, time_minutes, price, link, description FROM import_recipe;
+
+INSERT INTO {tag} (user_id, name, usage)
+SELECT DISTINCT s.user_id, t.name, 0 FROM import_recipe_tag t JOIN import_recipe s USING (seq)
+ON CONFLICT (user_id, name) DO NOTHING;
+
+INSERT INTO {recipe_tag} (recipe_id, tag_id)
+SELECT DISTINCT s.recipe_id, g.id
+FROM import_recipe_tag t
+JOIN import_recipe s USING (seq)
+JOIN {tag} g ON g.user_id = s.user_id AND g.name = t.name
+ON CONFLICT DO NOTHING;
+'''
+
+
+class Command(BaseCommand):
+    """Import recipes, creating their users and tags"""
+    help = (
+        'Import recipes from a JSONL or CSV file. Every record holds a recipe '
+        'with the email of its user and its tag names, missing users and '
+        'tags are created. Progress is saved with every batch so an '
+        'interrupted import of the same file resumes where it stopped.'
+    )
+    fields = ('title', 'time_minutes', 'price', 'link', 'description')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL or CSV file to import')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--method', choices=['auto', 'copy', 'bulk'], default='auto',
+            help='copy uses COPY and staging tables (postgres only), bulk uses bulk_create'
+        )
+        parser.add_argument('--restart', action='store_true', help='ignore the progress of an earlier import')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('The copy method needs a postgres database')
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size must be positive')
+        import_batch = self._import_copy if method == 'copy' else self._import_bulk
+
+        # keyed by the absolute path, the same file resumes from any directory
+        key = os.path.abspath(path)
+        progress = ImportProgress.objects.filter(path=key)
+        if options['restart']:
+            progress.delete()
+        done = progress.values_list('done', flat=True).first() or 0
+        if done:
+            self.stdout.write(f'Resuming after {done} records')
+
+        imported = skipped = 0
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as file:
+            records = islice(self._read_records(file, file_format), done, None)
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                rows = []
+                for number, record in batch:
+                    try:
+                        rows.append(self._clean(record))
+                    except (ValueError, TypeError, KeyError, AttributeError, InvalidOperation) as e:
+                        skipped += 1
+                        self.stderr.write(f'Skipping record {number}: {e!r}')
+                # the progress commits with the batch, a crash can't import it twice
+                with transaction.atomic():
+                    import_batch(rows)
+                    ImportProgress.objects.update_or_create(
+                        path=key, defaults={'done': done + len(batch)}
+                    )
+                done += len(batch)
+                imported += len(rows)
+                rate = imported / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f'{done} records processed, {imported} imported, {skipped} skipped ({rate:.0f}/s)')
+
+        progress.delete()
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} recipes, skipped {skipped} records'))
+
+    def _read_records(self, file, file_format):
+        """Yield (record number, record) pairs, the error in place of a malformed record"""
+        if file_format == 'csv':
+            yield from enumerate(csv.DictReader(file), start=1)
+            return
+        number = 0
+        for line in file:
+            if line.strip():
+                number += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = e
+                yield number, record
+
+    def _clean(self, record):
+        """Return the validated values of a record"""
+        if isinstance(record, Exception):
+            raise record
+        email = get_user_model().objects.normalize_email((record.get('user') or '').strip())
+        if not is_valid_email(email):
+            raise ValueError('a valid user email is required')
+        title = (record.get('title') or '').strip()
+        if not title:
+            raise ValueError('a title is required')
+        price = Decimal(str(record['price'])).quantize(Decimal('0.01'))
+        if abs(price) >= 1000:
+            raise ValueError('the price must be less than 1000')
+        tags = record.get('tags') or []
+        if isinstance(tags, str):
+            tags = tags.split(';')
+        tags = [tag['name'] if isinstance(tag, dict) else tag for tag in tags]
+        return {
+            'email': email,
+            'user_name': record.get('user_name') or '',
+            'title': title,
+            'time_minutes': int(record['time_minutes']),
+            'price': price,
+            'link': record.get('link') or '',
+            'description': record.get('description') or '',
+            'tags': list(dict.fromkeys(name.strip() for name in tags if name.strip())),
+        }
+
+    def _import_copy(self, rows):
+        """Import a batch through COPY into staging tables and upserts"""
+        recipes, tags = io.StringIO(), io.StringIO()
+        recipe_writer = csv.writer(recipes)
+        tag_writer = csv.writer(tags)
+        for seq, row in enumerate(rows):
+            recipe_writer.writerow([
+                seq, row['email'], row['user_name'], row['title'], row['time_minutes'],
+                row['price'], row['link'], row['description'],
+            ])
+            for name in row['tags']:
+                tag_writer.writerow([seq, name])
+        recipes.seek(0)
+        tags.seek(0)
+
+        with connection.cursor() as cursor:
+            cursor.execute(COPY_STAGING_TABLES)
+            cursor.copy_expert(
+                'COPY import_recipe (seq, email, user_name, title, time_minutes, price, link, description) '
+                "FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (user_name, link, description))",
+                recipes
+            )
+            cursor.copy_expert('COPY import_recipe_tag (seq, name) FROM STDIN WITH (FORMAT csv)', tags)
+            cursor.execute(COPY_UPSERTS.format(
+                user=get_user_model()._meta.db_table,
+                recipe=Recipe._meta.db_table,
+                tag=Tag._meta.db_table,
+                recipe_tag=Recipe.tags.through._meta.db_table,
+            ))
+            cursor.execute('SELECT DISTINCT user_id FROM import_recipe')
+            CollectionVersion.objects.bump(*(user_id for user_id, in cursor.fetchall()))
+
+    def _import_bulk(self, rows):
+        """Import a batch with bulk_create on any database"""
+        User = get_user_model()
+        names = {}
+        for row in rows:
+            names.setdefault(row['email'], row['user_name'])
+        users = {user.email: user for user in User.objects.filter(email__in=names)}
+        missing = []
+        for email, name in names.items():
+            if email not in users:
+                user = User(email=email, name=name)
+                user.set_unusable_password()
+                missing.append(user)
+        if missing:
+            User.objects.bulk_create(missing, ignore_conflicts=True)
+            users.update((user.email, user) for user in User.objects.filter(email__in=[u.email for u in missing]))
+
+        recipes = [
+            Recipe(user=users[row['email']], **{field: row[field] for field in self.fields})
+            for row in rows
+        ]
+        Recipe.objects.bulk_create_with_ids(recipes)
+
+        wanted = defaultdict(list)
+        for row in rows:
+            wanted[row['email']].extend(row['tags'])
+        tags = {
+            email: {tag.name: tag for tag in Tag.objects.get_or_create_many(users[email], names)}
+            for email, names in wanted.items()
+        }
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe.id, tag_id=tags[row['email']][name].id)
+            for recipe, row in zip(recipes, rows)
+            for name in row['tags']
+        ], ignore_conflicts=True)
+        CollectionVersion.objects.bump(*(user.id for user in users.values()))
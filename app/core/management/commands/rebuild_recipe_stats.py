@@ -0,0 +1,63 @@
+"""
+Django command to rebuild the recipe statistics from the recipes
+"""
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import CollectionVersion, RecipeStats
+
+
+class Command(BaseCommand):
+    """Rebuild or verify the recipe statistics"""
+    help = (
+        'Aggregate the recipes of every user from scratch, compare the result '
+        'with the maintained statistics and rebuild the ones that differ. '
+        'Users are locked one batch at a time, so recipes written meanwhile '
+        'are counted exactly once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', type=int, help='only rebuild the statistics of this user id')
+        parser.add_argument('--verify', action='store_true', help='report the differences without fixing them')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        # statistics of deleted users are checked too
+        user_ids = sorted(
+            set(get_user_model().objects.values_list('id', flat=True))
+            | set(RecipeStats.objects.values_list('user_id', flat=True))
+        ) if options['user'] is None else [options['user']]
+        checked = differing = 0
+        for start in range(0, len(user_ids), options['batch_size']):
+            batch = user_ids[start:start + options['batch_size']]
+            batch_differing = self._rebuild(batch, options['verify'])
+            checked += len(batch)
+            differing += len(batch_differing)
+            for user_id in batch_differing:
+                self.stdout.write(f'user {user_id}: statistics differ from the recipes')
+        verb = 'differ' if options['verify'] else 'rebuilt'
+        self.stdout.write(self.style.SUCCESS(f'{checked} users checked, {differing} {verb}'))
+        if options['verify'] and differing:
+            raise CommandError('recipe statistics differ from the recipes')
+
+    @staticmethod
+    def _rebuild(user_ids, verify):
+        with transaction.atomic():
+            # recipe inserts check their user row and the triggers update
+            # the statistics rows, both wait for the commit
+            list(get_user_model().objects.filter(id__in=user_ids).select_for_update().values_list('id'))
+            list(RecipeStats.objects.filter(user_id__in=user_ids).select_for_update().values_list('user_id'))
+            stored = RecipeStats.objects.stored(user_ids)
+            live = RecipeStats.objects.live(user_ids)
+            differing = sorted(
+                user_id for user_id in set(stored) | set(live) if stored.get(user_id) != live.get(user_id)
+            )
+            if differing and not verify:
+                RecipeStats.objects.rebuild(differing)
+                CollectionVersion.objects.bump(*differing)
+        return differing
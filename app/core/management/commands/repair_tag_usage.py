@@ -0,0 +1,63 @@
+"""
+Django command to reconcile the tag usage counts with the tag links
+"""
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import CollectionVersion, Recipe, Tag
+
+
+def counted_usage():
+    """Return the expression counting the recipes linked to each tag"""
+    links = Recipe.tags.through.objects.filter(tag_id=OuterRef('pk')).order_by().values('tag_id')
+    return Coalesce(Subquery(links.annotate(count=Count('*')).values('count')), 0)
+
+
+class Command(BaseCommand):
+    """Repair drifted tag usage counts"""
+    help = (
+        'Recount the recipes of every tag and fix the usage counts that '
+        'drifted from them, e.g. after links were changed with the triggers '
+        'disabled. Tags are locked one batch at a time while they are '
+        'recounted, so links changed meanwhile are counted exactly once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--user', type=int, help='only repair the tags of this user id')
+        parser.add_argument('--dry-run', action='store_true', help='report the drift without fixing it')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        tags = Tag.objects.all()
+        if options['user'] is not None:
+            tags = tags.filter(user_id=options['user'])
+        bounds = tags.aggregate(first=Min('id'), last=Max('id'))
+        checked = repaired = 0
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, options['batch_size']):
+                batch = tags.filter(id__gte=start, id__lt=start + options['batch_size'])
+                batch_checked, batch_repaired = self._repair(batch, options['dry_run'])
+                checked += batch_checked
+                repaired += batch_repaired
+        verb = 'drifted' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'{checked} tags checked, {repaired} {verb}'))
+
+    @staticmethod
+    def _repair(batch, dry_run):
+        with transaction.atomic():
+            # link changes of these tags wait for the commit, their
+            # triggers then apply on top of the recount
+            checked = len(batch.select_for_update().values_list('id', flat=True))
+            drifted = list(
+                batch.annotate(counted=counted_usage()).exclude(usage=F('counted')).values_list('id', 'user_id')
+            )
+            if drifted and not dry_run:
+                Tag.objects.filter(id__in=[tag_id for tag_id, _user_id in drifted]).update(usage=counted_usage())
+                CollectionVersion.objects.bump(*{user_id for _tag_id, user_id in drifted})
+        return checked, len(drifted)
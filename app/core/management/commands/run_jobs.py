@@ -0,0 +1,43 @@
+"""
+Django command to run the background jobs
+"""
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.jobs import JobRunner
+
+
+class Command(BaseCommand):
+    """Run the jobs queued in the database"""
+    help = (
+        'Claim the runnable jobs one at a time and run them, polling for new '
+        'ones every --sleep seconds. Several workers may run side by side, '
+        'a job is only run by one of them, and the jobs of a worker that '
+        'died are taken over once their lease expires.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit once no job is runnable')
+        parser.add_argument('--sleep', type=float, default=5.0, help='seconds between polls when idle')
+        parser.add_argument('--max-jobs', type=int, help='exit after running this many jobs')
+        parser.add_argument('--kind', action='append', dest='kinds', help='only run jobs of this kind')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['max_jobs'] is not None and options['max_jobs'] < 1:
+            raise CommandError('--max-jobs must be positive')
+        runner = JobRunner()
+        count = 0
+        while options['max_jobs'] is None or count < options['max_jobs']:
+            remaining = None if options['max_jobs'] is None else options['max_jobs'] - count
+            ran = runner.run_pending(max_jobs=remaining, kinds=options['kinds'])
+            count += ran
+            if not ran:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                # a long running worker must not keep a connection that broke
+                close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f'{count} jobs run'))
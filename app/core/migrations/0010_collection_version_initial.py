@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:32
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_collection_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='collectionversion',
+            name='version',
+            field=models.BigIntegerField(default=core.models.initial_collection_version),
+        ),
+    ]
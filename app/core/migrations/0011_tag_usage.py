@@ -0,0 +1,107 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+# statement level triggers update every tag of a bulk insert or delete
+# with a single UPDATE, a count that drifted never blocks a delete
+CREATE_USAGE_TRIGGERS_POSTGRESQL = '''
+CREATE FUNCTION core_tag_usage_insert() RETURNS trigger AS $$
+BEGIN
+    UPDATE core_tag SET usage = core_tag.usage + links.count
+    FROM (SELECT tag_id, count(*) AS count FROM inserted GROUP BY tag_id) AS links
+    WHERE core_tag.id = links.tag_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_tag_usage_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE core_tag SET usage = greatest(core_tag.usage - links.count, 0)
+    FROM (SELECT tag_id, count(*) AS count FROM deleted GROUP BY tag_id) AS links
+    WHERE core_tag.id = links.tag_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_tag_usage_insert_trigger
+    AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION core_tag_usage_insert();
+
+CREATE TRIGGER core_tag_usage_delete_trigger
+    AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT EXECUTE FUNCTION core_tag_usage_delete();
+'''
+
+DROP_USAGE_TRIGGERS_POSTGRESQL = '''
+DROP TRIGGER IF EXISTS core_tag_usage_insert_trigger ON core_recipe_tags;
+DROP TRIGGER IF EXISTS core_tag_usage_delete_trigger ON core_recipe_tags;
+DROP FUNCTION IF EXISTS core_tag_usage_insert();
+DROP FUNCTION IF EXISTS core_tag_usage_delete();
+'''
+
+CREATE_USAGE_TRIGGERS_SQLITE = [
+    '''
+    CREATE TRIGGER core_tag_usage_insert_trigger AFTER INSERT ON core_recipe_tags
+    BEGIN
+        UPDATE core_tag SET usage = usage + 1 WHERE id = NEW.tag_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER core_tag_usage_delete_trigger AFTER DELETE ON core_recipe_tags
+    BEGIN
+        UPDATE core_tag SET usage = max(usage - 1, 0) WHERE id = OLD.tag_id;
+    END
+    ''',
+]
+
+DROP_USAGE_TRIGGERS_SQLITE = [
+    'DROP TRIGGER IF EXISTS core_tag_usage_insert_trigger',
+    'DROP TRIGGER IF EXISTS core_tag_usage_delete_trigger',
+]
+
+BACKFILL_USAGE = '''
+UPDATE core_tag SET usage = (
+    SELECT count(*) FROM core_recipe_tags WHERE core_recipe_tags.tag_id = core_tag.id
+)
+'''
+
+
+def create_usage_triggers(apps, schema_editor):
+    """Count the tag links in the database, whatever inserts or deletes them"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(CREATE_USAGE_TRIGGERS_POSTGRESQL)
+    elif vendor == 'sqlite':
+        for statement in CREATE_USAGE_TRIGGERS_SQLITE:
+            schema_editor.execute(statement)
+    schema_editor.execute(BACKFILL_USAGE)
+
+
+def drop_usage_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(DROP_USAGE_TRIGGERS_POSTGRESQL)
+    elif vendor == 'sqlite':
+        for statement in DROP_USAGE_TRIGGERS_SQLITE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_collection_version_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='usage',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-usage', 'name'], name='tag_user_usage_idx'),
+        ),
+        migrations.RunPython(create_usage_triggers, drop_usage_triggers),
+    ]
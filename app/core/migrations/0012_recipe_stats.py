@@ -0,0 +1,190 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+# the histogram bounds of core.models.RECIPE_PRICE_BUCKETS when this
+# migration was written, changing them needs a new migration
+PRICE_BUCKET = '''
+CASE WHEN {price} >= 100 THEN 10000 WHEN {price} >= 50 THEN 5000 WHEN {price} >= 20 THEN 2000
+     WHEN {price} >= 10 THEN 1000 WHEN {price} >= 5 THEN 500 ELSE 0 END
+'''
+
+# applies the signed recipe rows of {changes}, +1 for new rows and -1 for
+# old ones, so an update moves the recipe between totals and buckets
+APPLY_CHANGES_POSTGRESQL = '''
+    INSERT INTO core_recipestats AS s (user_id, recipe_count, time_minutes_total)
+    SELECT user_id, sum(sign), sum(sign * time_minutes) FROM ({changes}) AS c
+    GROUP BY user_id HAVING sum(sign) <> 0 OR sum(sign * time_minutes) <> 0
+    ON CONFLICT (user_id) DO UPDATE SET
+        recipe_count = s.recipe_count + EXCLUDED.recipe_count,
+        time_minutes_total = s.time_minutes_total + EXCLUDED.time_minutes_total;
+
+    INSERT INTO core_recipestatsbucket AS b (user_id, kind, bucket, count)
+    SELECT user_id, kind, bucket, sum(sign) FROM (
+        SELECT user_id, 'time' AS kind, time_minutes AS bucket, sign FROM ({changes}) AS c
+        UNION ALL
+        SELECT user_id, 'price', {price_bucket}, sign FROM ({changes}) AS c
+    ) AS d
+    GROUP BY user_id, kind, bucket HAVING sum(sign) <> 0
+    ON CONFLICT (user_id, kind, bucket) DO UPDATE SET count = b.count + EXCLUDED.count;
+
+    DELETE FROM core_recipestatsbucket
+    WHERE count = 0 AND user_id IN (SELECT user_id FROM ({changes}) AS c);
+'''
+
+NEW_ROWS = 'SELECT user_id, time_minutes, price, 1 AS sign FROM new_rows'
+OLD_ROWS = 'SELECT user_id, time_minutes, price, -1 AS sign FROM old_rows'
+
+
+def apply_changes_postgresql(changes):
+    return APPLY_CHANGES_POSTGRESQL.format(changes=changes, price_bucket=PRICE_BUCKET.format(price='c.price'))
+
+
+CREATE_STATS_TRIGGERS_POSTGRESQL = '''
+CREATE FUNCTION core_recipe_stats_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {insert}
+    ELSIF TG_OP = 'DELETE' THEN
+        {delete}
+    ELSE
+        {update}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_stats_insert_trigger
+    AFTER INSERT ON core_recipe REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_stats_update();
+
+CREATE TRIGGER core_recipe_stats_delete_trigger
+    AFTER DELETE ON core_recipe REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_stats_update();
+
+CREATE TRIGGER core_recipe_stats_update_trigger
+    AFTER UPDATE ON core_recipe REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_stats_update();
+'''.replace('{insert}', apply_changes_postgresql(NEW_ROWS)).replace(
+    '{delete}', apply_changes_postgresql(OLD_ROWS)
+).replace('{update}', apply_changes_postgresql(f'{NEW_ROWS} UNION ALL {OLD_ROWS}'))
+
+DROP_STATS_TRIGGERS_POSTGRESQL = '''
+DROP TRIGGER IF EXISTS core_recipe_stats_insert_trigger ON core_recipe;
+DROP TRIGGER IF EXISTS core_recipe_stats_delete_trigger ON core_recipe;
+DROP TRIGGER IF EXISTS core_recipe_stats_update_trigger ON core_recipe;
+DROP FUNCTION IF EXISTS core_recipe_stats_update();
+'''
+
+# sqlite has row level triggers only, {row} is NEW or OLD
+APPLY_ROW_SQLITE = '''
+    INSERT INTO core_recipestats (user_id, recipe_count, time_minutes_total)
+    VALUES ({row}.user_id, {sign}, {sign} * {row}.time_minutes)
+    ON CONFLICT (user_id) DO UPDATE SET
+        recipe_count = recipe_count + excluded.recipe_count,
+        time_minutes_total = time_minutes_total + excluded.time_minutes_total;
+    INSERT INTO core_recipestatsbucket (user_id, kind, bucket, count)
+    VALUES ({row}.user_id, 'time', {row}.time_minutes, {sign})
+    ON CONFLICT (user_id, kind, bucket) DO UPDATE SET count = count + excluded.count;
+    INSERT INTO core_recipestatsbucket (user_id, kind, bucket, count)
+    VALUES ({row}.user_id, 'price', {price_bucket}, {sign})
+    ON CONFLICT (user_id, kind, bucket) DO UPDATE SET count = count + excluded.count;
+    DELETE FROM core_recipestatsbucket WHERE user_id = {row}.user_id AND count = 0;
+'''
+
+
+def apply_row_sqlite(row, sign):
+    return APPLY_ROW_SQLITE.format(row=row, sign=sign, price_bucket=PRICE_BUCKET.format(price=f'{row}.price'))
+
+
+CREATE_STATS_TRIGGERS_SQLITE = [
+    f'''
+    CREATE TRIGGER core_recipe_stats_insert_trigger AFTER INSERT ON core_recipe
+    BEGIN {apply_row_sqlite('NEW', 1)} END
+    ''',
+    f'''
+    CREATE TRIGGER core_recipe_stats_delete_trigger AFTER DELETE ON core_recipe
+    BEGIN {apply_row_sqlite('OLD', -1)} END
+    ''',
+    f'''
+    CREATE TRIGGER core_recipe_stats_update_trigger AFTER UPDATE OF user_id, time_minutes, price ON core_recipe
+    BEGIN {apply_row_sqlite('OLD', -1)} {apply_row_sqlite('NEW', 1)} END
+    ''',
+]
+
+DROP_STATS_TRIGGERS_SQLITE = [
+    'DROP TRIGGER IF EXISTS core_recipe_stats_insert_trigger',
+    'DROP TRIGGER IF EXISTS core_recipe_stats_delete_trigger',
+    'DROP TRIGGER IF EXISTS core_recipe_stats_update_trigger',
+]
+
+BACKFILL_STATS = [
+    '''
+    INSERT INTO core_recipestats (user_id, recipe_count, time_minutes_total)
+    SELECT user_id, count(*), sum(time_minutes) FROM core_recipe GROUP BY user_id
+    ''',
+    '''
+    INSERT INTO core_recipestatsbucket (user_id, kind, bucket, count)
+    SELECT user_id, 'time', time_minutes, count(*) FROM core_recipe GROUP BY user_id, time_minutes
+    ''',
+    '''
+    INSERT INTO core_recipestatsbucket (user_id, kind, bucket, count)
+    SELECT user_id, 'price', bucket, count(*) FROM (
+        SELECT user_id, ''' + PRICE_BUCKET.format(price='price') + ''' AS bucket FROM core_recipe
+    ) AS r GROUP BY user_id, bucket
+    ''',
+]
+
+
+def create_stats_triggers(apps, schema_editor):
+    """Maintain the statistics in the database, whatever writes the recipes"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(CREATE_STATS_TRIGGERS_POSTGRESQL)
+    elif vendor == 'sqlite':
+        for statement in CREATE_STATS_TRIGGERS_SQLITE:
+            schema_editor.execute(statement)
+    for statement in BACKFILL_STATS:
+        schema_editor.execute(statement)
+
+
+def drop_stats_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(DROP_STATS_TRIGGERS_POSTGRESQL)
+    elif vendor == 'sqlite':
+        for statement in DROP_STATS_TRIGGERS_SQLITE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_tag_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('recipe_count', models.BigIntegerField(default=0)),
+                ('time_minutes_total', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('time', 'Cooking time in minutes'), ('price', 'Price bucket in cents')], max_length=5)),
+                ('bucket', models.IntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('user_id', 'kind', 'bucket')},
+            },
+        ),
+        migrations.RunPython(create_stats_triggers, drop_stats_triggers),
+    ]
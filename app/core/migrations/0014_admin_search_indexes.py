@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:05
+
+from django.db import migrations
+
+
+# the admin searches with istartswith, UPPER(column) LIKE UPPER('term%'),
+# which only a pattern index on the same expression can serve
+CREATE_SEARCH_INDEXES = '''
+CREATE INDEX core_user_email_prefix_idx ON core_user (UPPER(email::text) text_pattern_ops);
+CREATE INDEX core_tag_name_prefix_idx ON core_tag (UPPER(name::text) text_pattern_ops);
+'''
+
+DROP_SEARCH_INDEXES = '''
+DROP INDEX IF EXISTS core_user_email_prefix_idx;
+DROP INDEX IF EXISTS core_tag_name_prefix_idx;
+'''
+
+
+def create_search_indexes(apps, schema_editor):
+    """Index the admin searches on postgres only"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_INDEXES)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
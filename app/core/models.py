@@ -1,23 +1,28 @@
 """Database Moodels"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+import time
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, router, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import \
     AbstractBaseUser, BaseUserManager, PermissionsMixin
-import re
+
+from core import hashing
+from core.validators import is_valid_email
 
 
 class UserManager(BaseUserManager):
     """Manager for user profiles"""
 
-    __email_regex = re.compile(
-        r'([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+'
-    )
-
     def __validate_email(self, email):
         """Check if the email exist and valid"""
         if not email:
             raise ValueError('User must have an email address')
-        if not self.__email_regex.fullmatch(email):
+        if not is_valid_email(email):
             raise ValueError('Email address is not valid')
 
     def __create_user(self, email, password=None, **extra_fields):
@@ -42,6 +47,42 @@ class UserManager(BaseUserManager):
         extra_fields['is_staff'] = True
         return self.__create_user(email, password, **extra_fields)
 
+    def bulk_create_users(self, users, batch_size=500):
+        """
+        Create many regular users with one bulk insert and return them.
+
+        `users` are dicts of the email, the password and other fields.
+        The passwords are hashed on the hashing pool a few at a time,
+        next to the hashes of other requests, and no signals are sent, so
+        the collection versions are started here. Existing emails raise
+        an IntegrityError, nothing is created then.
+        """
+        users = [dict(fields) for fields in users]
+        for fields in users:
+            self.__validate_email(fields.get('email'))
+        passwords = hashing.make_passwords([fields.pop('password', None) for fields in users])
+        instances = [
+            self.model(
+                email=self.normalize_email(fields.pop('email')), password=password,
+                **{**fields, 'is_superuser': False, 'is_staff': False}
+            )
+            for fields, password in zip(users, passwords)
+        ]
+        with transaction.atomic(using=self.db):
+            self.bulk_create(instances, batch_size=batch_size)
+            if any(user.pk is None for user in instances):
+                # backends that don't return the ids of inserted rows
+                ids = dict(self.filter(email__in=[user.email for user in instances]).values_list('email', 'id'))
+                for user in instances:
+                    user.pk = ids[user.email]
+                    user._state.adding = False
+                    user._state.db = self.db
+            CollectionVersion.objects.bulk_create(
+                [CollectionVersion(user_id=user.pk) for user in instances], batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+        return instances
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """custom user model"""
@@ -54,6 +95,45 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     objects = UserManager()
 
+    def set_password(self, raw_password):
+        """Hash the password on the hashing pool"""
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Check the password on the hashing pool, saving its hash again
+        with the preferred hasher when it was made by another one.
+        """
+        is_correct, upgraded = hashing.check_password(raw_password, self.password)
+        if upgraded is not None:
+            self.password = upgraded
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+
+
+class RecipeManager(models.Manager):
+    """Manager for recipes"""
+
+    def bulk_create_with_ids(self, recipes):
+        """
+        Insert the recipes with one query and set their ids.
+
+        Backends that can't return the ids of a bulk insert read them back,
+        call it in a transaction: it holds the write lock since the insert,
+        so the newest recipes of these users are the ones inserted, in order.
+        """
+        self.bulk_create(recipes)
+        if recipes and recipes[0].id is None:
+            inserted = self.using(router.db_for_write(self.model)).filter(
+                user_id__in={recipe.user_id for recipe in recipes}
+            )
+            ids = list(inserted.order_by('-id').values_list('id', flat=True)[:len(recipes)])
+            for recipe, recipe_id in zip(recipes, reversed(ids)):
+                recipe.id = recipe_id
+        return recipes
+
 
 class Recipe(models.Model):
     """Recipe object"""
@@ -67,11 +147,50 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     description = models.TextField()
     tags = models.ManyToManyField('Tag')
+    # weighted title/description document, maintained by a database
+    # trigger on postgres and left empty on other backends
+    search_vector = SearchVectorField(null=True, editable=False)
+    objects = RecipeManager()
+
+    class Meta:
+        # match the shapes of the per user list, filters and pagination
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            models.Index(fields=['user', 'time_minutes'], name='recipe_user_time_idx'),
+            models.Index(fields=['user', 'price'], name='recipe_user_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class TagManager(models.Manager):
+    """Manager for tags"""
+
+    def get_or_create_many(self, user, names):
+        """
+        Return the user's tags with the given names, creating missing ones.
+
+        Uses one lookup and one bulk insert whatever the number of names,
+        concurrent inserts of the same name are absorbed by the
+        ('user', 'name') unique constraint.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return []
+        tags = {tag.name: tag for tag in self.filter(user=user, name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True
+            )
+            tags.update((tag.name, tag) for tag in self.filter(user=user, name__in=missing))
+            # bulk_create sends no signals
+            CollectionVersion.objects.bump(user.id)
+        return [tags[name] for name in names]
+
+
 class Tag(models.Model):
     """Tag object"""
     user = models.ForeignKey(
@@ -79,9 +198,249 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
+    # number of recipes linked to the tag, maintained by database triggers
+    # on the tag link table, `repair_tag_usage` reconciles drift
+    usage = models.PositiveIntegerField(default=0, editable=False)
+    objects = TagManager()
 
     class Meta:
         unique_together = ('user', 'name')
+        indexes = [
+            models.Index(fields=['user', '-usage', 'name'], name='tag_user_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # never write back a usage count read before the triggers changed it
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'usage'
+            ]
+        super().save(*args, **kwargs)
+
+
+# user ids collected by CollectionVersionManager.deferred()
+_deferred_bumps = ContextVar('deferred_collection_bumps', default=None)
+
+
+class CollectionVersionManager(models.Manager):
+    """Manager for collection versions"""
+
+    def get_version(self, user_id):
+        """Return the current version of the user's recipes and tags"""
+        return self.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+    def bump(self, *user_ids):
+        """Increment the versions of the given users"""
+        ids = set(user_ids)
+        if not ids:
+            return
+        deferred = _deferred_bumps.get()
+        if deferred is not None:
+            deferred.update(ids)
+            return
+        updated = self.filter(user_id__in=ids).update(version=F('version') + 1)
+        if updated < len(ids):
+            missing = ids - set(self.filter(user_id__in=ids).values_list('user_id', flat=True))
+            self.bulk_create([self.model(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+            self.filter(user_id__in=missing).update(version=F('version') + 1)
+
+    @contextmanager
+    def deferred(self):
+        """Collect the bumps made inside the block and apply them once"""
+        if _deferred_bumps.get() is not None:
+            yield
+            return
+        ids = set()
+        token = _deferred_bumps.set(ids)
+        try:
+            yield
+        finally:
+            _deferred_bumps.reset(token)
+        self.bump(*ids)
+
+
+def initial_collection_version():
+    """Start at the creation time, a reused user id never meets old versions"""
+    return time.time_ns() // 1000
+
+
+class CollectionVersion(models.Model):
+    """
+    Version of a user's recipes and tags, bumped on every write.
+
+    Kept without a foreign key so it can be bumped while the user is
+    being deleted.
+    """
+    user_id = models.BigIntegerField(primary_key=True)
+    version = models.BigIntegerField(default=initial_collection_version)
+    objects = CollectionVersionManager()
+
+
+# lower bounds of the recipe price histogram, in cents, the database
+# triggers of migration 0012 bucket prices with the same bounds
+RECIPE_PRICE_BUCKETS = (0, 500, 1000, 2000, 5000, 10000)
+
+
+def price_bucket_expression(field='price'):
+    """Return the expression of the histogram bucket of a price"""
+    return models.Case(
+        *[
+            models.When(**{f'{field}__gte': Decimal(bound) / 100}, then=models.Value(bound))
+            for bound in reversed(RECIPE_PRICE_BUCKETS[1:])
+        ],
+        default=models.Value(RECIPE_PRICE_BUCKETS[0]),
+        output_field=models.IntegerField(),
+    )
+
+
+class RecipeStatsManager(models.Manager):
+    """Manager for the per user recipe statistics"""
+
+    def stored(self, user_ids=None):
+        """Return the maintained totals and buckets, by user id"""
+        totals = self.all()
+        buckets = RecipeStatsBucket.objects.exclude(count=0)
+        if user_ids is not None:
+            totals = totals.filter(user_id__in=user_ids)
+            buckets = buckets.filter(user_id__in=user_ids)
+        stats = {
+            user_id: {'recipe_count': count, 'time_minutes_total': total, 'time': {}, 'price': {}}
+            for user_id, count, total in totals.exclude(recipe_count=0).values_list(
+                'user_id', 'recipe_count', 'time_minutes_total'
+            )
+        }
+        for user_id, kind, bucket, count in buckets.values_list('user_id', 'kind', 'bucket', 'count'):
+            stats.setdefault(
+                user_id, {'recipe_count': 0, 'time_minutes_total': 0, 'time': {}, 'price': {}}
+            )[kind][bucket] = count
+        return stats
+
+    def live(self, user_ids=None):
+        """Return the same as `stored`, aggregated over the recipes"""
+        recipes = Recipe.objects.order_by()
+        if user_ids is not None:
+            recipes = recipes.filter(user_id__in=user_ids)
+        stats = {
+            user_id: {'recipe_count': count, 'time_minutes_total': total, 'time': {}, 'price': {}}
+            for user_id, count, total in recipes.values('user_id').annotate(
+                count=models.Count('id'), total=models.Sum('time_minutes')
+            ).values_list('user_id', 'count', 'total')
+        }
+        for user_id, minutes, count in recipes.values('user_id', 'time_minutes').annotate(
+            count=models.Count('id')
+        ).values_list('user_id', 'time_minutes', 'count'):
+            stats[user_id]['time'][minutes] = count
+        for user_id, bucket, count in recipes.annotate(bucket=price_bucket_expression()).values(
+            'user_id', 'bucket'
+        ).annotate(count=models.Count('id')).values_list('user_id', 'bucket', 'count'):
+            stats[user_id]['price'][bucket] = count
+        return stats
+
+    def rebuild(self, user_ids):
+        """Replace the stored statistics of the users with the live ones"""
+        live = self.live(user_ids)
+        self.filter(user_id__in=user_ids).delete()
+        RecipeStatsBucket.objects.filter(user_id__in=user_ids).delete()
+        self.bulk_create([
+            self.model(user_id=user_id, recipe_count=stats['recipe_count'],
+                       time_minutes_total=stats['time_minutes_total'])
+            for user_id, stats in live.items()
+        ])
+        RecipeStatsBucket.objects.bulk_create([
+            RecipeStatsBucket(user_id=user_id, kind=kind, bucket=bucket, count=count)
+            for user_id, stats in live.items()
+            for kind in (RecipeStatsBucket.TIME, RecipeStatsBucket.PRICE)
+            for bucket, count in stats[kind].items()
+        ], batch_size=1000)
+
+
+class RecipeStats(models.Model):
+    """
+    Recipe count and total cooking time of a user.
+
+    Maintained with RecipeStatsBucket by database triggers on the recipe
+    table, so every write path updates them in its own transaction.
+    Kept without foreign keys like CollectionVersion, the triggers update
+    them while the user's recipes are deleted with the user.
+    """
+    user_id = models.BigIntegerField(primary_key=True)
+    recipe_count = models.BigIntegerField(default=0)
+    time_minutes_total = models.BigIntegerField(default=0)
+    objects = RecipeStatsManager()
+
+
+class RecipeStatsBucket(models.Model):
+    """Number of recipes of a user by cooking time or price bucket"""
+    TIME = 'time'
+    PRICE = 'price'
+    KIND_CHOICES = ((TIME, 'Cooking time in minutes'), (PRICE, 'Price bucket in cents'))
+
+    user_id = models.BigIntegerField()
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    bucket = models.IntegerField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user_id', 'kind', 'bucket')
+
+
+class Job(models.Model):
+    """
+    Background work run by the run_jobs command, see core.jobs.
+
+    A worker claims a job with a lease until `locked_until` and runs it in
+    steps, each committing its work and `progress` together. Failed jobs
+    are retried after a growing delay until `max_attempts` attempts.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # the runnable jobs, in the order workers claim them
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+
+class ImportProgress(models.Model):
+    """
+    Records of a file imported by the import_recipes command.
+
+    Saved in the transaction of every batch, so a resumed import starts
+    exactly after the last committed batch.
+    """
+    path = models.CharField(max_length=1024, primary_key=True)
+    done = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.path} ({self.done} records)'
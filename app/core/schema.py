@@ -0,0 +1,182 @@
+"""
+OpenAPI schema generated once and served from memory
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from drf_spectacular.views import SpectacularAPIView
+
+# bumped when the layout of the schema file changes
+SCHEMA_FILE_FORMAT = 1
+
+
+def get_schema_mode():
+    """Return 'off', 'memory' or 'file', see SCHEMA_PRECOMPUTE"""
+    return getattr(settings, 'SCHEMA_PRECOMPUTE', 'memory')
+
+
+def get_schema_file():
+    return getattr(settings, 'SCHEMA_FILE', None)
+
+
+class Representation:
+    """One rendering of the schema, with its ETag and gzip body"""
+
+    def __init__(self, content):
+        self.content = content
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()
+        # no timestamp in the header, the same bytes on every process
+        self.gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+
+
+class SchemaDocument:
+    """The schema rendered by every renderer of the schema view, by media type"""
+
+    def __init__(self, contents):
+        self.representations = {
+            media_type: Representation(content) for media_type, content in contents.items()
+        }
+
+    @classmethod
+    def generate(cls, view_class=SpectacularAPIView):
+        """Introspect the API and render the schema like the schema view does"""
+        generator = view_class.generator_class(urlconf=view_class.urlconf, api_version=view_class.api_version)
+        schema = generator.get_schema(request=None, public=view_class.serve_public)
+        return cls({
+            renderer.media_type: renderer.render(schema, renderer.media_type, {})
+            for renderer in (renderer_class() for renderer_class in view_class.renderer_classes)
+        })
+
+    @classmethod
+    def load(cls, path):
+        """Return the document saved at path, None when there is no usable one"""
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('format') != SCHEMA_FILE_FORMAT:
+            return None
+        return cls({media_type: content.encode('utf-8') for media_type, content in data['contents'].items()})
+
+    def save(self, path):
+        """Write the document to path atomically, so readers never see half of it"""
+        data = {
+            'format': SCHEMA_FILE_FORMAT,
+            'contents': {
+                media_type: representation.content.decode('utf-8')
+                for media_type, representation in self.representations.items()
+            },
+        }
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+
+    def __eq__(self, other):
+        return isinstance(other, SchemaDocument) and {
+            media_type: representation.content for media_type, representation in self.representations.items()
+        } == {media_type: representation.content for media_type, representation in other.representations.items()}
+
+
+_document = None
+_lock = threading.Lock()
+
+
+def get_schema_document():
+    """
+    Return the schema document of this process, building it on first use.
+
+    In 'file' mode the document written by the build_schema command is
+    loaded, or generated and written when the file is missing.
+    """
+    global _document
+    with _lock:
+        if _document is None:
+            path = get_schema_file() if get_schema_mode() == 'file' else None
+            document = SchemaDocument.load(path) if path else None
+            if document is None:
+                document = SchemaDocument.generate()
+                if path:
+                    document.save(path)
+            _document = document
+        return _document
+
+
+@receiver(setting_changed)
+def reset_schema_document(setting, **kwargs):
+    """Build the schema again after the schema settings change, as tests do"""
+    global _document
+    if setting.startswith('SCHEMA_') or setting == 'ROOT_URLCONF':
+        with _lock:
+            _document = None
+
+
+def warm_schema():
+    """Build the schema at startup, before the first request waits for it"""
+    if get_schema_mode() != 'off':
+        get_schema_document()
+
+
+def if_none_match(request):
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    # weak comparison, CompressionMiddleware weakens the ETags it encodes
+    return {etag[2:] if etag.startswith('W/') else etag for etag in etags}
+
+
+def accepts_gzip(request):
+    """Return whether Accept-Encoding allows gzip"""
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        if name.lower() == 'gzip':
+            quality = next((param[2:] for param in params if param.startswith('q=')), '1')
+            try:
+                return float(quality) > 0
+            except ValueError:
+                return False
+    return False
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    Serve the precomputed schema instead of introspecting the API per request.
+
+    The bytes are the ones the schema view renders for the negotiated media
+    type, with a strong ETag hashed from the content, answered with a 304
+    when it matches If-None-Match, and sent gzipped to clients accepting
+    it. Requests the document can't answer, asking for a translation or
+    an indented JSON, are generated as before.
+    """
+
+    def _get_schema_response(self, request):
+        representation = self.get_representation(request)
+        if representation is None:
+            return super()._get_schema_response(request)
+        renderer = request.accepted_renderer
+        content_type = f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type
+        if representation.etag in if_none_match(request):
+            response = HttpResponseNotModified()
+        elif accepts_gzip(request):
+            response = HttpResponse(representation.gzipped, content_type=content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(representation.content, content_type=content_type)
+        response['ETag'] = representation.etag
+        patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    def get_representation(self, request):
+        if get_schema_mode() == 'off' or (settings.USE_I18N and request.GET.get('lang')):
+            return None
+        # media type parameters like indent change the rendering
+        return get_schema_document().representations.get(request.accepted_media_type)
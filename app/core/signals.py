@@ -0,0 +1,60 @@
+"""
+Signal handlers keeping the caches in line with the database
+"""
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_tokens
+from core.models import CollectionVersion, Recipe, RecipeStats, RecipeStatsBucket, Tag
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Forget a token once it is deleted or regenerated"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Forget the tokens of a user so the cached user is reloaded"""
+    if not created:
+        invalidate_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_collection_version(sender, instance, created, raw=False, **kwargs):
+    """Start the version of new users so bumps are a single UPDATE"""
+    if created and not raw:
+        CollectionVersion.objects.bulk_create([CollectionVersion(user_id=instance.id)], ignore_conflicts=True)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def bump_deleted_user_version(sender, instance, **kwargs):
+    """Retire the cached representations of a deleted user"""
+    CollectionVersion.objects.bump(instance.id)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def delete_recipe_stats(sender, instance, **kwargs):
+    """Drop the emptied statistics of a deleted user"""
+    RecipeStats.objects.filter(user_id=instance.id).delete()
+    RecipeStatsBucket.objects.filter(user_id=instance.id).delete()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_collection_version(sender, instance, **kwargs):
+    """Mark the recipes and tags of the owner as changed"""
+    CollectionVersion.objects.bump(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_collection_version_on_tags(sender, instance, action, **kwargs):
+    """Mark the recipes of the owner as changed when tags are linked"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        CollectionVersion.objects.bump(instance.user_id)
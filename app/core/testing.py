@@ -0,0 +1,31 @@
+"""
+Test helpers
+"""
+from django.test import override_settings
+
+
+class QueryBudgetTestMixin:
+    """
+    Fail tests whose requests run more queries than their route budget.
+
+    Every response of the test client carries the `query_stats` recorded
+    by QueryInstrumentationMiddleware for assertions of its own.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # enabled for the class, test cases rarely call super().setUp()
+        strict = override_settings(QUERY_BUDGET_STRICT=True)
+        strict.enable()
+        cls.addClassCleanup(strict.disable)
+
+    def assertQueryStats(self, response, queries=None, duplicates=None):
+        """Assert the number of queries and duplicate queries of a request"""
+        stats = response.query_stats
+        if queries is not None:
+            self.assertEqual(stats.count, queries, f'{stats.count} queries run, {queries} expected')
+        if duplicates is not None:
+            self.assertEqual(
+                stats.duplicates, duplicates, f'{stats.duplicates} duplicate queries run, {duplicates} expected'
+            )
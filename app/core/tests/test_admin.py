@@ -2,10 +2,19 @@
 Tests for Django admin
 """
 
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator, estimate_count
+from core.models import Recipe, Tag
+
 
 class AdminSiteTests(TestCase):
     """Tests for django admin"""
@@ -47,3 +56,99 @@ class AdminSiteTests(TestCase):
         print(url)
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
+
+
+class LargeChangeListTests(TestCase):
+    """Test the changelists stay cheap on large tables"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser('admin@example.com', 'pass1234')
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user('cook@example.com', 'pass1234', name='Cook')
+        self.other = get_user_model().objects.create_user('other@example.com', 'pass1234', name='Other')
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        Recipe.objects.create(user=self.user, title='Lentil soup', time_minutes=30, price=Decimal('4.00'))
+        Recipe.objects.create(user=self.other, title='Apple pie', time_minutes=60, price=Decimal('6.00'))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(queries)
+
+    def test_no_query_per_row(self):
+        """Test the owners of the listed recipes and tags are joined, not fetched per row"""
+        for name in ('recipe', 'tag'):
+            with self.subTest(name):
+                url = reverse(f'admin:core_{name}_changelist')
+                before = self.changelist_queries(url)
+                for i in range(5):
+                    user = get_user_model().objects.create_user(f'{name}{i}@example.com', 'pass1234')
+                    Recipe.objects.create(user=user, title=f'Recipe {i}', time_minutes=5, price=Decimal('1.00'))
+                    Tag.objects.create(user=user, name=f'Tag {i}')
+                self.assertEqual(self.changelist_queries(url), before)
+
+    def test_owner_filter(self):
+        """Test the owner filter only lists the selected owner"""
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url, {'owner': self.user.id})
+        self.assertContains(res, 'Lentil soup')
+        self.assertNotContains(res, 'Apple pie')
+        self.assertNotContains(res, self.other.email)
+
+        res = self.client.get(url)
+        self.assertNotContains(res, f'?owner={self.other.id}"')
+        res = self.client.get(url, {'owner': 'x'})
+        self.assertNotContains(res, 'Lentil soup')
+
+    def test_user_links_to_recipes(self):
+        res = self.client.get(reverse('admin:core_user_changelist'))
+        self.assertContains(res, f'{reverse("admin:core_recipe_changelist")}?owner={self.user.id}')
+
+    def test_search(self):
+        res = self.client.get(reverse('admin:core_recipe_changelist'), {'q': 'soup'})
+        self.assertContains(res, 'Lentil soup')
+        self.assertNotContains(res, 'Apple pie')
+        res = self.client.get(reverse('admin:core_user_changelist'), {'q': 'COOK@'})
+        self.assertContains(res, self.user.email)
+        self.assertNotContains(res, self.other.email)
+        res = self.client.get(reverse('admin:core_tag_changelist'), {'q': 'veg'})
+        self.assertContains(res, 'Vegan')
+
+    @skipUnless(connection.vendor == 'postgresql', 'prefix search indexes are created on postgres')
+    def test_search_indexed(self):
+        """Test the prefix searches can use their indexes"""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for queryset, index in (
+            (get_user_model().objects.filter(email__istartswith='cook'), 'core_user_email_prefix_idx'),
+            (Tag.objects.filter(name__istartswith='veg'), 'core_tag_name_prefix_idx'),
+        ):
+            with self.subTest(index):
+                self.assertIn(index, queryset.explain())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Test counting changelists"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('cook@example.com', 'pass1234')
+        for i in range(3):
+            Tag.objects.create(user=user, name=f'Tag {i}')
+
+    @patch('core.admin.estimate_count', return_value=50000)
+    def test_estimate_above_threshold(self, mocked_estimate):
+        with self.settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=10000):
+            self.assertEqual(EstimatedCountPaginator(Tag.objects.order_by('id'), 2).count, 50000)
+            mocked_estimate.return_value = 9999
+            self.assertEqual(EstimatedCountPaginator(Tag.objects.order_by('id'), 2).count, 3)
+            mocked_estimate.return_value = None
+            self.assertEqual(EstimatedCountPaginator(Tag.objects.order_by('id'), 2).count, 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'estimates are read from postgres plans')
+    def test_estimate_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_tag')
+        self.assertEqual(estimate_count(Tag.objects.all()), 3)
+        self.assertIsInstance(estimate_count(Tag.objects.filter(name='Tag 1')), int)
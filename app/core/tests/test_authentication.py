@@ -0,0 +1,100 @@
+"""
+Tests for the cached token authentication
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication, get_token_cache, token_cache_key
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test resolving tokens through the cache"""
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='pass1234',
+            name='Test User'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_request_skips_token_query(self):
+        """Test the second request is authenticated from the cache"""
+        with self.assertNumQueries(2):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # the profile is read, without the token join
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Test an unknown token is not authenticated"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_invalidated(self):
+        """Test a deleted token stops authenticating"""
+        self.client.get(ME_URL)
+        self.token.delete()
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        """Test deactivating a user stops their cached token"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_not_written_back(self):
+        """Test changes made by another process survive a profile update"""
+        self.client.get(ME_URL)
+        # like another process, without the signals reaching this cache
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False, password=make_password('newpass123'), is_staff=True,
+        )
+        res = self.client.patch(ME_URL, {'name': 'B'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'B')
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(self.user.is_staff)
+        self.assertTrue(self.user.check_password('newpass123'))
+
+    def test_cache_holds_user_id_and_state(self):
+        """Test only the user id and whether they are active are cached"""
+        self.client.get(ME_URL)
+        self.assertEqual(get_token_cache().get(token_cache_key(self.token.key)), (self.user.id, True))
+        user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.get_deferred_fields(), {
+            field.attname for field in get_user_model()._meta.concrete_fields if not field.primary_key
+        })
+        self.assertEqual(token.user_id, self.user.id)
+
+        get_token_cache().set(token_cache_key(self.token.key), (self.user.id, False))
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_through_me_refreshes_user(self):
+        """Test updating the profile is visible on the next request"""
+        self.client.get(ME_URL)
+        res = self.client.patch(ME_URL, {'name': 'Other Name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'Other Name')
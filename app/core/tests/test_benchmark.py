@@ -0,0 +1,100 @@
+"""
+Tests for the endpoint benchmark
+"""
+import io
+import json
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from core.benchmark import SCENARIOS, compare, percentile
+from core.models import Recipe
+
+
+def result(**params):
+    """Helper function to build the result of an endpoint"""
+    defaults = {'throughput_rps': 100.0, 'p95_ms': 10.0, 'queries_max': 3, 'errors': 0}
+    defaults.update(params)
+    return defaults
+
+
+class BenchmarkStatsTests(SimpleTestCase):
+    """Test the statistics of benchmark runs"""
+
+    def test_percentile(self):
+        """Test the nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare_within_threshold(self):
+        """Test small changes aren't regressions"""
+        baseline = {'endpoints': {'me': result()}}
+        current = {'endpoints': {'me': result(throughput_rps=90.0, p95_ms=11.5), 'new': result()}}
+        self.assertEqual(compare(current, baseline, 0.2), [])
+
+    def test_compare_flags_regressions(self):
+        """Test slower, lower throughput, extra queries and errors are flagged"""
+        baseline = {'endpoints': {'me': result()}}
+        current = {'endpoints': {'me': result(throughput_rps=50.0, p95_ms=20.0, queries_max=4, errors=1)}}
+        regressions = compare(current, baseline, 0.2)
+        self.assertEqual(len(regressions), 4)
+        self.assertTrue(all(regression.startswith('me:') for regression in regressions))
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test running the benchmark command"""
+
+    def run_benchmark(self, *args):
+        out = io.StringIO()
+        call_command(
+            'benchmark', '--users', '2', '--recipes-per-user', '3', '--tags-per-user', '2',
+            '--requests', '3', '--warmup', '0', *args, stdout=out, stderr=io.StringIO()
+        )
+        return out.getvalue()
+
+    def test_benchmark_writes_results(self):
+        """Test every endpoint is measured and the seeded data removed"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'results.json')
+            self.run_benchmark('--output', output)
+            with open(output, encoding='utf-8') as file:
+                results = json.load(file)
+        self.assertEqual(set(results['endpoints']), {scenario.name for scenario in SCENARIOS})
+        for name, endpoint in results['endpoints'].items():
+            self.assertEqual(endpoint['errors'], 0, name)
+            self.assertEqual(endpoint['requests'], 3)
+            self.assertLessEqual(endpoint['p50_ms'], endpoint['p99_ms'])
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_baseline_regression(self):
+        """Test a run slower than its baseline fails"""
+        baseline = {'endpoints': {'me': result(throughput_rps=1e9, p95_ms=0.0001, queries_max=0)}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            json.dump(baseline, file)
+        self.addCleanup(os.remove, file.name)
+        with self.assertRaisesMessage(CommandError, 'regressions'):
+            self.run_benchmark('--endpoint', 'me', '--baseline', file.name)
+
+
+class EmailValidationBenchmarkTests(SimpleTestCase):
+    """Test the email validation benchmark"""
+
+    def test_linear(self):
+        out = io.StringIO()
+        call_command('benchmark_email_validation', '--sizes', '1000,10000', '--repeat', '1', stdout=out)
+        self.assertIn('grows linearly', out.getvalue())
+
+    def test_growth_reported(self):
+        """Test a growing time per character fails the benchmark"""
+        with self.assertRaisesMessage(CommandError, 'not linear'):
+            call_command(
+                'benchmark_email_validation', '--sizes', '1000,10000', '--max-growth', '0',
+                stdout=io.StringIO()
+            )
@@ -2,11 +2,20 @@
 test custom django commands
 """
 
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
 from unittest.mock import patch
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from psycopg2 import OperationalError as Psycopg2OperationalError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from core.management.commands.import_recipes import Command
+from core.models import ImportProgress, Recipe, RecipeStats, RecipeStatsBucket, Tag
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -25,3 +34,210 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(mocked_check.call_count, 6)
         mocked_check.assert_called_with(databases=['default'])
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test importing recipes from files"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def write_jsonl(self, records):
+        return self.write('recipes.jsonl', ''.join(json.dumps(record) + '\n' for record in records))
+
+    def records(self, count, **extra):
+        return [
+            {
+                'user': f'cook{i % 2}@example.com',
+                'user_name': f'Cook {i % 2}',
+                'title': f'Recipe {i}',
+                'time_minutes': 10 + i,
+                'price': '4.50',
+                'description': 'Imported',
+                'tags': ['Imported', f'Tag {i % 3}'],
+                **extra,
+            }
+            for i in range(count)
+        ]
+
+    def assert_imported(self, count):
+        self.assertEqual(Recipe.objects.count(), count)
+        self.assertEqual(get_user_model().objects.count(), 2)
+        cook = get_user_model().objects.get(email='cook0@example.com')
+        self.assertEqual(cook.name, 'Cook 0')
+        self.assertFalse(get_user_model().objects.get(email='cook1@example.com').has_usable_password())
+        recipe = Recipe.objects.get(title='Recipe 4')
+        self.assertEqual(recipe.user, cook)
+        self.assertEqual(recipe.price, Decimal('4.50'))
+        self.assertEqual(sorted(recipe.tags.values_list('name', flat=True)), ['Imported', 'Tag 1'])
+        self.assertEqual(Tag.objects.filter(user=cook, name='Imported').count(), 1)
+        # the links of both import methods are counted by the triggers
+        self.assertEqual(Tag.objects.get(user=cook, name='Imported').usage, Recipe.objects.filter(user=cook).count())
+
+    def test_import_jsonl_bulk(self):
+        """Test importing a JSONL file with bulk_create"""
+        path = self.write_jsonl(self.records(7))
+        call_command('import_recipes', path, method='bulk', batch_size=3, stdout=io.StringIO())
+        self.assert_imported(7)
+        self.assertFalse(ImportProgress.objects.exists())
+
+    def test_import_jsonl_copy(self):
+        """Test importing a JSONL file through COPY on postgres"""
+        if connection.vendor != 'postgresql':
+            self.skipTest('COPY needs postgres')
+        get_user_model().objects.create_user('cook0@example.com', 'pass1234', name='Cook 0')
+        path = self.write_jsonl(self.records(7))
+        call_command('import_recipes', path, method='copy', batch_size=3, stdout=io.StringIO())
+        self.assert_imported(7)
+        self.assertTrue(get_user_model().objects.get(email='cook0@example.com').check_password('pass1234'))
+
+    def test_import_csv(self):
+        """Test importing a CSV file with ; separated tags"""
+        records = self.records(7)
+        lines = ['user,user_name,title,time_minutes,price,description,tags']
+        lines += [
+            f"{r['user']},{r['user_name']},{r['title']},{r['time_minutes']},{r['price']},"
+            f"{r['description']},{';'.join(r['tags'])}"
+            for r in records
+        ]
+        path = self.write('recipes.csv', '\n'.join(lines) + '\n')
+        call_command('import_recipes', path, stdout=io.StringIO())
+        self.assert_imported(7)
+
+    def test_invalid_records_skipped(self):
+        """Test invalid records are reported and the others imported"""
+        records = self.records(4)
+        records[1]['time_minutes'] = 'soon'
+        records[3]['user'] = 'cook@@example.com'
+        path = self.write_jsonl(records)
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write('{"title": "Truncated\n')
+        stderr, out = io.StringIO(), io.StringIO()
+        call_command('import_recipes', path, stdout=out, stderr=stderr)
+        self.assertEqual(Recipe.objects.count(), 2)
+        for number in (2, 4, 5):
+            self.assertIn(f'record {number}', stderr.getvalue())
+        self.assertIn('skipped 3 records', out.getvalue())
+
+    def test_resume_from_progress(self):
+        """Test an import resumes after the records of its saved progress"""
+        path = self.write_jsonl(self.records(7))
+        ImportProgress.objects.create(path=os.path.abspath(path), done=5)
+        out = io.StringIO()
+        call_command('import_recipes', path, stdout=out)
+        self.assertIn('Resuming after 5 records', out.getvalue())
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Recipe 5', 'Recipe 6']
+        )
+
+    def test_failed_batch_not_recorded(self):
+        """Test the progress of a batch is rolled back with it, so a rerun imports it once"""
+        path = self.write_jsonl(self.records(7))
+        import_bulk = Command._import_bulk
+        calls = []
+
+        def fail_second_batch(command, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                import_bulk(command, rows)
+                raise RuntimeError('crashed')
+            import_bulk(command, rows)
+
+        with patch.object(Command, '_import_bulk', fail_second_batch), self.assertRaises(RuntimeError):
+            call_command('import_recipes', path, method='bulk', batch_size=3, stdout=io.StringIO())
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(ImportProgress.objects.get().done, 3)
+
+        call_command('import_recipes', path, method='bulk', batch_size=3, stdout=io.StringIO())
+        self.assert_imported(7)
+
+
+class BenchmarkListCommandTests(TestCase):
+    """Test benchmarking the recipe list"""
+
+    def test_benchmark_list(self):
+        """Test the benchmark reports a speedup and rolls back its data"""
+        out = io.StringIO()
+        call_command('benchmark_list', rows=20, tags=2, repeat=1, stdout=out)
+        self.assertIn('speedup', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class RepairTagUsageCommandTests(TestCase):
+    """Test reconciling the tag usage counts"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.tags = Tag.objects.get_or_create_many(self.user, ['Vegan', 'Dessert', 'Unused'])
+        recipe = Recipe.objects.create(user=self.user, title='Cake', time_minutes=5, price=Decimal('1.00'))
+        recipe.tags.add(*self.tags[:2])
+
+    def usage(self):
+        return dict(Tag.objects.values_list('name', 'usage'))
+
+    def test_repair_drift(self):
+        """Test drifted counts are recounted from the links"""
+        Tag.objects.filter(name='Vegan').update(usage=7)
+        Tag.objects.filter(name='Unused').update(usage=2)
+        out = io.StringIO()
+        call_command('repair_tag_usage', batch_size=2, stdout=out)
+        self.assertIn('3 tags checked, 2 repaired', out.getvalue())
+        self.assertEqual(self.usage(), {'Vegan': 1, 'Dessert': 1, 'Unused': 0})
+
+    def test_dry_run(self):
+        """Test a dry run only reports the drift"""
+        Tag.objects.filter(name='Vegan').update(usage=7)
+        out = io.StringIO()
+        call_command('repair_tag_usage', dry_run=True, stdout=out)
+        self.assertIn('1 drifted', out.getvalue())
+        self.assertEqual(self.usage()['Vegan'], 7)
+
+    def test_counts_in_sync(self):
+        """Test the triggers leave nothing to repair"""
+        out = io.StringIO()
+        call_command('repair_tag_usage', user=self.user.id, stdout=out)
+        self.assertIn('3 tags checked, 0 repaired', out.getvalue())
+
+
+class RebuildRecipeStatsCommandTests(TestCase):
+    """Test rebuilding the recipe statistics"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        Recipe.objects.create(user=self.user, title='Cake', time_minutes=5, price=Decimal('1.00'))
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=20, price=Decimal('8.00'))
+
+    def test_in_sync(self):
+        """Test the triggers leave nothing to rebuild"""
+        out = io.StringIO()
+        call_command('rebuild_recipe_stats', verify=True, stdout=out)
+        self.assertIn('1 users checked, 0 differ', out.getvalue())
+
+    def test_verify_reports_differences(self):
+        """Test verifying fails on drifted statistics without fixing them"""
+        RecipeStats.objects.filter(user_id=self.user.id).update(recipe_count=9)
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_stats', verify=True, stdout=out)
+        self.assertIn(f'user {self.user.id}', out.getvalue())
+        self.assertEqual(RecipeStats.objects.get(user_id=self.user.id).recipe_count, 9)
+
+    def test_rebuild(self):
+        """Test drifted statistics, also of deleted users, are rebuilt"""
+        RecipeStats.objects.filter(user_id=self.user.id).update(time_minutes_total=0)
+        RecipeStatsBucket.objects.filter(user_id=self.user.id, kind=RecipeStatsBucket.TIME).delete()
+        RecipeStats.objects.create(user_id=self.user.id + 100, recipe_count=3)
+        out = io.StringIO()
+        call_command('rebuild_recipe_stats', batch_size=1, stdout=out)
+        self.assertIn('2 users checked, 2 rebuilt', out.getvalue())
+        self.assertEqual(RecipeStats.objects.stored(), RecipeStats.objects.live())
+        self.assertEqual(RecipeStats.objects.stored()[self.user.id]['time'], {5: 1, 20: 1})
@@ -0,0 +1,176 @@
+"""
+Tests for the response compression
+"""
+import gzip
+import os
+import zlib
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import compression
+from core.compression import CompressionMiddleware, GzipEncoder, negotiate_encoder, parse_accept_encoding
+from core.models import Recipe
+from recipe.caching import get_response_cache
+
+
+BODY = b'{"title": "Recipe", "description": "Slow cooked"}' * 100
+
+
+def middleware(response, **headers):
+    """Helper function running a response through the middleware"""
+    request = RequestFactory().get('/', **headers)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+class NegotiationTests(SimpleTestCase):
+    """Test choosing the encoding from Accept-Encoding"""
+
+    def setUp(self):
+        self.encoders = [GzipEncoder(6)]
+        self.encoders[0].name = 'br'
+        self.encoders.append(GzipEncoder(6))
+
+    def test_parse(self):
+        self.assertEqual(
+            parse_accept_encoding('gzip;q=0.5, br , zstd;q=x, identity; q=0'),
+            {'gzip': 0.5, 'br': 1.0, 'zstd': 0.0, 'identity': 0.0}
+        )
+
+    def test_client_preference_wins(self):
+        self.assertEqual(negotiate_encoder('br;q=0.5, gzip', self.encoders).name, 'gzip')
+
+    def test_server_preference_breaks_ties(self):
+        self.assertEqual(negotiate_encoder('gzip, br', self.encoders).name, 'br')
+        self.assertEqual(negotiate_encoder('*', self.encoders).name, 'br')
+
+    def test_nothing_accepted(self):
+        self.assertIsNone(negotiate_encoder('', self.encoders))
+        self.assertIsNone(negotiate_encoder('gzip;q=0, deflate', self.encoders))
+        self.assertEqual(negotiate_encoder('*, br;q=0', self.encoders).name, 'gzip')
+
+
+@override_settings(COMPRESSION_ENCODINGS=('gzip',))
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test which responses are compressed and how"""
+
+    def test_compressed(self):
+        res = middleware(HttpResponse(BODY, content_type='application/json'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), BODY)
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+
+    def test_not_accepted(self):
+        res = middleware(HttpResponse(BODY))
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+
+    @override_settings(COMPRESSION_MIN_SIZE=len(BODY) + 1)
+    def test_below_threshold(self):
+        res = middleware(HttpResponse(BODY), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res.content, BODY)
+
+    def test_skipped(self):
+        """Test encoded, compressed media, empty and incompressible bodies are sent as they are"""
+        encoded = HttpResponse(BODY)
+        encoded['Content-Encoding'] = 'br'
+        random = os.urandom(4096)
+        for response in (
+            encoded,
+            HttpResponse(BODY, content_type='image/png'),
+            HttpResponse(BODY, content_type='application/zip'),
+            HttpResponseNotModified(),
+            HttpResponse(random),
+        ):
+            with self.subTest(content_type=response.get('Content-Type'), status=response.status_code):
+                content = response.content
+                res = middleware(response, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(res.content, content)
+                self.assertEqual(res.get('Content-Encoding'), response.get('Content-Encoding'))
+
+    def test_etag_weakened(self):
+        response = HttpResponse(BODY)
+        response['ETag'] = '"abc"'
+        res = middleware(response, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['ETag'], 'W/"abc"')
+
+    def test_streaming(self):
+        """Test chunks are compressed as they are produced"""
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield BODY
+        res = middleware(StreamingHttpResponse(chunks()), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        stream = iter(res.streaming_content)
+        decompressor = zlib.decompressobj(wbits=31)
+        self.assertEqual(decompressor.decompress(next(stream)), BODY)
+        self.assertEqual(produced, [0])
+        self.assertEqual(decompressor.decompress(b''.join(stream)) + decompressor.flush(), BODY * 2)
+
+    def test_async(self):
+        async def get_response(request):
+            return HttpResponse(BODY)
+        instance = CompressionMiddleware(get_response)
+        self.assertTrue(instance._is_coroutine)
+        res = async_to_sync(instance)(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(gzip.decompress(res.content), BODY)
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    @override_settings(COMPRESSION_ENCODINGS=('br', 'gzip'))
+    def test_brotli(self):
+        res = middleware(HttpResponse(BODY), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(res.content), BODY)
+
+    @skipUnless(compression.zstandard, 'zstandard is not installed')
+    @override_settings(COMPRESSION_ENCODINGS=('zstd', 'gzip'))
+    def test_zstd(self):
+        res = middleware(HttpResponse(BODY), HTTP_ACCEPT_ENCODING='gzip, zstd')
+        self.assertEqual(res['Content-Encoding'], 'zstd')
+        self.assertEqual(compression.zstandard.ZstdDecompressor().decompressobj().decompress(res.content), BODY)
+
+
+@override_settings(COMPRESSION_ENCODINGS=('gzip',), COMPRESSION_MIN_SIZE=256)
+class CompressedApiTests(TestCase):
+    """Test compressing the recipe API responses"""
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(20):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=i, price=Decimal('5.00'), description='Slow'
+            )
+
+    def test_list_compressed_once(self):
+        """Test a cached list is compressed once and served from the cache"""
+        url = reverse('recipe:recipe-list')
+        plain = self.client.get(url)
+        with mock.patch.object(GzipEncoder, 'compress', autospec=True, side_effect=GzipEncoder.compress) as compress:
+            first = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(second.content), plain.content)
+        self.assertEqual(second['ETag'], 'W/' + plain['ETag'])
+        res = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+    def test_export_streamed_compressed(self):
+        res = self.client.get(reverse('recipe:recipe-export'), HTTP_ACCEPT_ENCODING='gzip', HTTP_ACCEPT='text/csv')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn(b'Recipe 19', gzip.decompress(b''.join(res.streaming_content)))
@@ -0,0 +1,83 @@
+"""
+Tests for the health checked database connections
+"""
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.connections import get_connection_metrics
+
+
+METRICS_URL = reverse('db-metrics')
+
+
+class HealthCheckedConnectionTests(TestCase):
+    """Test reusing connections between requests"""
+
+    def create_wrapper(self, alias, **settings):
+        """Return a new wrapper of the test database, closed at the end of the test"""
+        default = connections['default']
+        wrapper = type(default)({**default.settings_dict, 'CONN_MAX_AGE': 60, **settings}, alias=alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def next_request(self, wrapper):
+        """Do what Django does between two requests, then use the connection"""
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_connection_reused(self):
+        """Test a healthy connection is checked once per request and reused"""
+        wrapper = self.create_wrapper('reused')
+        self.next_request(wrapper)
+        raw = wrapper.connection
+        self.next_request(wrapper)
+        with wrapper.cursor():
+            pass
+        self.assertIs(wrapper.connection, raw)
+        metrics = get_connection_metrics()['reused']
+        self.assertEqual(metrics['checkouts'], 2)
+        self.assertEqual(metrics['reused'], 1)
+        self.assertEqual(metrics['connections_opened'], 1)
+        self.assertEqual(metrics['health_checks'], 1)
+        self.assertEqual(metrics['open'], 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'sqlite connections are always usable')
+    def test_broken_connection_replaced(self):
+        """Test a connection lost between requests is replaced, not failing the request"""
+        wrapper = self.create_wrapper('broken')
+        self.next_request(wrapper)
+        # e.g. closed by a failover or the server's idle timeout
+        wrapper.connection.close()
+        self.next_request(wrapper)
+        metrics = get_connection_metrics()['broken']
+        self.assertEqual(metrics['health_check_failures'], 1)
+        self.assertEqual(metrics['connections_opened'], 2)
+        self.assertEqual(metrics['reused'], 0)
+
+    def test_health_checks_disabled(self):
+        """Test CONN_HEALTH_CHECKS turns the check off"""
+        wrapper = self.create_wrapper('unchecked', CONN_HEALTH_CHECKS=False)
+        self.next_request(wrapper)
+        self.next_request(wrapper)
+        metrics = get_connection_metrics()['unchecked']
+        self.assertEqual(metrics['health_checks'], 0)
+        self.assertEqual(metrics['reused'], 1)
+
+    def test_metrics_staff_only(self):
+        """Test the metrics endpoint is only served to staff"""
+        client = APIClient()
+        user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        client.force_authenticate(user)
+        self.assertEqual(client.get(METRICS_URL).status_code, status.HTTP_403_FORBIDDEN)
+        client.force_authenticate(get_user_model().objects.create_superuser('admin@example.com', 'pass1234'))
+        res = client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('checkouts', res.json()['default'])
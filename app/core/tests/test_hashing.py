@@ -0,0 +1,119 @@
+"""
+Tests for the password hashing pool
+"""
+import threading
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password as django_check_password, make_password as django_make_password
+from django.test import TestCase, override_settings
+
+from core import hashing
+
+
+PBKDF2_THEN_MD5 = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+
+class HashingPoolTests(TestCase):
+    """Test hashing passwords on the worker pool"""
+
+    def test_hash_on_workers(self):
+        """Test hashes made by the workers are regular django hashes"""
+        encoded = hashing.make_password('pass1234')
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+        self.assertTrue(django_check_password('pass1234', encoded))
+        self.assertEqual(hashing.check_password('pass1234', encoded), (True, None))
+        self.assertEqual(hashing.check_password('wrong', encoded), (False, None))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_hash_inline(self):
+        """Test no workers hashes on the calling thread"""
+        encoded = hashing.make_password('pass1234')
+        self.assertEqual(hashing.check_password('pass1234', encoded), (True, None))
+
+    def test_unusable_passwords(self):
+        """Test missing passwords and hashes are never checked"""
+        self.assertFalse(hashing.make_password(None).startswith('pbkdf2'))
+        self.assertEqual(hashing.check_password(None, django_make_password('x')), (False, None))
+        self.assertEqual(hashing.check_password('x', django_make_password(None)), (False, None))
+        self.assertEqual(hashing.check_password('x', 'garbage'), (False, None))
+
+    @override_settings(PASSWORD_HASHING_QUEUE=0)
+    def test_queue_full(self):
+        """Test a full queue fails fast instead of waiting"""
+        with self.assertRaises(hashing.HashingUnavailable):
+            hashing.make_password('pass1234')
+
+    def test_slots_held_while_hashing(self):
+        """Test only PASSWORD_HASHING_QUEUE hashes run at once"""
+        pool = hashing.HashingPool(workers=0, queue=1, timeout=10)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'done'
+        thread = threading.Thread(target=pool.run, args=(slow,))
+        thread.start()
+        started.wait(5)
+        with self.assertRaises(hashing.HashingUnavailable):
+            pool.run(str, 'x')
+        release.set()
+        thread.join()
+        self.assertEqual(pool.run(str, 'x'), 'x')
+
+    def test_hash_many_on_every_worker(self):
+        """Test many passwords are hashed in chunks, in order"""
+        passwords = [f'pass{i}' for i in range(5)]
+        hashes = hashing.make_passwords(passwords)
+        self.assertEqual(len(hashes), 5)
+        for password, encoded in zip(passwords, hashes):
+            self.assertTrue(django_check_password(password, encoded))
+        self.assertEqual(hashing.make_passwords([]), [])
+
+    def test_chunks_bounded(self):
+        """Test a batch only holds as many queue slots as chunks it runs at once"""
+        pool = hashing.HashingPool(workers=2, queue=1, timeout=10)
+        self.addCleanup(pool.shutdown)
+        hashes = pool.run_chunks(hashing._make_passwords, ['a', 'b', 'c', 'd', 'e'], chunk_size=2, concurrency=1)
+        self.assertEqual([django_check_password(password, encoded) for password, encoded in zip('abcde', hashes)],
+                         [True] * 5)
+        with self.assertRaises(hashing.HashingUnavailable):
+            pool.run_chunks(hashing._make_passwords, ['a', 'b', 'c'], chunk_size=1, concurrency=2)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=2, PASSWORD_HASHING_TIMEOUT=2, PASSWORD_HASHING_BULK_WORKERS=1)
+    def test_batch_leaves_workers_to_logins(self):
+        """Test passwords are checked within the timeout while a batch is hashed"""
+        encoded = hashing.make_password('pass1234')
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(hashing.make_passwords([f'pass{i}' for i in range(16)]))
+        )
+        thread.start()
+        try:
+            for _attempt in range(3):
+                self.assertEqual(hashing.check_password('pass1234', encoded), (True, None))
+        finally:
+            thread.join()
+        self.assertEqual(len(results[0]), 16)
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_THEN_MD5)
+    def test_outdated_hash_upgraded(self):
+        """Test a correct password of another hasher returns a new hash"""
+        encoded = django_make_password('pass1234', hasher='md5')
+        is_correct, upgraded = hashing.check_password('pass1234', encoded)
+        self.assertTrue(is_correct)
+        self.assertTrue(upgraded.startswith('pbkdf2_sha256$'))
+        self.assertEqual(hashing.check_password('wrong', encoded), (False, None))
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_THEN_MD5)
+    def test_user_hash_upgraded(self):
+        """Test checking a user password saves the upgraded hash"""
+        user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        user.password = django_make_password('pass1234', hasher='md5')
+        user.save()
+        self.assertTrue(user.check_password('pass1234'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
@@ -0,0 +1,89 @@
+"""
+Tests for the query instrumentation middleware
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.instrumentation import QueryBudgetExceeded, QueryStats, get_query_budget
+from core.testing import QueryBudgetTestMixin
+
+
+ME_URL = reverse('user:me')
+
+
+class QueryStatsTests(TestCase):
+    """Test recording the queries of a request"""
+
+    def test_counts_time_and_duplicates(self):
+        """Test repeated queries with the same parameters are duplicates"""
+        stats = QueryStats()
+        with connection.execute_wrapper(stats), connection.cursor() as cursor:
+            cursor.execute('SELECT %s', [1])
+            cursor.execute('SELECT %s', [1])
+            cursor.execute('SELECT %s', [2])
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.duplicates, 1)
+        self.assertGreater(stats.duration, 0)
+
+    @override_settings(QUERY_BUDGETS={'a': 3, 'b': {'GET': 1}})
+    def test_budget_lookup(self):
+        """Test budgets are declared per route or per route and method"""
+        self.assertEqual(get_query_budget('a', 'POST'), 3)
+        self.assertEqual(get_query_budget('b', 'GET'), 1)
+        self.assertIsNone(get_query_budget('b', 'POST'))
+        self.assertIsNone(get_query_budget('c', 'GET'))
+
+
+class QueryInstrumentationMiddlewareTests(QueryBudgetTestMixin, TestCase):
+    """Test the query instrumentation of requests"""
+
+    def setUp(self):
+        """Setting up the test"""
+        super().setUp()
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stats_attached(self):
+        """Test responses carry the stats of their request"""
+        res = self.client.patch(ME_URL, {'name': 'New'})
+        self.assertQueryStats(res, duplicates=0)
+        self.assertGreater(res.query_stats.count, 0)
+
+    def test_headers_off_by_default(self):
+        """Test the headers are only sent when enabled"""
+        res = self.client.get(ME_URL)
+        self.assertNotIn('Server-Timing', res)
+        self.assertNotIn('X-DB-Queries', res)
+
+    @override_settings(QUERY_INSTRUMENTATION_HEADERS=True)
+    def test_headers(self):
+        """Test the query count and database time headers"""
+        res = self.client.patch(ME_URL, {'name': 'New'})
+        self.assertEqual(res['X-DB-Queries'], str(res.query_stats.count))
+        self.assertRegex(res['Server-Timing'], r'^db;dur=\d+\.\d{3};desc="\d+ queries, 0 duplicates"$')
+
+    def test_structured_log(self):
+        """Test every request is logged with its stats"""
+        with self.assertLogs('core.queries', 'DEBUG') as logs:
+            self.client.get(ME_URL)
+        record = logs.records[0]
+        self.assertEqual(record.query_stats['route'], 'user:me')
+        self.assertEqual(record.query_stats['method'], 'GET')
+        self.assertIn('queries=', record.getMessage())
+
+    @override_settings(QUERY_BUDGETS={'user:me': {'PATCH': 0}})
+    def test_budget_exceeded_fails_tests(self):
+        """Test exceeding a budget raises in strict mode"""
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'PATCH user:me'):
+            self.client.patch(ME_URL, {'name': 'New'})
+
+    @override_settings(QUERY_BUDGETS={'user:me': 0}, QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logs_warning(self):
+        """Test exceeding a budget logs a warning in production"""
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            res = self.client.patch(ME_URL, {'name': 'New'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(logs.records[0].query_stats['budget'], 0)
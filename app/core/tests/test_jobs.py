@@ -0,0 +1,122 @@
+"""
+Tests for the background job runner
+"""
+import io
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+STEPS = 'tests.steps'
+FLAKY = 'tests.flaky'
+
+
+@jobs.register(STEPS)
+def count_steps(job):
+    job.progress['steps'] = job.progress.get('steps', 0) + 1
+    return job.progress['steps'] >= job.payload['steps']
+
+
+@jobs.register(FLAKY)
+def fail_on_second_step(job):
+    job.progress['steps'] = job.progress.get('steps', 0) + 1
+    if job.progress['steps'] == 2:
+        raise ValueError('step failed')
+    return False
+
+
+@override_settings(JOB_RETRY_DELAY=10, JOB_RETRY_MAX_DELAY=25)
+class JobRunnerTests(TestCase):
+    """Test claiming, running and retrying jobs"""
+
+    def setUp(self):
+        self.runner = jobs.JobRunner(worker='test-worker')
+
+    def test_run_steps(self):
+        """Test a job runs step by step until done"""
+        job = jobs.enqueue(STEPS, {'steps': 3})
+        self.assertEqual(self.runner.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.progress, {'steps': 3})
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job.locked_until)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.runner.run_pending(), 0)
+
+    def test_retry_with_backoff(self):
+        """Test a failed job keeps the progress of its committed steps and is retried later"""
+        job = jobs.enqueue(FLAKY, max_attempts=3)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.runner.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.progress, {'steps': 1})
+        self.assertIn('step failed', job.last_error)
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 10, delta=2)
+        # not runnable before the delay
+        self.assertIsNone(self.runner.claim())
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.runner.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 20, delta=2)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now(), progress={'steps': 0})
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.runner.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_delay_bounded(self):
+        self.assertEqual([jobs.retry_delay(attempts) for attempts in (1, 2, 3, 4)], [10, 20, 25, 25])
+
+    def test_unknown_kind_fails(self):
+        job = jobs.enqueue('tests.unknown', max_attempts=1)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.runner.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('No handler registered', job.last_error)
+
+    def test_leased_jobs_not_claimed(self):
+        """Test a job leased to a worker is only taken over once the lease expired"""
+        job = jobs.enqueue(STEPS, {'steps': 1})
+        self.assertEqual(self.runner.claim(), job)
+        other = jobs.JobRunner(worker='other-worker')
+        self.assertIsNone(other.claim())
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        claimed = other.claim()
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.locked_by, 'other-worker')
+        self.assertEqual(claimed.attempts, 2)
+
+    def test_lost_lease_rolls_back_step(self):
+        """Test a worker whose job was taken over doesn't save its step"""
+        jobs.enqueue(STEPS, {'steps': 2})
+        job = self.runner.claim()
+        Job.objects.filter(pk=job.pk).update(locked_by='other-worker', attempts=2)
+        with self.assertLogs('core.jobs', 'WARNING') as logs:
+            self.runner.run(job)
+        self.assertIn('Lost the lease', logs.output[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.progress, {})
+        self.assertEqual(job.locked_by, 'other-worker')
+
+    def test_run_jobs_command(self):
+        jobs.enqueue(STEPS, {'steps': 2})
+        jobs.enqueue(STEPS, {'steps': 1})
+        out = io.StringIO()
+        call_command('run_jobs', once=True, stdout=out)
+        self.assertIn('2 jobs run', out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 2)
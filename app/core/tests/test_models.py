@@ -49,6 +49,30 @@ class TestModel(TestCase):
             except ValueError:
                 self.fail(f'Unexpected ValueError for {valid_email}')
 
+    def test_bulk_create_users(self):
+        """Test creating many users with hashed passwords at once"""
+        users = get_user_model().objects.bulk_create_users([
+            {'email': f'user{i}@EXAMPLE.com', 'password': f'pass{i}', 'name': f'User {i}'} for i in range(3)
+        ] + [{'email': 'nopass@example.com', 'name': 'No password', 'is_staff': True}])
+        self.assertEqual([user.email for user in users][:2], ['user0@example.com', 'user1@example.com'])
+        self.assertTrue(all(user.pk for user in users))
+        for i, user in enumerate(get_user_model().objects.filter(email__startswith='user').order_by('email')):
+            self.assertTrue(user.check_password(f'pass{i}'))
+            self.assertEqual(user.name, f'User {i}')
+        no_password = get_user_model().objects.get(email='nopass@example.com')
+        self.assertFalse(no_password.has_usable_password())
+        self.assertFalse(no_password.is_staff)
+        self.assertTrue(models.CollectionVersion.objects.filter(user_id=users[0].pk).exists())
+
+    def test_bulk_create_users_invalid_email(self):
+        """Test nothing is created when an email is invalid"""
+        with self.assertRaises(ValueError):
+            get_user_model().objects.bulk_create_users([
+                {'email': 'ok@example.com', 'password': 'pass1234'},
+                {'email': 'a/b@example.com', 'password': 'pass1234'},
+            ])
+        self.assertFalse(get_user_model().objects.exists())
+
     def test_create_superuser(self):
         """Test creating a new superuser"""
         user = get_user_model().objects.create_superuser(
@@ -0,0 +1,189 @@
+"""
+Tests for the read replica routing
+"""
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication, get_token_cache
+from core.checks import check_replica_pin_cache
+from core.db import routers
+from core.models import Recipe
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class RoutingMixin:
+    """Helpers running code as if inside a request"""
+
+    def route(self, method='GET', cookies=None, response=None):
+        """Return the database of reads during a request and the response"""
+        request = RequestFactory().generic(method, '/')
+        request.COOKIES.update(cookies or {})
+        used = []
+
+        def get_response(request):
+            used.append(routers.ReplicaRouter().db_for_read(Recipe))
+            return response or HttpResponse()
+        response = routers.ReplicaRoutingMiddleware(get_response)(request)
+        return used[0], response
+
+
+@override_settings(READ_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(RoutingMixin, SimpleTestCase):
+    """Test choosing the database of a query"""
+
+    def setUp(self):
+        routers.get_pin_cache().clear()
+
+    def test_outside_requests_primary(self):
+        """Test commands and shells only use the primary"""
+        self.assertEqual(routers.ReplicaRouter().db_for_read(Recipe), 'default')
+
+    def test_safe_requests_replica(self):
+        """Test reads of safe requests go to a replica"""
+        self.assertIn(self.route('GET')[0], ['replica1', 'replica2'])
+        self.assertIn(self.route('HEAD')[0], ['replica1', 'replica2'])
+
+    def test_unsafe_requests_primary(self):
+        """Test reads of writing requests stay on the primary"""
+        self.assertEqual(self.route('POST')[0], 'default')
+        self.assertEqual(self.route('PATCH')[0], 'default')
+
+    def test_writes_primary(self):
+        """Test writes always go to the primary"""
+        self.assertEqual(routers.ReplicaRouter().db_for_write(Recipe), 'default')
+
+    @override_settings(READ_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test everything uses the primary without replicas"""
+        self.assertEqual(self.route('GET')[0], 'default')
+        self.assertNotIn(settings.READ_REPLICA_PIN_COOKIE, self.route('POST')[1].cookies)
+
+    def test_write_sets_pin_cookie(self):
+        """Test a successful write pins the client with a cookie"""
+        _db, response = self.route('POST')
+        cookie = response.cookies[settings.READ_REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.READ_REPLICA_PIN_SECONDS)
+        self.assertEqual(self.route('GET', {cookie.key: cookie.value})[0], 'default')
+
+    def test_failed_write_not_pinned(self):
+        """Test rejected writes change nothing, so don't pin"""
+        _db, response = self.route('POST', response=HttpResponse(status=400))
+        self.assertNotIn(settings.READ_REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_bounded(self):
+        """Test the cookie can't pin a client past the pin window"""
+        cookie = settings.READ_REPLICA_PIN_COOKIE
+        self.assertNotEqual(self.route('GET', {cookie: str(time.time() + 3600)})[0], 'default')
+        self.assertNotEqual(self.route('GET', {cookie: str(time.time() - 1)})[0], 'default')
+        self.assertNotEqual(self.route('GET', {cookie: 'invalid'})[0], 'default')
+
+    def test_pinned_user_primary(self):
+        """Test authenticating a user who wrote recently moves the reads to the primary"""
+        routers.pin_user(1)
+
+        def get_response(request):
+            routers.user_authenticated(2)
+            other = routers.ReplicaRouter().db_for_read(Recipe)
+            routers.user_authenticated(1)
+            return HttpResponse(f'{other} {routers.ReplicaRouter().db_for_read(Recipe)}')
+        response = routers.ReplicaRoutingMiddleware(get_response)(RequestFactory().get('/'))
+        other, pinned = response.content.decode().split()
+        self.assertNotEqual(other, 'default')
+        self.assertEqual(pinned, 'default')
+
+
+class ReplicaPinCacheCheckTests(SimpleTestCase):
+    """Test the pins must be shared between processes"""
+
+    def test_per_process_cache_fails(self):
+        with self.settings(READ_REPLICAS=['replica1'], READ_REPLICA_PIN_CACHE_ALIAS='default'):
+            self.assertEqual([error.id for error in check_replica_pin_cache(None)], ['core.E001'])
+        with self.settings(READ_REPLICAS=[], READ_REPLICA_PIN_CACHE_ALIAS='default'):
+            self.assertEqual(check_replica_pin_cache(None), [])
+
+    def test_shared_cache_passes(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(READ_REPLICAS=['replica1']):
+            with mock.patch.object(routers, 'get_pin_cache', return_value=FileBasedCache(directory, {})):
+                self.assertEqual(check_replica_pin_cache(None), [])
+
+
+@override_settings(READ_REPLICAS=['replica1'])
+class ReplicaTokenTests(TestCase):
+    """Test token lookups on replicas"""
+
+    def test_token_missing_on_replica(self):
+        """Test tokens not replicated yet are looked up on the primary"""
+        get_token_cache().clear()
+        user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        token = Token.objects.create(user=user)
+        databases = []
+
+        def authenticate_credentials(self, key):
+            databases.append(routers.ReplicaRouter().db_for_read(Token))
+            if databases[-1] != 'default':
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            return user, token
+        request = RequestFactory().get('/')
+
+        def get_response(request):
+            CachedTokenAuthentication().authenticate_credentials(token.key)
+            return HttpResponse()
+        with mock.patch.object(TokenAuthentication, 'authenticate_credentials', authenticate_credentials):
+            routers.ReplicaRoutingMiddleware(get_response)(request)
+        self.assertEqual(databases, ['replica1', 'default'])
+
+
+@skipUnless(settings.READ_REPLICAS, 'run with DB_ENGINE=sqlite DB_REPLICA_NAMES=replica.sqlite3')
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ReplicaReadYourWritesTests(TransactionTestCase):
+    """
+    Test the routing against a primary and a replica that isn't replicated,
+    so what a request reads shows which database it used.
+    """
+    databases = {'default', *settings.READ_REPLICAS}
+
+    def setUp(self):
+        get_token_cache().clear()
+        routers.get_pin_cache().clear()
+        self.replica = settings.READ_REPLICAS[0]
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.token = Token.objects.create(user=self.user)
+        Recipe.objects.create(user=self.user, title='Primary', time_minutes=5, price=Decimal('1.00'))
+        # the state of the replica before the recipe is replicated
+        self.user.save(using=self.replica)
+        Token.objects.using(self.replica).create(user=self.user, key=self.token.key)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def titles(self):
+        res = self.client.get(RECIPE_URL)
+        return [recipe['title'] for recipe in res.json()['results']]
+
+    def test_reads_replica_then_own_writes(self):
+        """Test reads come from the replica until the user writes"""
+        self.assertEqual(self.titles(), [])
+        res = self.client.post(
+            RECIPE_URL, {'title': 'Written', 'time_minutes': 5, 'price': '2.00', 'description': 'New'}
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.titles(), ['Written', 'Primary'])
+        # token clients don't keep cookies, the pin cache covers them
+        self.client.cookies.clear()
+        self.assertEqual(self.titles(), ['Written', 'Primary'])
+        routers.get_pin_cache().clear()
+        self.assertEqual(self.titles(), [])
@@ -0,0 +1,103 @@
+"""
+Tests for the precomputed OpenAPI schema
+"""
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.schema import SchemaDocument, get_schema_document, reset_schema_document
+
+
+SCHEMA_URL = reverse('api-schema')
+MEDIA_TYPES = ('application/vnd.oai.openapi', 'application/vnd.oai.openapi+json', 'application/json')
+
+
+class CachedSchemaViewTests(SimpleTestCase):
+    """Test serving the schema from the precomputed document"""
+
+    def setUp(self):
+        self.client = APIClient()
+        reset_schema_document('SCHEMA_PRECOMPUTE')
+        self.addCleanup(reset_schema_document, 'SCHEMA_PRECOMPUTE')
+
+    def test_same_as_generated(self):
+        """Test the precomputed schema is the one generated per request"""
+        for media_type in MEDIA_TYPES:
+            with self.subTest(media_type=media_type):
+                res = self.client.get(SCHEMA_URL, HTTP_ACCEPT=media_type)
+                with override_settings(SCHEMA_PRECOMPUTE='off'):
+                    live = self.client.get(SCHEMA_URL, HTTP_ACCEPT=media_type)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res.content, live.content)
+                self.assertEqual(res['Content-Type'], live['Content-Type'])
+
+    def test_generated_once(self):
+        """Test the API is introspected once for every request"""
+        with mock.patch.object(SchemaDocument, 'generate', wraps=SchemaDocument.generate) as generate:
+            self.client.get(SCHEMA_URL)
+            self.client.get(SCHEMA_URL, HTTP_ACCEPT='application/json')
+        generate.assert_called_once()
+
+    def test_etag(self):
+        """Test the ETag hashes the content and answers If-None-Match"""
+        res = self.client.get(SCHEMA_URL)
+        self.assertEqual(res['ETag'], '"%s"' % hashlib.sha256(res.content).hexdigest())
+        self.assertIn('no-cache', res['Cache-Control'])
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_gzip(self):
+        """Test clients accepting gzip get the compressed schema"""
+        plain = self.client.get(SCHEMA_URL)
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertEqual(res['ETag'], plain['ETag'])
+        self.assertIn('Accept-Encoding', res['Vary'])
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_media_type_parameters_generated(self):
+        """Test renderings the document doesn't hold are generated per request"""
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT='application/json; indent=1')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.has_header('ETag'))
+        self.assertTrue(res.content.startswith(b'{\n "openapi"'))
+
+    def test_file_mode(self):
+        """Test the file is written once and loaded instead of generating"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'schema.json')
+            with override_settings(SCHEMA_PRECOMPUTE='file', SCHEMA_FILE=path):
+                document = get_schema_document()
+                self.assertTrue(os.path.exists(path))
+                reset_schema_document('SCHEMA_FILE')
+                with mock.patch.object(SchemaDocument, 'generate') as generate:
+                    self.assertEqual(get_schema_document(), document)
+                generate.assert_not_called()
+
+
+class BuildSchemaCommandTests(SimpleTestCase):
+    """Test the schema build command"""
+
+    def test_build_and_check(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'schema.json')
+            with self.assertRaisesMessage(CommandError, 'outdated'):
+                call_command('build_schema', output=path, check=True, stdout=io.StringIO())
+            out = io.StringIO()
+            call_command('build_schema', output=path, stdout=out)
+            self.assertIn(f'written to {path}', out.getvalue())
+            call_command('build_schema', output=path, check=True, stdout=out)
+            self.assertIn('up to date', out.getvalue())
+            self.assertEqual(SchemaDocument.load(path), SchemaDocument.generate())
@@ -0,0 +1,56 @@
+"""
+Tests for the input validators
+"""
+import re
+import time
+
+from django.test import SimpleTestCase
+
+from core.management.commands.benchmark_email_validation import ADVERSARIAL_EMAILS
+from core.validators import MAX_EMAIL_LENGTH, is_valid_email
+
+
+class EmailValidatorTests(SimpleTestCase):
+    """Test the email validation of the user manager"""
+
+    def test_valid_emails(self):
+        for email in ['ex1@e.com', 'ex2@fjs.com', 'first.last@my-company.co.uk', 'a_b-c@x.io', 'A1@Example.COM']:
+            with self.subTest(email=email):
+                self.assertTrue(is_valid_email(email))
+
+    def test_invalid_emails(self):
+        invalid = [
+            'test', 'test@', 'test@e', '', None, '@example.com', 'a..b@x.com', '.a@x.com', 'a.@x.com',
+            'a@b@c.com', 'a@.com', 'a@x.c', 'a@x.c0m', 'a@x.com.', 'é@x.com',
+            # accepted by the `[.-_]` range and `[A-Z|a-z]` of the old regex
+            'a/b@x.com', 'a:b@x.com', 'a?b@x.com', 'a^b@x.com', 'a@x.c|om',
+        ]
+        for email in invalid:
+            with self.subTest(email=email):
+                self.assertFalse(is_valid_email(email))
+
+    def test_length_limit(self):
+        local = 'a' * (MAX_EMAIL_LENGTH - len('@x.com'))
+        self.assertTrue(is_valid_email(local + '@x.com'))
+        self.assertFalse(is_valid_email('a' + local + '@x.com'))
+        self.assertTrue(is_valid_email('a' + local + '@x.com', max_length=None))
+
+    def test_adversarial_inputs_fast(self):
+        """Test inputs crafted to backtrack are validated in linear time"""
+        for name, build in ADVERSARIAL_EMAILS.items():
+            email = build(200_000)
+            with self.subTest(name=name):
+                started = time.perf_counter()
+                is_valid_email(email, max_length=None)
+                # a backtracking regex takes longer than this for 30 characters
+                self.assertLess(time.perf_counter() - started, 1)
+
+    def test_matches_fixed_regex(self):
+        """Test the validator accepts what the old regex meant to accept"""
+        regex = re.compile(
+            r'[A-Za-z0-9]+(?:[._-][A-Za-z0-9]+)*@[A-Za-z0-9-]*[A-Za-z0-9][A-Za-z0-9-]*(?:\.[A-Za-z]{2,})+'
+        )
+        alphabet = 'a0.-_@Z'
+        for number in range(7 ** 6):
+            email = ''.join(alphabet[number // 7 ** i % 7] for i in range(6)) + '.co'
+            self.assertEqual(is_valid_email(email), bool(regex.fullmatch(email)), email)
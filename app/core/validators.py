@@ -0,0 +1,41 @@
+"""
+Input validation running in linear time
+"""
+import re
+
+
+# RFC 5321 limit of a forward path
+MAX_EMAIL_LENGTH = 254
+
+# a single character class, splitting on it never backtracks
+_LOCAL_SEPARATORS = re.compile(r'[._-]')
+
+
+def _is_ascii_alnum(value):
+    return value.isascii() and value.isalnum()
+
+
+def is_valid_email(email, max_length=MAX_EMAIL_LENGTH):
+    """
+    Return whether the email address is accepted for an account.
+
+    The local part is runs of ASCII letters and digits joined by single
+    `.`, `-` or `_`, the domain a label of letters, digits and hyphens
+    followed by one or more labels of at least two letters, e.g.
+    `first.last@my-company.co.uk`. The address
+    is scanned a constant number of times, without the nested repetitions
+    of a regular expression that backtrack exponentially on crafted input.
+    """
+    if not isinstance(email, str) or max_length is not None and len(email) > max_length:
+        return False
+    local, at, domain = email.partition('@')
+    if not at:
+        return False
+    if not all(_is_ascii_alnum(part) for part in _LOCAL_SEPARATORS.split(local)):
+        return False
+    first, *labels = domain.split('.')
+    return (
+        bool(labels)
+        and _is_ascii_alnum(first.replace('-', ''))
+        and all(len(label) >= 2 and label.isascii() and label.isalpha() for label in labels)
+    )
@@ -0,0 +1,21 @@
+"""
+Operational views of the API
+"""
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.db.connections import get_connection_metrics
+
+
+class DatabaseMetricsView(APIView):
+    """Connection metrics of the process serving the request, for staff"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (permissions.IsAdminUser,)
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response(get_connection_metrics())
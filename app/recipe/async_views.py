@@ -0,0 +1,112 @@
+"""
+Async read paths of the recipe API
+"""
+from asgiref.sync import sync_to_async
+from django.urls import URLPattern
+from rest_framework import exceptions
+
+from core.asyncdb import database_sync_to_async
+
+
+class AsyncReadView:
+    """
+    Serve the read actions of a DRF viewset as a native async view.
+
+    The request is authenticated on the event loop, a cached token never
+    leaves it. The rest of the viewset dispatch - negotiation,
+    permissions, conditional requests, the response cache, the handler
+    and rendering - runs in one call on the database thread pool of
+    core.asyncdb rather than on the single thread Django 3.2 shares
+    between the sync views of an ASGI worker, so the responses are those
+    of the sync viewset. Other actions are handed to the sync view.
+    """
+    read_actions = ('list', 'retrieve')
+
+    def __init__(self, sync_view):
+        self.sync_view = sync_view
+        self.viewset_class = sync_view.cls
+        self.initkwargs = sync_view.initkwargs
+        self.actions = dict(sync_view.actions)
+        if 'get' in self.actions and 'head' not in self.actions:
+            self.actions['head'] = self.actions['get']
+
+    @classmethod
+    def wrap(cls, sync_view):
+        """Return the async view serving the reads of a viewset view"""
+        view = cls(sync_view)
+
+        async def async_view(request, *args, **kwargs):
+            return await view.dispatch(request, *args, **kwargs)
+        async_view.cls = sync_view.cls
+        async_view.initkwargs = sync_view.initkwargs
+        async_view.actions = sync_view.actions
+        async_view.csrf_exempt = True
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        action = self.actions.get(request.method.lower())
+        if action not in self.read_actions:
+            return await sync_to_async(self.sync_view, thread_sensitive=True)(request, *args, **kwargs)
+
+        view = self.viewset_class(**self.initkwargs)
+        view.action_map = self.actions
+        for method, name in self.actions.items():
+            setattr(view, method, getattr(view, name))
+        view.args = args
+        view.kwargs = kwargs
+        view.headers = view.default_response_headers
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        try:
+            await self.authenticate(request)
+            error = None
+        except exceptions.APIException as exc:
+            error = exc
+        return await database_sync_to_async(self.respond)(view, request, error, args, kwargs)
+
+    @staticmethod
+    async def authenticate(request):
+        """Authenticate like `Request.user`, awaiting async authenticators"""
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await database_sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    @staticmethod
+    def respond(view, request, error, args, kwargs):
+        """The rest of `APIView.dispatch`, the user is already known"""
+        try:
+            if error is not None:
+                raise error
+            view.initial(request, *args, **kwargs)
+            handler = getattr(view, request.method.lower(), view.http_method_not_allowed)
+            response = handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        view.response = view.finalize_response(request, response, *args, **kwargs)
+        if hasattr(view.response, 'render'):
+            view.response.render()
+        return view.response
+
+
+def async_read_urls(patterns):
+    """Return the url patterns with the viewset reads served by AsyncReadView"""
+    wrapped = []
+    for pattern in patterns:
+        actions = getattr(pattern.callback, 'actions', None) or {}
+        if any(action in AsyncReadView.read_actions for action in actions.values()):
+            pattern = URLPattern(
+                pattern.pattern, AsyncReadView.wrap(pattern.callback), pattern.default_args, pattern.name
+            )
+        wrapped.append(pattern)
+    return wrapped
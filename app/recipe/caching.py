@@ -0,0 +1,205 @@
+"""
+HTTP caching for recipe API views
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from core.models import CollectionVersion
+
+
+def get_response_cache():
+    """Return the cache holding rendered responses"""
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+class ResponseCacheMetrics:
+    """
+    Hit and miss counters of the response cache in this process.
+
+    Kept in memory rather than in the cache, so counting costs no round
+    trip to a shared cache backend on every read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = {'hits': 0, 'misses': 0}
+
+    def increment(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+metrics = ResponseCacheMetrics()
+
+
+def get_response_cache_stats():
+    """Return the hit and miss counters of the response cache in this process"""
+    return metrics.snapshot()
+
+
+def reset_response_cache_stats():
+    metrics.reset()
+
+
+class CollectionVersionMixin:
+    """Look up the collection version of the request user once per request"""
+
+    def get_collection_version(self, request):
+        if getattr(self, '_collection_version', None) is None:
+            self._collection_version = CollectionVersion.objects.get_version(request.user.id)
+        return self._collection_version
+
+    def get_representation_key(self, request):
+        """Identify the representation by user, version, url and media type"""
+        key = '%s:%s:%s:%s:%s' % (
+            request.user.id, self.get_collection_version(request), self.action,
+            request.get_full_path(), request.accepted_media_type,
+        )
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class NotModified(APIException):
+    """The client already holds the current representation"""
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+    def __init__(self, etag):
+        super().__init__()
+        self.etag = etag
+
+
+class ConditionalGetMixin(CollectionVersionMixin):
+    """
+    Answer unchanged list and detail reads with 304 Not Modified.
+
+    The strong ETag is derived from the user's collection version, which
+    is bumped on every write to their recipes, tags and tag links, plus
+    the url and the negotiated media type. A matching If-None-Match is
+    answered right after authentication, before the recipe table is read
+    or any serializer runs.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        if request.method in ('GET', 'HEAD') and self.action in self.conditional_actions:
+            self.etag = self.get_etag(request)
+            if self.etag in self.get_if_none_match(request):
+                raise NotModified(self.etag)
+
+    def get_etag(self, request):
+        """Return the strong ETag of the current representation"""
+        return '"%s"' % self.get_representation_key(request)
+
+    @staticmethod
+    def get_if_none_match(request):
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        # If-None-Match uses the weak comparison
+        return {etag[2:] if etag.startswith('W/') else etag for etag in etags}
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=exc.status_code, headers={'ETag': exc.etag})
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, 'etag', None)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            # make clients revalidate instead of reusing stale copies
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+class CacheHit(Exception):
+    """Short-circuits the view with a cached response"""
+
+    def __init__(self, content, content_type):
+        super().__init__()
+        self.content = content
+        self.content_type = content_type
+
+
+class ResponseCacheMixin(CollectionVersionMixin):
+    """
+    Serve list and detail reads from the rendered bytes of an earlier one.
+
+    Keys are built from the user, the collection version, the action, the
+    url with its query parameters and the negotiated media type. Writes go
+    through the model signals bumping the collection version, so an entry
+    is never looked up again once the data behind it has changed and
+    stale entries simply expire. List it before ConditionalGetMixin so a
+    matching If-None-Match still wins over a cached body.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def response_cache_enabled(self, request):
+        return (
+            getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+            and request.method in ('GET', 'HEAD')
+            and self.action in self.cached_actions
+        )
+
+    def get_response_cache_key(self, request):
+        return 'response:%s' % self.get_representation_key(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if not self.response_cache_enabled(request):
+            return
+        key = self.get_response_cache_key(request)
+        cached = get_response_cache().get(key)
+        if cached is not None:
+            metrics.increment('hits')
+            raise CacheHit(*cached)
+        metrics.increment('misses')
+        self.response_cache_key = key
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CacheHit):
+            response = HttpResponse(exc.content, content_type=exc.content_type)
+            response['X-Cache'] = 'HIT'
+            self._mark_cached(response, self.get_response_cache_key(self.request))
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if key and isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            response['X-Cache'] = 'MISS'
+            response.add_post_render_callback(self._store_response(key))
+            self._mark_cached(response, key)
+        return response
+
+    @staticmethod
+    def _mark_cached(response, key):
+        # lets core.compression cache the compressed body next to it
+        response.response_cache = get_response_cache()
+        response.response_cache_key = key
+
+    @staticmethod
+    def _store_response(key):
+        def store(response):
+            get_response_cache().set(key, (response.content, response['Content-Type']))
+        return store
@@ -0,0 +1,37 @@
+"""
+Export of the recipe library
+"""
+from collections import defaultdict
+from itertools import islice
+
+from core.models import Recipe
+
+
+EXPORT_FIELDS = ('id', 'title', 'time_minutes', 'price', 'link', 'description')
+
+
+def iter_recipe_rows(queryset, chunk_size):
+    """
+    Yield the recipes of the queryset as flat dicts with their tag names.
+
+    Rows are read through a database cursor `chunk_size` at a time and the
+    tags of each chunk are loaded with one query, so memory use doesn't
+    depend on the number of recipes.
+    """
+    rows = queryset.prefetch_related(None).values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        tags = defaultdict(list)
+        links = Recipe.tags.through.objects.filter(
+            recipe_id__in=[row[0] for row in chunk]
+        ).order_by('tag__name').values_list('recipe_id', 'tag__name')
+        for recipe_id, name in links:
+            tags[recipe_id].append(name)
+        for row in chunk:
+            recipe = dict(zip(EXPORT_FIELDS, row))
+            # same representation as the API serializers
+            recipe['price'] = str(recipe['price'])
+            recipe['tags'] = tags[recipe['id']]
+            yield recipe
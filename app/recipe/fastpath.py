@@ -0,0 +1,167 @@
+"""
+Read-only fast path rendering lists without model serializers
+"""
+from collections import OrderedDict, defaultdict
+
+from django.db.models import ManyToManyField, Prefetch
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class Unsupported(Exception):
+    """The serializer has fields the fast path can't reproduce"""
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def convert(value):
+        # values read from a column of the same scale need no quantizing
+        if value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value)
+        return field.to_representation(value)
+    return convert
+
+
+def _get_converter(field):
+    """Return the function turning a column value into its representation"""
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if type(field) is serializers.IntegerField:
+        return int
+    if isinstance(field, serializers.CharField) \
+            and type(field).to_representation is serializers.CharField.to_representation:
+        return str
+    return field.to_representation
+
+
+class RowConverter:
+    """
+    Build the representation of a model serializer from `.values()` rows.
+
+    The fields are resolved once, so a row is turned into its
+    representation by calling a precompiled converter per column.
+    Many-to-many fields with a nested serializer are loaded for a whole
+    page with a single query on the through table. Serializers with
+    method fields, dotted sources or other relations raise Unsupported.
+    """
+
+    def __init__(self, serializer, prefetches=()):
+        self.model = serializer.Meta.model
+        self.flat = []
+        self.nested = []
+        orderings = {
+            lookup.prefetch_to: lookup.queryset.query.order_by
+            for lookup in prefetches
+            if isinstance(lookup, Prefetch) and lookup.queryset is not None
+        }
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.nested.append(self._compile_nested(name, field, orderings.get(field.source, ())))
+            elif isinstance(field, (serializers.Serializer, serializers.RelatedField, serializers.ManyRelatedField)) \
+                    or field.source == '*' or '.' in field.source \
+                    or isinstance(field, serializers.SerializerMethodField):
+                raise Unsupported(name)
+            else:
+                self.flat.append((name, field.source, _get_converter(field)))
+        self.columns = [source for _name, source, _convert in self.flat]
+        if self.nested and 'id' not in self.columns:
+            self.columns.append('id')
+
+    def _compile_nested(self, name, field, ordering):
+        model_field = self.model._meta.get_field(field.source)
+        if not isinstance(model_field, ManyToManyField):
+            raise Unsupported(name)
+        child = RowConverter(field.child)
+        if child.nested:
+            raise Unsupported(name)
+        through = model_field.remote_field.through
+        owner = model_field.m2m_field_name()
+        target = model_field.m2m_reverse_field_name()
+        ordering = ordering or model_field.related_model._meta.ordering
+        return {
+            'name': name,
+            'through': through,
+            'owner': owner + '_id',
+            'columns': [f'{target}__{column}' for column in child.columns],
+            'ordering': [
+                ('-' if item.startswith('-') else '') + f'{target}__{item.lstrip("-")}'
+                for item in ordering
+            ],
+            'child': child,
+        }
+
+    def convert_row(self, row):
+        """Return the representation of a single `.values()` row"""
+        ret = OrderedDict()
+        for name, source, convert in self.flat:
+            value = row[source]
+            ret[name] = None if value is None else convert(value)
+        return ret
+
+    def convert(self, rows):
+        """Return the representations of a page of `.values()` rows"""
+        results = [self.convert_row(row) for row in rows]
+        for nested in self.nested:
+            related = self._load(nested, [row['id'] for row in rows])
+            for row, item in zip(rows, results):
+                item[nested['name']] = related.get(row['id'], [])
+        return results
+
+    def _load(self, nested, ids):
+        related = defaultdict(list)
+        if not ids:
+            return related
+        child = nested['child']
+        queryset = nested['through'].objects.filter(**{nested['owner'] + '__in': ids}).order_by(*nested['ordering'])
+        for values in queryset.values_list(nested['owner'], *nested['columns']):
+            related[values[0]].append(child.convert_row(dict(zip(child.columns, values[1:]))))
+        return related
+
+
+class FastListMixin:
+    """
+    Serve the list action from `.values()` rows instead of model instances.
+
+    The response is the same as the serializer's, falls back to the
+    regular list when the serializer isn't supported by RowConverter.
+    """
+    fast_list = True
+    _row_converters = {}
+
+    def get_row_converter_key(self):
+        """Identify the serializer the converter is built from"""
+        return (type(self), self.get_serializer_class())
+
+    def get_row_converter(self, queryset):
+        """Return the converter of the list serializer, None if unsupported"""
+        key = self.get_row_converter_key()
+        if key not in self._row_converters:
+            try:
+                converter = RowConverter(self.get_serializer(), queryset._prefetch_related_lookups)
+            except Unsupported:
+                converter = None
+            self._row_converters[key] = converter
+        return self._row_converters[key]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        converter = self.get_row_converter(queryset) if self.fast_list else None
+        if converter is None:
+            return super().list(request, *args, **kwargs)
+        # the pagination reads the ordering values from the rows
+        columns = list(converter.columns)
+        for name in ['id'] + [item.lstrip('-') for item in queryset.query.order_by if isinstance(item, str)]:
+            if name not in columns and name != 'pk':
+                columns.append(name)
+        rows = queryset.prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(converter.convert(page))
+        return Response(converter.convert(list(rows)))
@@ -0,0 +1,113 @@
+"""
+Filters for recipe API views
+"""
+from django.db.models import Count
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from core.models import Recipe
+
+
+class IdListField(serializers.CharField):
+    """Comma separated list of ids"""
+    default_error_messages = {
+        'invalid': _('Enter a comma separated list of ids.'),
+    }
+
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        try:
+            ids = {int(value) for value in data.split(',') if value.strip()}
+        except ValueError:
+            self.fail('invalid')
+        return sorted(ids)
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Query parameters accepted by the recipe list"""
+    tags = IdListField(required=False, help_text=_('Recipes with any of these tag ids.'))
+    tags_all = IdListField(required=False, help_text=_('Recipes with all of these tag ids.'))
+    price_min = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    price_max = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    time_minutes_min = serializers.IntegerField(required=False)
+    time_minutes_max = serializers.IntegerField(required=False)
+
+
+class RecipeFilter(BaseFilterBackend):
+    """
+    Filter recipes by tags, price and cooking time.
+
+    Tags are matched with subqueries on the tag link table, so a recipe is
+    never returned twice and no DISTINCT is needed. The ranges are served
+    by the (user, price) and (user, time_minutes) indexes.
+    """
+    ranges = {
+        'price_min': 'price__gte',
+        'price_max': 'price__lte',
+        'time_minutes_min': 'time_minutes__gte',
+        'time_minutes_max': 'time_minutes__lte',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        params = RecipeFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        through = Recipe.tags.through.objects
+        if params.get('tags'):
+            queryset = queryset.filter(
+                id__in=through.filter(tag_id__in=params['tags']).values('recipe_id')
+            )
+        if params.get('tags_all'):
+            queryset = queryset.filter(
+                id__in=through.filter(tag_id__in=params['tags_all']).values('recipe_id').annotate(
+                    matched=Count('tag_id')
+                ).filter(matched=len(params['tags_all'])).values('recipe_id')
+            )
+        return queryset.filter(**{
+            lookup: params[param] for param, lookup in self.ranges.items() if param in params
+        })
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': 'tags',
+                'required': False,
+                'in': 'query',
+                'description': 'Comma separated tag ids, recipes with any of them.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': 'tags_all',
+                'required': False,
+                'in': 'query',
+                'description': 'Comma separated tag ids, recipes with all of them.',
+                'schema': {'type': 'string'},
+            },
+        ] + [
+            {
+                'name': param,
+                'required': False,
+                'in': 'query',
+                'schema': {'type': 'number' if param.startswith('price') else 'integer'},
+            }
+            for param in self.ranges
+        ]
+
+
+class TagOrderingFilter(OrderingFilter):
+    """Order tags by `?ordering=` name or usage, ties broken by name"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not any(field.lstrip('-') == 'name' for field in ordering):
+            ordering = [*ordering, 'name']
+        return ordering
+
+
+class PopularTagsSerializer(serializers.Serializer):
+    """Query parameters accepted by the popular tags"""
+    limit = serializers.IntegerField(
+        min_value=1, max_value=100, default=10, help_text=_('Number of tags to return.')
+    )
@@ -0,0 +1,86 @@
+"""
+Renderers for recipe lists and exports
+"""
+import csv
+import io
+import json
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSON renderer encoding with orjson when it is installed.
+
+    The output is byte for byte the one of the default compact JSON
+    renderer for data without floats, which orjson formats differently.
+    Anything orjson can't encode falls back to the default renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact \
+                or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # dates go through the DRF encoder, orjson formats them differently
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped like the default renderer, for JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Render a list as newline delimited JSON, one object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.stream(data if isinstance(data, list) else [data]))
+
+    def stream(self, rows):
+        """Yield every row as one encoded line"""
+        for row in rows:
+            yield json.dumps(
+                row, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')
+            ).encode(self.charset) + b'\n'
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """Render a list of flat objects as CSV with a header row"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.stream(data if isinstance(data, list) else [data]))
+
+    def stream(self, rows):
+        """Yield the header and then every row as encoded CSV lines"""
+        buffer = io.StringIO()
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({
+                key: ';'.join(map(str, value)) if isinstance(value, list) else value
+                for key, value in row.items()
+            })
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
@@ -0,0 +1,87 @@
+"""
+Full text search over recipes
+"""
+from functools import reduce
+import operator
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, router
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import Recipe
+
+
+class PostgresSearchBackend:
+    """Search the trigger maintained tsvector through its GIN index"""
+    config = 'english'
+
+    def search(self, queryset, terms):
+        query = SearchQuery(terms, config=self.config, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            # ts_rank returns a real, the double round-trips through cursors
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
+
+
+class SimpleSearchBackend:
+    """
+    Search backend for databases without full text search, e.g. SQLite.
+
+    Every word has to appear in the title or the description, matches in
+    the title weigh more, like the weights of the postgres document.
+    """
+    max_words = 10
+    title_weight = 1.0
+    description_weight = 0.4
+
+    def search(self, queryset, terms):
+        words = terms.split()[:self.max_words]
+        if not words:
+            return queryset.none()
+        match = reduce(operator.and_, (
+            Q(title__icontains=word) | Q(description__icontains=word) for word in words
+        ))
+        rank = reduce(operator.add, (
+            Case(
+                When(title__icontains=word, then=Value(self.title_weight)),
+                When(description__icontains=word, then=Value(self.description_weight)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+            for word in words
+        ))
+        return queryset.filter(match).annotate(rank=rank)
+
+
+def get_search_backend():
+    """Return the search backend for the database holding recipes"""
+    backend = getattr(settings, 'RECIPE_SEARCH_BACKEND', None)
+    if backend:
+        return import_string(backend)()
+    if connections[router.db_for_read(Recipe)].vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Filter recipes by `?search=`, ordering them by relevance"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, terms).order_by('-rank', '-id')
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Words to look for in the title and description.',
+            'schema': {'type': 'string'},
+        }]
@@ -2,16 +2,113 @@
 Serializer for recipe objects
 """
 
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from core.models import Recipe, Tag
+from core.models import CollectionVersion, Recipe, Tag
+from recipe.sparse import SparseFieldsSerializerMixin
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+def tags_prefetch():
+    """Return the prefetch loading the tags of many recipes in one query"""
+    return Prefetch('tags', queryset=Tag.objects.order_by('name'))
+
+
+class TagSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    """Serializer for tag objects"""
+    class Meta:
+        model = Tag
+        fields = ('id', 'name')
+        read_only_fields = ('id',)
+
+
+class TagUsageSerializer(TagSerializer):
+    """Serializer for tag objects with the number of recipes using them"""
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('usage',)
+        read_only_fields = ('id', 'usage')
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Serializer writing many recipes with bulk queries"""
+
+    def create(self, validated_data):
+        """Create all the recipes with a single INSERT"""
+        tags = [attrs.pop('tags', None) for attrs in validated_data]
+        recipes = Recipe.objects.bulk_create_with_ids([Recipe(**attrs) for attrs in validated_data])
+        self._set_tags(recipes, tags, self._get_user())
+        # bulk writes send no signals
+        CollectionVersion.objects.bump(*{recipe.user_id for recipe in recipes})
+        return recipes
+
+    def update(self, instance, validated_data):
+        """Update the recipes in `instance`, matched by position"""
+        tags = [attrs.pop('tags', None) for attrs in validated_data]
+        fields = set()
+        for recipe, attrs in zip(instance, validated_data):
+            for attr, value in attrs.items():
+                setattr(recipe, attr, value)
+                fields.add(attr)
+        if fields:
+            Recipe.objects.bulk_update(instance, fields)
+        self._set_tags(instance, tags, self._get_user(), replace=True)
+        CollectionVersion.objects.bump(*{recipe.user_id for recipe in instance})
+        return instance
+
+    def _get_user(self):
+        """Return the request user, who owns every recipe of a bulk request"""
+        return self.context['request'].user
+
+    def _set_tags(self, recipes, tags, user, replace=False):
+        """Link the recipes of the user to their tags with one lookup and one insert"""
+        tagged = [(recipe, items) for recipe, items in zip(recipes, tags) if items is not None]
+        if tagged:
+            names = [item['name'] for _recipe, items in tagged for item in items]
+            resolved = {tag.name: tag for tag in Tag.objects.get_or_create_many(user, names)}
+            through = Recipe.tags.through
+            if replace:
+                through.objects.filter(recipe_id__in=[recipe.id for recipe, _items in tagged]).delete()
+            through.objects.bulk_create([
+                through(recipe_id=recipe.id, tag_id=resolved[item['name']].id)
+                for recipe, items in tagged
+                for item in items
+            ], ignore_conflicts=True)
+            for recipe, _items in tagged:
+                getattr(recipe, '_prefetched_objects_cache', {}).pop('tags', None)
+        # load the tags of every recipe for the response in one query
+        prefetch_related_objects(recipes, tags_prefetch())
+
+
+class RecipeSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipe objects"""
+    tags = TagSerializer(many=True, required=False)
+
     class Meta:
         model = Recipe
-        fields = ('id', 'title', 'time_minutes', 'price', 'link')
+        fields = ('id', 'title', 'time_minutes', 'price', 'link', 'tags')
         read_only_fields = ('id',)
+        list_serializer_class = RecipeListSerializer
+
+    def create(self, validated_data):
+        """Create a recipe and link its tags"""
+        tags = validated_data.pop('tags', None)
+        recipe = super().create(validated_data)
+        if tags:
+            recipe.tags.add(*self._get_tags(recipe, tags))
+        return recipe
+
+    def update(self, instance, validated_data):
+        """Update a recipe, replacing its tags when they are given"""
+        tags = validated_data.pop('tags', None)
+        recipe = super().update(instance, validated_data)
+        if tags is not None:
+            recipe.tags.set(self._get_tags(recipe, tags))
+        return recipe
+
+    def _get_tags(self, recipe, tags):
+        request = self.context.get('request')
+        # the recipes of the request user don't need their user loaded
+        user = request.user if request and request.user.id == recipe.user_id else recipe.user
+        return Tag.objects.get_or_create_many(user, [tag['name'] for tag in tags])
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -19,11 +116,3 @@ class RecipeDetailSerializer(RecipeSerializer):
 
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ('description',)
-
-
-class TagSerializer(serializers.ModelSerializer):
-    """Serializer for tag objects"""
-    class Meta:
-        model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
@@ -0,0 +1,94 @@
+"""
+Sparse fieldsets for recipe API views
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsSerializerMixin:
+    """Serializer keeping only the fields named by its `fields` argument"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in [name for name in self.fields if name not in fields]:
+                self.fields.pop(name)
+
+
+class SparseFieldsetMixin:
+    """
+    Return only the fields listed by `?fields=id,title` on reads.
+
+    The serializer drops the other fields and the queryset loads only
+    the columns of the remaining ones with `.only()`, plus the primary
+    key and the ordering, and only the prefetches they need, so a large
+    description that isn't asked for is neither read nor serialized.
+    Writes always use every field.
+    """
+    sparse_actions = ('list', 'retrieve')
+    fields_param = 'fields'
+
+    def get_sparse_fields(self):
+        """Return the names of the requested fields, None for every field"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        request = self.request
+        if request is None or request.method not in ('GET', 'HEAD') or self.action not in self.sparse_actions:
+            return None
+        names = {name.strip() for name in request.query_params.get(self.fields_param, '').split(',')} - {''}
+        if not names:
+            return None
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        available = [name for name, field in serializer.fields.items() if not field.write_only]
+        unknown = names.difference(available)
+        if unknown:
+            msg = _('Unknown fields: %(fields)s.') % {'fields': ', '.join(sorted(unknown))}
+            raise ValidationError({self.fields_param: [msg]})
+        return tuple(name for name in available if name in names)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_row_converter_key(self):
+        return super().get_row_converter_key() + (self.get_sparse_fields(),)
+
+    def filter_queryset(self, queryset):
+        return self.prune_queryset(super().filter_queryset(queryset))
+
+    def prune_queryset(self, queryset):
+        """Load only the columns and relations of the requested fields"""
+        if self.get_sparse_fields() is None:
+            return queryset
+        meta = queryset.model._meta
+        columns = {meta.pk.name}
+        relations = set()
+        for field in self.get_serializer().fields.values():
+            if field.write_only:
+                continue
+            try:
+                model_field = meta.get_field(field.source)
+            except FieldDoesNotExist:
+                # computed from other attributes, they may need any column
+                return queryset
+            if model_field.many_to_many:
+                relations.add(field.source)
+            elif model_field.concrete:
+                columns.add(model_field.name)
+        for item in queryset.query.order_by:
+            name = item.lstrip('-') if isinstance(item, str) else None
+            # annotations like the search rank are computed, not loaded
+            if name in (field.name for field in meta.concrete_fields):
+                columns.add(name)
+        prefetches = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')[0] in relations
+        ]
+        return queryset.only(*columns).prefetch_related(None).prefetch_related(*prefetches)
@@ -0,0 +1,59 @@
+"""
+Recipe statistics of a user, from the maintained summary tables
+"""
+from decimal import Decimal
+
+from django.conf import settings
+
+from core.models import RECIPE_PRICE_BUCKETS, RecipeStats, RecipeStatsBucket, Tag
+
+
+def _price(cents):
+    return str((Decimal(cents) / 100).quantize(Decimal('0.01')))
+
+
+def time_summary(count, total, buckets):
+    """Return the average and median cooking time from the minutes buckets"""
+    if not count:
+        return {'average': None, 'median': None}
+    # the middle recipes, both of them for an even count
+    middle = {(count - 1) // 2, count // 2}
+    values = []
+    seen = 0
+    for minutes, bucket_count in sorted(buckets.items()):
+        values.extend(minutes for position in middle if seen <= position < seen + bucket_count)
+        seen += bucket_count
+    return {'average': round(total / count, 2), 'median': sum(values) / len(values) if values else None}
+
+
+def price_histogram(buckets):
+    """Return every price bucket with its bounds, the last one is open"""
+    bounds = RECIPE_PRICE_BUCKETS + (None,)
+    return [
+        {'min': _price(low), 'max': _price(high) if high is not None else None, 'count': buckets.get(low, 0)}
+        for low, high in zip(bounds, bounds[1:])
+    ]
+
+
+def get_recipe_stats(user):
+    """
+    Return the recipe statistics of a user.
+
+    Read from RecipeStats and RecipeStatsBucket, which the database keeps
+    up to date on every recipe write, and from the tag usage counts, so
+    the cost doesn't grow with the number of recipes.
+    """
+    empty = {'recipe_count': 0, 'time_minutes_total': 0, RecipeStatsBucket.TIME: {}, RecipeStatsBucket.PRICE: {}}
+    stats = RecipeStats.objects.stored([user.id]).get(user.id, empty)
+    tags = Tag.objects.filter(user=user, usage__gt=0).order_by('-usage', 'name').values_list('id', 'name', 'usage')
+    return {
+        'recipe_count': stats['recipe_count'],
+        'time_minutes': time_summary(
+            stats['recipe_count'], stats['time_minutes_total'], stats[RecipeStatsBucket.TIME]
+        ),
+        'price_histogram': price_histogram(stats[RecipeStatsBucket.PRICE]),
+        'tags': [
+            {'id': tag_id, 'name': name, 'recipe_count': usage}
+            for tag_id, name, usage in tags[:getattr(settings, 'RECIPE_STATS_TOP_TAGS', 20)]
+        ],
+    }
@@ -0,0 +1,205 @@
+"""
+Tests for the async read views of the recipe API
+"""
+import json
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.test.client import AsyncRequestFactory, RequestFactory
+from django.urls import resolve, reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.asyncdb import shutdown_executor
+from core.authentication import CachedTokenAuthentication, get_token_cache
+from core.instrumentation import QueryInstrumentationMiddleware
+from core.models import Recipe, Tag
+from recipe.async_views import AsyncReadView, async_read_urls
+from recipe.tests.test_recipe_api import get_recipe_detail_url
+from recipe.urls import router
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def asgi_headers(headers):
+    """Helper function turning WSGI header names into ASGI ones"""
+    return {key[5:].replace('_', '-').lower(): value for key, value in headers.items()}
+
+
+class AsyncDatabaseTestCase(TransactionTestCase):
+    """
+    Test case for code querying from the async database threads.
+
+    The threads use their own connections, so the data has to be
+    committed, and their persistent connections are closed at the end.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_executor()
+        super().tearDownClass()
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class AsyncReadViewTest(AsyncDatabaseTestCase):
+    """Test the async views answer like the sync ones"""
+
+    def setUp(self):
+        """Setting up the test"""
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.token = Token.objects.create(user=self.user).key
+        other = get_user_model().objects.create_user('other@example.com', 'pass1234')
+        self.tags = tags = Tag.objects.get_or_create_many(self.user, ['Vegan', 'Dessert'])
+        for i in range(4):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=10 + i, price=Decimal('5.50')
+            )
+            recipe.tags.set(tags[:i % 3])
+        self.recipe = recipe
+        self.other_recipe = Recipe.objects.create(
+            user=other, title='Other', time_minutes=5, price=Decimal('1.00')
+        )
+
+    def get_both(self, url, data=None, **headers):
+        """Return the sync and the async response of a GET"""
+        headers.setdefault('HTTP_AUTHORIZATION', f'Token {self.token}')
+        match = resolve(url)
+        sync_response = match.func(RequestFactory().get(url, data, **headers), *match.args, **match.kwargs)
+        sync_response.render()
+        async_view = AsyncReadView.wrap(match.func)
+        # the async factory of Django 3.2 drops the data of GET requests
+        if data:
+            url = f'{url}?{urlencode(data)}'
+        async_request = AsyncRequestFactory().get(url, **asgi_headers(headers))
+        async_response = async_to_sync(async_view)(async_request, *match.args, **match.kwargs)
+        return sync_response, async_response
+
+    def assertSameResponse(self, url, data=None, status_code=status.HTTP_200_OK, **headers):
+        sync_response, async_response = self.get_both(url, data, **headers)
+        self.assertEqual(async_response.status_code, status_code)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'))
+        return async_response
+
+    def test_list(self):
+        """Test the async list matches the sync list"""
+        self.assertSameResponse(RECIPE_URL)
+
+    def test_list_filters_and_pagination(self):
+        """Test filters, search and pages are applied the same way"""
+        self.assertSameResponse(RECIPE_URL, {'tags': self.tags[0].id})
+        self.assertSameResponse(RECIPE_URL, {'search': 'Recipe 2'})
+        res = self.assertSameResponse(RECIPE_URL, {'page_size': 2})
+        next_url = urlsplit(json.loads(res.content)['next'])
+        self.assertSameResponse(next_url.path, dict(parse_qsl(next_url.query)))
+
+    def test_retrieve(self):
+        """Test the async detail matches the sync detail"""
+        self.assertSameResponse(get_recipe_detail_url(self.recipe.id))
+
+    def test_retrieve_other_user_not_found(self):
+        """Test recipes of other users are a 404 on the async view too"""
+        self.assertSameResponse(get_recipe_detail_url(self.other_recipe.id), status_code=status.HTTP_404_NOT_FOUND)
+
+    def test_tag_list(self):
+        """Test the async tag list matches the sync one"""
+        self.assertSameResponse(TAGS_URL)
+
+    def test_unauthenticated(self):
+        """Test missing and invalid tokens are rejected like on the sync view"""
+        res = self.assertSameResponse(RECIPE_URL, status_code=status.HTTP_401_UNAUTHORIZED, HTTP_AUTHORIZATION='')
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+        self.assertSameResponse(
+            RECIPE_URL, status_code=status.HTTP_401_UNAUTHORIZED, HTTP_AUTHORIZATION='Token invalid'
+        )
+        self.assertSameResponse(RECIPE_URL, status_code=status.HTTP_401_UNAUTHORIZED, HTTP_AUTHORIZATION='Token')
+
+    def test_not_modified(self):
+        """Test If-None-Match is answered with a 304"""
+        sync_response, _async_response = self.get_both(RECIPE_URL)
+        self.assertSameResponse(
+            RECIPE_URL, status_code=status.HTTP_304_NOT_MODIFIED, HTTP_IF_NONE_MATCH=sync_response['ETag']
+        )
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_response_cache_shared(self):
+        """Test the async view reads the responses cached by the sync view"""
+        sync_response, async_response = self.get_both(TAGS_URL)
+        self.assertEqual(sync_response['X-Cache'], 'MISS')
+        self.assertEqual(async_response['X-Cache'], 'HIT')
+        self.assertEqual(async_response.content, sync_response.content)
+
+    def test_writes_delegated(self):
+        """Test actions other than reads run on the sync view"""
+        match = resolve(RECIPE_URL)
+        request = AsyncRequestFactory().post(
+            RECIPE_URL, {'title': 'Created', 'time_minutes': 3, 'price': '2.00', 'description': 'Async'},
+            content_type='application/json', authorization=f'Token {self.token}'
+        )
+        res = async_to_sync(AsyncReadView.wrap(match.func))(request)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.filter(user=self.user, title='Created').exists())
+
+    def test_async_read_urls(self):
+        """Test only the patterns with read actions are made async"""
+        patterns = {pattern.name: pattern.callback for pattern in async_read_urls(router.urls)}
+        self.assertTrue(hasattr(patterns['recipe-list'], 'cls'))
+        self.assertEqual(patterns['recipe-list'].__name__, 'async_view')
+        self.assertEqual(patterns['tag-list'].__name__, 'async_view')
+        self.assertNotEqual(patterns['recipe-bulk'].__name__, 'async_view')
+        self.assertNotEqual(patterns['api-root'].__name__, 'async_view')
+
+
+class AsyncAuthenticationTest(AsyncDatabaseTestCase):
+    """Test the async token authentication"""
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.token = Token.objects.create(user=self.user).key
+
+    def aauthenticate(self, header):
+        request = RequestFactory().get(RECIPE_URL, HTTP_AUTHORIZATION=header)
+        return async_to_sync(CachedTokenAuthentication().aauthenticate)(request)
+
+    def test_cached_token_skips_database(self):
+        """Test a cached token is resolved without leaving the event loop"""
+        user, token = self.aauthenticate(f'Token {self.token}')
+        self.assertEqual(user, self.user)
+        with mock.patch.object(CachedTokenAuthentication, '_load_token') as load:
+            user, token = self.aauthenticate(f'Token {self.token}')
+        load.assert_not_called()
+        self.assertEqual(token.key, self.token)
+
+    def test_other_keyword_ignored(self):
+        """Test headers of other schemes are left to other authenticators"""
+        self.assertIsNone(self.aauthenticate('Bearer abc'))
+
+
+class AsyncMiddlewareTest(AsyncDatabaseTestCase):
+    """Test the query instrumentation of async requests"""
+
+    def test_counts_queries_of_async_views(self):
+        """Test queries run on the database threads are counted"""
+        user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        token = Token.objects.create(user=user).key
+        match = resolve(TAGS_URL)
+        view = AsyncReadView.wrap(match.func)
+
+        async def get_response(request):
+            request.resolver_match = match
+            return await view(request)
+        middleware = QueryInstrumentationMiddleware(get_response)
+        self.assertTrue(middleware._is_coroutine)
+        request = AsyncRequestFactory().get(TAGS_URL, authorization=f'Token {token}')
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(response.query_stats.count, 0)
@@ -0,0 +1,226 @@
+"""
+Tests for HTTP caching of the recipe API
+"""
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.tests.test_recipe_api import create_recipe, get_recipe_detail_url
+from recipe.caching import get_response_cache, get_response_cache_stats, reset_response_cache_stats
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+CACHE_METRICS_URL = reverse('cache-metrics')
+
+
+class ConditionalGetTest(QueryBudgetTestMixin, TestCase):
+    """Test ETags and If-None-Match on recipe reads"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def get_etag(self, url=RECIPE_URL):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res['ETag']
+
+    def test_list_has_etag(self):
+        """Test the list carries an ETag and asks clients to revalidate"""
+        res = self.client.get(RECIPE_URL)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('no-cache', res['Cache-Control'])
+        self.assertIn('private', res['Cache-Control'])
+        self.assertIn('Authorization', res['Vary'])
+
+    def test_if_none_match_not_modified(self):
+        """Test a matching ETag is answered with 304 and a single query"""
+        etag = self.get_etag()
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertFalse(res.content)
+
+    def test_weak_and_listed_etags_match(self):
+        """Test weak ETags and lists of ETags are compared"""
+        etag = self.get_etag()
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_stale_etag_returns_content(self):
+        """Test a non matching ETag returns the full response"""
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_etag_depends_on_query(self):
+        """Test different pages and filters have different ETags"""
+        self.assertNotEqual(self.get_etag(), self.get_etag(RECIPE_URL + '?search=sample'))
+
+    def test_create_changes_etag(self):
+        """Test creating a recipe invalidates the ETag"""
+        etag = self.get_etag()
+        create_recipe(self.user, title='Another')
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_tag_link_changes_etag(self):
+        """Test linking a tag to a recipe invalidates the ETag"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.get_etag()
+        self.recipe.tags.add(tag)
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_tag_rename_changes_etag(self):
+        """Test renaming a tag invalidates the recipe and tag ETags"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+        etags = self.get_etag(), self.get_etag(TAGS_URL)
+        tag.name = 'Vegetarian'
+        tag.save()
+        self.assertNotEqual(self.get_etag(), etags[0])
+        self.assertNotEqual(self.get_etag(TAGS_URL), etags[1])
+
+    def test_bulk_write_changes_etag(self):
+        """Test bulk writes invalidate the ETag"""
+        etag = self.get_etag()
+        payload = [{'title': 'Bulk', 'time_minutes': 5, 'price': '1.00', 'description': 'ok'}]
+        res = self.client.post(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        etag2 = self.get_etag()
+        self.assertNotEqual(etag2, etag)
+        res = self.client.patch(BULK_URL, [{'id': self.recipe.id, 'title': 'Changed'}], format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(self.get_etag(), etag2)
+
+    def test_detail_etag(self):
+        """Test the recipe detail supports conditional requests"""
+        url = get_recipe_detail_url(self.recipe.id)
+        etag = self.get_etag(url)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.patch(url, {'title': 'Changed'})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Changed')
+
+    def test_other_user_write_keeps_etag(self):
+        """Test writes of another user leave the ETag alone"""
+        etag = self.get_etag()
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        create_recipe(user2)
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_etag_differs_between_users(self):
+        """Test users never share an ETag"""
+        etag = self.get_etag()
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        self.client.force_authenticate(user2)
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ResponseCacheTest(QueryBudgetTestMixin, TestCase):
+    """Test serving recipe reads from the response cache"""
+
+    def setUp(self):
+        """Setting up the test"""
+        get_response_cache().clear()
+        reset_response_cache_stats()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def test_repeat_list_served_from_cache(self):
+        """Test the second read is a cache hit that only reads the version"""
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPE_URL)
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['Content-Type'], res['Content-Type'])
+        self.assertEqual(cached['ETag'], res['ETag'])
+        self.assertEqual(get_response_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_key_covers_query_and_renderer(self):
+        """Test query parameters and media types are cached separately"""
+        self.client.get(RECIPE_URL)
+        res = self.client.get(RECIPE_URL, {'search': 'nothing'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+        res = self.client.get(RECIPE_URL, HTTP_ACCEPT='text/html')
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertIn('text/html', res['Content-Type'])
+
+    def test_write_invalidates(self):
+        """Test writes are visible on the next read"""
+        self.client.get(RECIPE_URL)
+        self.client.get(get_recipe_detail_url(self.recipe.id))
+        self.client.patch(get_recipe_detail_url(self.recipe.id), {'title': 'Changed'})
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], 'Changed')
+        res = self.client.get(get_recipe_detail_url(self.recipe.id))
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'Changed')
+
+    def test_tag_links_invalidate(self):
+        """Test linking tags invalidates the cached recipes and tags"""
+        self.client.get(RECIPE_URL)
+        self.client.get(TAGS_URL)
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'][0]['tags'], [{'id': self.recipe.tags.get().id, 'name': 'Vegan'}])
+        self.assertEqual(self.client.get(TAGS_URL).data[0]['name'], 'Vegan')
+
+    def test_users_never_share_entries(self):
+        """Test a cached response is never served to another user"""
+        self.client.get(RECIPE_URL)
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        self.client.force_authenticate(user2)
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_errors_not_cached(self):
+        """Test only successful responses are cached"""
+        self.client.get(get_recipe_detail_url(self.recipe.id + 1000))
+        res = self.client.get(get_recipe_detail_url(self.recipe.id + 1000))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(get_response_cache_stats()['hits'], 0)
+
+    def test_stats_served_to_staff(self):
+        """Test the hit and miss counters are served to staff only"""
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL)
+        self.assertEqual(self.client.get(CACHE_METRICS_URL).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin@example.com', 'pass1234'))
+        res = self.client.get(CACHE_METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'hits': 1, 'misses': 1})
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_disabled(self):
+        """Test the cache can be switched off"""
+        self.client.get(RECIPE_URL)
+        res = self.client.get(RECIPE_URL)
+        self.assertNotIn('X-Cache', res)
@@ -0,0 +1,76 @@
+"""
+Tests for exporting recipes
+"""
+import csv
+import io
+import json
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.tests.test_recipe_api import create_recipe
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportApiTest(QueryBudgetTestMixin, TestCase):
+    """Test streaming the recipe library"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(self.user, title=f'Recipe {i}') for i in range(5)]
+        self.recipes[0].tags.add(
+            Tag.objects.create(user=self.user, name='Vegan'),
+            Tag.objects.create(user=self.user, name='Dinner'),
+        )
+
+    def test_auth_required(self):
+        """Test the export needs authentication"""
+        res = APIClient().get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_ndjson(self):
+        """Test exporting as NDJSON streams one recipe per line"""
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        create_recipe(user2)
+        res = self.client.get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertTrue(res['Content-Type'].startswith('application/x-ndjson'))
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [r.id for r in reversed(self.recipes)])
+        first = rows[-1]
+        self.assertEqual(first['price'], '5.00')
+        self.assertEqual(first['tags'], ['Dinner', 'Vegan'])
+        self.assertEqual(first['description'], 'Sample Recipe Description')
+
+    def test_export_csv(self):
+        """Test exporting as CSV with a header"""
+        res = self.client.get(EXPORT_URL, {'format': 'csv'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1]['tags'], 'Dinner;Vegan')
+        self.assertEqual(rows[-1]['title'], 'Recipe 0')
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_tags_loaded_per_chunk(self):
+        """Test tags are fetched once per chunk, not per recipe"""
+        res = self.client.get(EXPORT_URL)
+        with self.assertNumQueries(4):
+            # recipes are read through one cursor, tags once per chunk of 2
+            b''.join(res.streaming_content)
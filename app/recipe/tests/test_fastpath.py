@@ -0,0 +1,100 @@
+"""
+Tests for the fast list path
+"""
+import datetime
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from core.models import Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.tests.test_recipe_api import create_recipe
+from recipe.caching import get_response_cache
+from recipe.renderers import FastJSONRenderer
+from recipe.views import RecipeView, TagView
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class FastListTest(QueryBudgetTestMixin, TestCase):
+    """Test the fast list responses match the serializer responses"""
+
+    def setUp(self):
+        """Setting up the test"""
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dinner = Tag.objects.create(user=self.user, name='Dînner')
+        create_recipe(self.user, title='Curry \u2028 "hot"', price=Decimal('12.5'), link='https://example.com/c')
+        create_recipe(self.user, title='Salad', description='Curry free', price=Decimal('0'))
+        for i in range(3):
+            recipe = create_recipe(self.user, title=f'Curry {i}', time_minutes=i)
+            recipe.tags.add(vegan, dinner)
+
+    def assertSameAsSerializer(self, url, params=None, view=RecipeView):
+        fast = self.client.get(url, params)
+        get_response_cache().clear()
+        with mock.patch.object(view, 'fast_list', False):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_list_matches_serializer(self):
+        """Test the fast list renders the same bytes"""
+        self.assertSameAsSerializer(RECIPE_URL)
+
+    def test_pages_match_serializer(self):
+        """Test the pages and their cursors are the same"""
+        res = self.assertSameAsSerializer(RECIPE_URL, {'page_size': 2})
+        self.assertSameAsSerializer(res.json()['next'])
+
+    def test_search_and_filters_match_serializer(self):
+        """Test ranked search pages and filters are the same"""
+        res = self.assertSameAsSerializer(RECIPE_URL, {'search': 'curry', 'page_size': 2})
+        self.assertSameAsSerializer(res.json()['next'])
+        self.assertSameAsSerializer(RECIPE_URL, {'time_minutes_max': 1, 'price_min': '1'})
+
+    def test_tags_match_serializer(self):
+        """Test the tag list is the same"""
+        self.assertSameAsSerializer(TAGS_URL, view=TagView)
+
+    def test_list_query_count(self):
+        """Test the fast list reads the page and its tags in one query each"""
+        with self.assertNumQueries(3):
+            self.client.get(RECIPE_URL)
+
+
+class FastJSONRendererTest(TestCase):
+    """Test the fast renderer matches the JSON renderer"""
+
+    def test_same_bytes(self):
+        """Test the output is the same for plain, unicode and special values"""
+        data = {
+            'title': 'Café \u2028 \u2029 </script> "q" \\ \n',
+            'price': Decimal('1.50'),
+            'date': datetime.date(2021, 1, 2),
+            'created': datetime.datetime(2021, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            'items': [1, None, True, {'nested': []}],
+            'big': 2 ** 70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        """Test indented output is rendered by the JSON renderer"""
+        data = {'a': [1, 2]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
@@ -0,0 +1,76 @@
+"""
+Tests for filtering recipes
+"""
+from decimal import Decimal
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.tests.test_recipe_api import create_recipe
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class RecipeFilterApiTest(QueryBudgetTestMixin, TestCase):
+    """Test filtering the recipe list"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dinner = Tag.objects.create(user=self.user, name='Dinner')
+        self.curry = create_recipe(self.user, title='Curry', time_minutes=40, price=Decimal('12.00'))
+        self.curry.tags.add(self.vegan, self.dinner)
+        self.salad = create_recipe(self.user, title='Salad', time_minutes=10, price=Decimal('4.50'))
+        self.salad.tags.add(self.vegan)
+        self.steak = create_recipe(self.user, title='Steak', time_minutes=25, price=Decimal('20.00'))
+        self.steak.tags.add(self.dinner)
+
+    def get_ids(self, **params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in res.data['results']}
+
+    def test_filter_any_of_tags(self):
+        """Test recipes with any of the tags are returned once"""
+        ids = self.get_ids(tags=f'{self.vegan.id},{self.dinner.id}')
+        self.assertEqual(ids, {self.curry.id, self.salad.id, self.steak.id})
+        res = self.client.get(RECIPE_URL, {'tags': f'{self.vegan.id},{self.dinner.id}'})
+        self.assertEqual(len(res.json()['results']), 3)
+
+    def test_filter_all_of_tags(self):
+        """Test only recipes with every tag are returned"""
+        ids = self.get_ids(tags_all=f'{self.vegan.id},{self.dinner.id}')
+        self.assertEqual(ids, {self.curry.id})
+
+    def test_filter_price_range(self):
+        """Test filtering by a price range"""
+        self.assertEqual(self.get_ids(price_min='5', price_max='15'), {self.curry.id})
+        self.assertEqual(self.get_ids(price_max='4.50'), {self.salad.id})
+
+    def test_filter_time_range(self):
+        """Test filtering by a cooking time range"""
+        self.assertEqual(self.get_ids(time_minutes_min=20), {self.curry.id, self.steak.id})
+        self.assertEqual(self.get_ids(time_minutes_min=20, time_minutes_max=30), {self.steak.id})
+
+    def test_filters_combine(self):
+        """Test filters are applied together"""
+        ids = self.get_ids(tags=self.dinner.id, time_minutes_max=30)
+        self.assertEqual(ids, {self.steak.id})
+
+    def test_invalid_filter(self):
+        """Test invalid filter values are rejected"""
+        res = self.client.get(RECIPE_URL, {'tags': 'a,b'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+        res = self.client.get(RECIPE_URL, {'price_min': 'cheap'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
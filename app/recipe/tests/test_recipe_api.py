@@ -2,12 +2,15 @@
 Tests for recipe api
 """
 from decimal import Decimal
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Recipe
+from core.models import Recipe, Tag
+from core.testing import QueryBudgetTestMixin
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
@@ -32,7 +35,7 @@ def get_recipe_detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
-class PublicRecipeApiTest(TestCase):
+class PublicRecipeApiTest(QueryBudgetTestMixin, TestCase):
     """Test the recipe API (public)"""
 
     def setUp(self):
@@ -62,7 +65,7 @@ class PublicRecipeApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTest(TestCase):
+class PrivateRecipeApiTest(QueryBudgetTestMixin, TestCase):
     """Test the recipe API (private)"""
 
     def setUp(self):
@@ -84,7 +87,7 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # import pdb
         # pdb.set_trace()
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrieve_recipes_limited_to_user(self):
         """Test retrieving recipes for user"""
@@ -98,8 +101,8 @@ class PrivateRecipeApiTest(TestCase):
         recipes = Recipe.objects.filter(user=self.user).order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test getting recipe detail"""
@@ -186,3 +189,276 @@ class PrivateRecipeApiTest(TestCase):
         url = get_recipe_detail_url(recipe.id)
         res = self.client.delete(url)
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class RecipePaginationTest(QueryBudgetTestMixin, TestCase):
+    """Test the keyset pagination of the recipe list"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+    def test_pages_follow_next_cursor(self):
+        """Test walking the pages returns every recipe once in order"""
+        ids = []
+        url = RECIPE_URL + '?page_size=2'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data['results']), 2)
+            ids.extend(item['id'] for item in res.data['results'])
+            url = res.data['next']
+        self.assertEqual(ids, sorted((r.id for r in self.recipes), reverse=True))
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Test the previous link goes back to the same page"""
+        first = self.client.get(RECIPE_URL, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(first.data['previous'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_deep_page_does_not_use_offset(self):
+        """Test a page is selected by a seek filter rather than an offset"""
+        first = self.client.get(RECIPE_URL, {'page_size': 2})
+        # the collection version for the ETag, the page and its tags
+        with self.assertNumQueries(3) as ctx:
+            self.client.get(first.data['next'])
+        sql = ctx.captured_queries[1]['sql'].upper()
+        self.assertNotIn('OFFSET', sql)
+
+    @override_settings(RECIPE_PAGE_SIZE=3, RECIPE_MAX_PAGE_SIZE=4)
+    def test_page_size_is_configurable(self):
+        """Test the default and maximum page sizes come from settings"""
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 3)
+        res = self.client.get(RECIPE_URL, {'page_size': 100})
+        self.assertEqual(len(res.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor returns 404"""
+        res = self.client.get(RECIPE_URL, {'cursor': 'not-a-cursor'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class RecipeBulkApiTest(QueryBudgetTestMixin, TestCase):
+    """Test the bulk recipe endpoint"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def bulk_payload(self, count):
+        return [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10 + i,
+                'price': '5.00',
+                'description': 'Bulk recipe',
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """Test creating many recipes at once"""
+        res = self.client.post(BULK_URL, self.bulk_payload(10), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 10)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 10)
+        self.assertEqual({r.id for r in recipes}, {item['id'] for item in res.data})
+
+    @skipUnlessDBFeature('can_return_rows_from_bulk_insert')
+    def test_bulk_create_single_insert(self):
+        """Test the recipes are created with one insert"""
+        # including one collection version bump for the whole batch
+        with self.assertNumQueries(5):
+            res = self.client.post(BULK_URL, self.bulk_payload(10), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_create_returns_item_errors(self):
+        """Test invalid items are reported and nothing is created"""
+        payload = [
+            {'title': 'Good', 'time_minutes': 5, 'price': '1.00', 'description': 'ok'},
+            {'title': 'Bad', 'time_minutes': 'soon', 'price': '1.00', 'description': 'ok'},
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'][0], {})
+        self.assertIn('time_minutes', res.data['errors'][1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_requires_list(self):
+        """Test the bulk endpoint rejects a single object"""
+        res = self.client.post(BULK_URL, {'title': 'One'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update(self):
+        """Test updating many recipes at once"""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+        payload = [{'id': r.id, 'title': f'New {r.id}'} for r in recipes]
+        res = self.client.patch(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.title, f'New {recipe.id}')
+
+    def test_bulk_update_other_users_recipe(self):
+        """Test recipes of other users can't be updated"""
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        own = create_recipe(user=self.user)
+        other = create_recipe(user=user2)
+        payload = [{'id': own.id, 'title': 'Mine'}, {'id': other.id, 'title': 'Theirs'}]
+        res = self.client.patch(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'][0], {})
+        self.assertIn('id', res.data['errors'][1])
+        own.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(own.title, 'Sample Recipe')
+        self.assertEqual(other.title, 'Sample Recipe')
+
+    def test_bulk_delete(self):
+        """Test deleting many recipes at once"""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+        keep = create_recipe(user=self.user)
+        res = self.client.delete(BULK_URL, [r.id for r in recipes], format='json')
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Recipe.objects.values_list('id', flat=True)), [keep.id])
+
+    def test_bulk_delete_unknown_id(self):
+        """Test deleting unknown ids reports them and deletes nothing"""
+        recipe = create_recipe(user=self.user)
+        res = self.client.delete(BULK_URL, [recipe.id, recipe.id + 100], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'][0], {})
+        self.assertIn('id', res.data['errors'][1])
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+
+class RecipeTagsApiTest(QueryBudgetTestMixin, TestCase):
+    """Test reading and writing the tags of recipes"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_create_recipe_with_tags(self):
+        """Test creating a recipe creates the missing tags"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': '7.50',
+            'description': 'Spicy',
+            'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(sorted(recipe.tags.values_list('name', flat=True)), ['Dinner', 'Vegan'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_query_count_independent_of_tags(self):
+        """Test tags are resolved with a constant number of queries"""
+        def create(names):
+            payload = {
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': '7.50',
+                'description': 'Spicy',
+                'tags': [{'name': name} for name in names],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(RECIPE_URL, payload, format='json')
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create(['a']), create([str(i) for i in range(20)]))
+
+    def test_update_recipe_tags(self):
+        """Test updating the tags of a recipe replaces them"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        res = self.client.patch(
+            get_recipe_detail_url(recipe.id),
+            {'tags': [{'name': 'New'}]},
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data['tags']], ['New'])
+        self.assertEqual(list(recipe.tags.values_list('name', flat=True)), ['New'])
+
+    def test_tags_are_per_user(self):
+        """Test tags of other users are never attached"""
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        Tag.objects.create(user=user2, name='Vegan')
+        res = self.client.post(RECIPE_URL, {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': '7.50',
+            'description': 'Spicy',
+            'tags': [{'name': 'Vegan'}],
+        }, format='json')
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.get().user, self.user)
+
+    def test_list_query_count_independent_of_recipes(self):
+        """Test listing recipes with tags doesn't query per recipe"""
+        for i in range(10):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}'),
+                Tag.objects.create(user=self.user, name=f'Other {i}'),
+            )
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertTrue(all(len(item['tags']) == 2 for item in res.data['results']))
+
+    def test_bulk_create_with_tags(self):
+        """Test the bulk endpoint links tags in bulk"""
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'description': 'Bulk recipe',
+                'tags': [{'name': 'Shared'}, {'name': f'Own {i}'}],
+            }
+            for i in range(5)
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(Tag.objects.get(name='Shared').recipe_set.count(), 5)
+
+    def test_bulk_update_tags(self):
+        """Test the bulk endpoint replaces tags without loading the user of the recipes"""
+        recipes = [create_recipe(user=self.user) for _i in range(3)]
+        recipes[0].tags.add(Tag.objects.create(user=self.user, name='Old'))
+        payload = [{'id': recipe.id, 'tags': [{'name': 'Shared'}]} for recipe in recipes]
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(all(item['tags'] == [{'id': item['tags'][0]['id'], 'name': 'Shared'}] for item in res.data))
+        self.assertEqual(Tag.objects.get(name='Shared').recipe_set.count(), 3)
+        self.assertFalse([query for query in ctx.captured_queries if 'FROM "core_user"' in query['sql']])
@@ -0,0 +1,101 @@
+"""
+Tests for searching recipes
+"""
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe
+from core.testing import QueryBudgetTestMixin
+from recipe.tests.test_recipe_api import create_recipe
+from recipe.search import SimpleSearchBackend
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class RecipeSearchApiTest(QueryBudgetTestMixin, TestCase):
+    """Test the ?search= parameter of the recipe list"""
+
+    def setUp(self):
+        """Setting up the test"""
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, terms, **params):
+        res = self.client.get(RECIPE_URL, {'search': terms, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_search_title_and_description(self):
+        """Test words are matched in the title and the description"""
+        curry = create_recipe(self.user, title='Chickpea curry')
+        soup = create_recipe(self.user, title='Soup', description='Creamy curry soup')
+        create_recipe(self.user, title='Pancakes', description='Sweet')
+        res = self.search('curry')
+        self.assertEqual({item['id'] for item in res.data['results']}, {curry.id, soup.id})
+
+    def test_title_match_ranks_first(self):
+        """Test a match in the title ranks above one in the description"""
+        soup = create_recipe(self.user, title='Soup', description='Creamy curry soup')
+        curry = create_recipe(self.user, title='Chickpea curry', description='Hot')
+        res = self.search('curry')
+        self.assertEqual([item['id'] for item in res.data['results']], [curry.id, soup.id])
+
+    def test_search_limited_to_user(self):
+        """Test recipes of other users are not searched"""
+        user2 = get_user_model().objects.create_user('test2@example.com', 'pass1234')
+        create_recipe(user2, title='Chickpea curry')
+        res = self.search('curry')
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_is_paginated(self):
+        """Test ranked results are split in pages"""
+        for i in range(5):
+            create_recipe(self.user, title=f'Curry {i}')
+        ids = []
+        res = self.search('curry', page_size=2)
+        while True:
+            ids.extend(item['id'] for item in res.data['results'])
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_updated_recipe_is_searchable(self):
+        """Test the search document follows updates"""
+        recipe = create_recipe(self.user, title='Pancakes')
+        recipe.title = 'Curry pancakes'
+        recipe.save()
+        res = self.search('curry')
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe.id])
+
+
+class SimpleSearchBackendTest(TestCase):
+    """Test the search fallback used without postgres"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com',
+            'pass1234'
+        )
+
+    def test_all_words_must_match(self):
+        """Test every word has to appear in the recipe"""
+        both = create_recipe(self.user, title='Chickpea curry', description='Spicy')
+        create_recipe(self.user, title='Chickpea salad', description='Fresh')
+        results = SimpleSearchBackend().search(Recipe.objects.all(), 'chickpea spicy')
+        self.assertEqual(list(results), [both])
+
+    def test_rank_prefers_title(self):
+        """Test title matches are ranked above description matches"""
+        soup = create_recipe(self.user, title='Soup', description='Curry soup')
+        curry = create_recipe(self.user, title='Curry', description='Hot')
+        results = SimpleSearchBackend().search(Recipe.objects.all(), 'curry').order_by('-rank')
+        self.assertEqual(list(results), [curry, soup])
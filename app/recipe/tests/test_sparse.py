@@ -0,0 +1,104 @@
+"""
+Tests for the sparse fieldsets of the recipe API
+"""
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.tests.test_recipe_api import get_recipe_detail_url
+from recipe.views import RecipeView
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+POPULAR_TAGS_URL = reverse('recipe:tag-popular')
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsetTests(QueryBudgetTestMixin, TestCase):
+    """Test `?fields=` returns and loads only the requested fields"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(3):
+            self.recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=i, price=Decimal('5.00'),
+                description='Long description ' * 100,
+            )
+            self.recipe.tags.add(vegan)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+        return res, ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_list_fields(self):
+        """Test the list returns the fields and skips the tags query"""
+        res, sql = self.get(RECIPE_URL, {'fields': 'title,id'})
+        self.assertEqual(list(res.data['results'][0]), ['id', 'title'])
+        self.assertNotIn('price', sql)
+        self.assertNotIn('core_tag', sql)
+
+    def test_list_same_without_fast_path(self):
+        """Test the fast path and the serializer return the same fields"""
+        fast = self.client.get(RECIPE_URL, {'fields': 'id,price,tags'})
+        with mock.patch.object(RecipeView, 'fast_list', False):
+            slow, sql = self.get(RECIPE_URL, {'fields': 'id,price,tags'})
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(list(slow.data['results'][0]), ['id', 'price', 'tags'])
+        self.assertNotIn('"title"', sql)
+
+    def test_detail_skips_description(self):
+        """Test the detail only reads the requested columns"""
+        res, sql = self.get(get_recipe_detail_url(self.recipe.id), {'fields': 'id,title'})
+        self.assertEqual(res.data, {'id': self.recipe.id, 'title': 'Curry 2'})
+        self.assertNotIn('description', sql)
+        self.assertNotIn('core_tag', sql)
+        res, sql = self.get(get_recipe_detail_url(self.recipe.id), {'fields': 'description,tags'})
+        self.assertEqual(list(res.data), ['tags', 'description'])
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegan')
+
+    def test_pages_keep_fields(self):
+        """Test the next page link keeps the fields"""
+        res, _sql = self.get(RECIPE_URL, {'fields': 'title', 'page_size': 2})
+        self.assertIn('fields=title', res.data['next'])
+        res = self.client.get(res.data['next'])
+        self.assertEqual(res.data['results'], [{'title': 'Curry 0'}])
+
+    def test_search_with_fields(self):
+        res, _sql = self.get(RECIPE_URL, {'fields': 'title', 'search': 'curry'})
+        self.assertEqual(len(res.data['results']), 3)
+
+    def test_unknown_field(self):
+        """Test unknown and write only fields are rejected"""
+        res = self.client.get(RECIPE_URL, {'fields': 'id,user,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret, user', res.data['fields'][0])
+
+    def test_writes_use_every_field(self):
+        """Test the fields parameter doesn't drop input or output of writes"""
+        res = self.client.patch(get_recipe_detail_url(self.recipe.id) + '?fields=id', {'title': 'Renamed'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Renamed')
+        self.assertIn('description', res.data)
+
+    def test_tag_fields(self):
+        """Test the tag list and the popular tags take fields as well"""
+        res, sql = self.get(TAGS_URL, {'fields': 'name'})
+        self.assertEqual(res.data, [{'name': 'Vegan'}])
+        self.assertNotIn('"core_tag"."usage"', sql)
+        res, _sql = self.get(POPULAR_TAGS_URL, {'fields': 'name,usage'})
+        self.assertEqual(res.data, [{'name': 'Vegan', 'usage': 3}])
@@ -0,0 +1,159 @@
+"""
+Tests for the recipe statistics
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeStats, RecipeStatsBucket, Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.stats import price_histogram, time_summary
+from recipe.tests.test_recipe_api import create_recipe
+
+
+STATS_URL = reverse('recipe:recipe-stats')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class RecipeStatsMaintenanceTests(TestCase):
+    """Test the statistics follow every recipe write"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+
+    def assertInSync(self):
+        self.assertEqual(RecipeStats.objects.stored(), RecipeStats.objects.live())
+
+    def test_create_update_delete(self):
+        """Test saving and deleting recipes moves them between buckets"""
+        recipe = create_recipe(self.user, time_minutes=10, price=Decimal('4.99'))
+        create_recipe(self.user, time_minutes=10, price=Decimal('120.00'))
+        stats = RecipeStats.objects.stored()[self.user.id]
+        self.assertEqual(stats['recipe_count'], 2)
+        self.assertEqual(stats['time_minutes_total'], 20)
+        self.assertEqual(stats[RecipeStatsBucket.TIME], {10: 2})
+        self.assertEqual(stats[RecipeStatsBucket.PRICE], {0: 1, 10000: 1})
+
+        recipe.time_minutes = 30
+        recipe.price = Decimal('5.00')
+        recipe.save()
+        stats = RecipeStats.objects.stored()[self.user.id]
+        self.assertEqual(stats[RecipeStatsBucket.TIME], {10: 1, 30: 1})
+        self.assertEqual(stats[RecipeStatsBucket.PRICE], {500: 1, 10000: 1})
+        self.assertInSync()
+
+        recipe.delete()
+        self.assertEqual(RecipeStats.objects.stored()[self.user.id]['recipe_count'], 1)
+        self.assertInSync()
+
+    def test_bulk_writes(self):
+        """Test queryset updates and deletes, which skip the signals, are counted"""
+        other = get_user_model().objects.create_user('other@example.com', 'pass1234')
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'Recipe {i}', time_minutes=i, price=Decimal(i)) for i in range(1, 8)
+        ])
+        create_recipe(other, time_minutes=5, price=Decimal('1.00'))
+        Recipe.objects.filter(time_minutes__lt=3).update(time_minutes=60, price=Decimal('60.00'))
+        self.assertInSync()
+        Recipe.objects.filter(user=self.user, time_minutes=60).update(user=other)
+        self.assertInSync()
+        Recipe.objects.filter(time_minutes__gt=5).delete()
+        self.assertInSync()
+        self.assertEqual(RecipeStats.objects.stored()[self.user.id]['recipe_count'], 3)
+
+    def test_user_deleted(self):
+        """Test the statistics of a deleted user are removed"""
+        create_recipe(self.user, time_minutes=5, price=Decimal('1.00'))
+        self.user.delete()
+        self.assertFalse(RecipeStats.objects.exists())
+        self.assertFalse(RecipeStatsBucket.objects.exists())
+
+
+class RecipeStatsSummaryTests(TestCase):
+    """Test the summaries computed from the buckets"""
+
+    def test_time_summary(self):
+        """Test the median of odd and even counts"""
+        self.assertEqual(time_summary(3, 25, {5: 2, 15: 1}), {'average': 8.33, 'median': 5})
+        self.assertEqual(time_summary(4, 45, {5: 2, 15: 1, 20: 1}), {'average': 11.25, 'median': 10})
+        self.assertEqual(time_summary(0, 0, {}), {'average': None, 'median': None})
+
+    def test_price_histogram(self):
+        """Test every bucket is listed and the last one is open"""
+        histogram = price_histogram({0: 2, 10000: 1})
+        self.assertEqual(len(histogram), 6)
+        self.assertEqual(histogram[0], {'min': '0.00', 'max': '5.00', 'count': 2})
+        self.assertEqual(histogram[1]['count'], 0)
+        self.assertEqual(histogram[-1], {'min': '100.00', 'max': None, 'count': 1})
+
+
+class PublicRecipeStatsApiTests(TestCase):
+    """Test unauthenticated statistics requests"""
+
+    def test_auth_required(self):
+        res = APIClient().get(STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class PrivateRecipeStatsApiTests(QueryBudgetTestMixin, TestCase):
+    """Test the statistics endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@example.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stats(self):
+        """Test the totals, histogram and tags of the user only"""
+        vegan, dessert = Tag.objects.get_or_create_many(self.user, ['Vegan', 'Dessert'])
+        create_recipe(self.user, time_minutes=10, price=Decimal('3.00')).tags.add(vegan, dessert)
+        create_recipe(self.user, time_minutes=20, price=Decimal('12.00')).tags.add(vegan)
+        create_recipe(self.user, time_minutes=60, price=Decimal('12.50'))
+        other = get_user_model().objects.create_user('other@example.com', 'pass1234')
+        create_recipe(other, time_minutes=1, price=Decimal('1.00'))
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['time_minutes'], {'average': 30, 'median': 20})
+        self.assertEqual([bucket['count'] for bucket in res.data['price_histogram']], [1, 0, 2, 0, 0, 0])
+        self.assertEqual(res.data['tags'], [
+            {'id': vegan.id, 'name': 'Vegan', 'recipe_count': 2},
+            {'id': dessert.id, 'name': 'Dessert', 'recipe_count': 1},
+        ])
+
+    def test_no_recipes(self):
+        """Test a user without recipes gets empty statistics"""
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertEqual(res.data['time_minutes'], {'average': None, 'median': None})
+        self.assertEqual(res.data['tags'], [])
+
+    def test_queries_independent_of_recipes(self):
+        """Test the statistics are read without scanning the recipes"""
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'Recipe {i}', time_minutes=i % 7, price=Decimal(i)) for i in range(50)
+        ])
+        with self.assertNumQueries(4):
+            res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 50)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_cached_until_recipes_change(self):
+        """Test a bulk write makes the cached statistics stale"""
+        create_recipe(self.user, time_minutes=5, price=Decimal('1.00'))
+        self.assertEqual(self.client.get(STATS_URL)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(STATS_URL)['X-Cache'], 'HIT')
+        res = self.client.post(
+            BULK_URL, [{'title': 'Soup', 'time_minutes': 15, 'price': '2.00', 'description': 'Hot'}], format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.json()['recipe_count'], 2)
@@ -3,8 +3,10 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Tag
-from recipe.serializers import TagSerializer
+from core.models import Recipe, Tag
+from core.testing import QueryBudgetTestMixin
+from recipe.serializers import TagUsageSerializer
+from recipe.tests.test_recipe_api import create_recipe
 
 
 def create_tag(user, name=None):
@@ -16,9 +18,16 @@ def create_tag(user, name=None):
 
 # import pdb; pdb.set_trace()
 TAGS_URL = reverse('recipe:tag-list')
+POPULAR_TAGS_URL = reverse('recipe:tag-popular')
+RECIPE_URL = reverse('recipe:recipe-list')
 
 
-class PublicTagTesting(TestCase):
+def usage(tag):
+    tag.refresh_from_db()
+    return tag.usage
+
+
+class PublicTagTesting(QueryBudgetTestMixin, TestCase):
     """Test the publicly available tag API"""
 
     def setUp(self):
@@ -30,7 +39,7 @@ class PublicTagTesting(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagTesting(TestCase):
+class PrivateTagTesting(QueryBudgetTestMixin, TestCase):
     """Test the authorized user tag API"""
 
     def setUp(self):
@@ -48,5 +57,71 @@ class PrivateTagTesting(TestCase):
         res = self.client.get(TAGS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         tags = Tag.objects.all().order_by('-name')
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagUsageSerializer(tags, many=True)
         self.assertEqual(res.data, serializer.data)
+
+    def test_usage_follows_links(self):
+        """Test the usage counts follow links added, removed and deleted"""
+        vegan, dessert = create_tag(self.user, 'Vegan'), create_tag(self.user, 'Dessert')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(vegan, dessert)
+        create_recipe(self.user).tags.add(vegan)
+        self.assertEqual((usage(vegan), usage(dessert)), (2, 1))
+        recipe.tags.remove(dessert)
+        self.assertEqual((usage(vegan), usage(dessert)), (2, 0))
+        recipe.delete()
+        self.assertEqual(usage(vegan), 1)
+        Recipe.objects.filter(user=self.user).delete()
+        self.assertEqual(usage(vegan), 0)
+
+    def test_usage_follows_api_writes(self):
+        """Test links written by the recipe API are counted, bulk ones included"""
+        payload = {'title': 'Soup', 'time_minutes': 5, 'price': '1.00', 'description': 'Hot',
+                   'tags': [{'name': 'Vegan'}, {'name': 'Winter'}]}
+        self.client.post(RECIPE_URL, payload, format='json')
+        self.client.post(reverse('recipe:recipe-bulk'), [payload, {**payload, 'tags': [{'name': 'Vegan'}]}],
+                         format='json')
+        tags = dict(Tag.objects.filter(user=self.user).values_list('name', 'usage'))
+        self.assertEqual(tags, {'Vegan': 3, 'Winter': 2})
+
+    def test_save_keeps_usage(self):
+        """Test saving a tag loaded before its links changed keeps the count"""
+        tag = create_tag(self.user)
+        create_recipe(self.user).tags.add(tag)
+        tag.name = 'Renamed'
+        tag.save()
+        tag.refresh_from_db()
+        self.assertEqual((tag.name, tag.usage), ('Renamed', 1))
+
+    def test_order_by_usage(self):
+        """Test ordering the tags by usage, ties by name"""
+        tags = [create_tag(self.user, name) for name in ('A', 'B', 'C')]
+        create_recipe(self.user).tags.add(*tags[1:])
+        create_recipe(self.user).tags.add(tags[2])
+        res = self.client.get(TAGS_URL, {'ordering': '-usage'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([(tag['name'], tag['usage']) for tag in res.json()], [('C', 2), ('B', 1), ('A', 0)])
+        res = self.client.get(TAGS_URL, {'ordering': 'usage'})
+        self.assertEqual([tag['name'] for tag in res.json()], ['A', 'B', 'C'])
+
+    def test_popular_tags(self):
+        """Test the most used tags are returned first, unused ones never"""
+        tags = [create_tag(self.user, name) for name in ('A', 'B', 'C', 'D')]
+        create_recipe(self.user).tags.add(*tags[:3])
+        create_recipe(self.user).tags.add(*tags[1:3])
+        create_recipe(self.user).tags.add(tags[2])
+        other = get_user_model().objects.create_user('other@example.com', 'pass1234')
+        create_recipe(other).tags.add(create_tag(other, 'A'))
+        res = self.client.get(POPULAR_TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([(tag['name'], tag['usage']) for tag in res.json()], [('C', 3), ('B', 2), ('A', 1)])
+        # the collection version and the tags, no count
+        self.assertQueryStats(res, queries=2)
+        res = self.client.get(POPULAR_TAGS_URL, {'limit': 2})
+        self.assertEqual([tag['name'] for tag in res.json()], ['C', 'B'])
+
+    def test_popular_tags_invalid_limit(self):
+        """Test the limit is validated"""
+        for limit in ('0', '101', 'x'):
+            res = self.client.get(POPULAR_TAGS_URL, {'limit': limit})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
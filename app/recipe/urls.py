@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from recipe import views
+from recipe.async_views import async_read_urls
 
 
 router = DefaultRouter()
@@ -11,5 +13,6 @@ router.register('tags', views.TagView)
 app_name = 'recipe'
 # import pdb; pdb.set_trace()
 urlpatterns = [
-    path('', include(router.urls))
+    path('stats/', views.RecipeStatsView.as_view({'get': 'list'}), name='recipe-stats'),
+    path('', include(async_read_urls(router.urls) if settings.ASYNC_READ_VIEWS else router.urls))
 ]
@@ -2,24 +2,52 @@
 Views for recipe app
 """
 
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext as _
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from core.models import Recipe, Tag
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, TagSerializer
+from core.authentication import CachedTokenAuthentication
+from core.models import CollectionVersion, Recipe, Tag
+from recipe.caching import ConditionalGetMixin, ResponseCacheMixin, get_response_cache_stats
+from recipe.export import iter_recipe_rows
+from recipe.fastpath import FastListMixin
+from recipe.filters import PopularTagsSerializer, RecipeFilter, TagOrderingFilter
+from recipe.pagination import KeysetPagination
+from recipe.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from recipe.search import RecipeSearchFilter
+from recipe.sparse import SparseFieldsetMixin
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, TagUsageSerializer, tags_prefetch
+from recipe.stats import get_recipe_stats
 
 
-class RecipeView(viewsets.ModelViewSet):
+class RecipeView(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsetMixin, FastListMixin,
+                 viewsets.ModelViewSet):
     """Manage recipes in the database"""
     serializer_class = RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    # keyset pagination keeps deep pages as cheap as the first one
+    pagination_class = KeysetPagination
+    filter_backends = (RecipeFilter, RecipeSearchFilter)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by('-id').all()
+        # a single query loads the tags of the whole page
+        return self.queryset.filter(user=self.request.user).order_by('-id').defer(
+            'search_vector'
+        ).prefetch_related(tags_prefetch())
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -31,15 +59,159 @@ class RecipeView(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Create a new recipe"""
         # set the user to the authenticated user
-        serializer.save(user=self.request.user)
+        with CollectionVersion.objects.deferred():
+            serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        """Update a recipe, bumping the collection version once"""
+        with CollectionVersion.objects.deferred():
+            serializer.save()
 
-class TagView(mixins.ListModelMixin, viewsets.GenericViewSet):
+    @action(detail=False, methods=['get'], renderer_classes=(NDJSONRenderer, CSVRenderer))
+    def export(self, request):
+        """
+        Stream every recipe of the user as NDJSON or CSV.
+
+        The format is negotiated from the Accept header or `?format=`,
+        the list filters and search apply to the export as well.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = request.accepted_renderer
+        rows = iter_recipe_rows(queryset, getattr(settings, 'RECIPE_EXPORT_CHUNK_SIZE', 2000))
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = f'attachment; filename="recipes.{renderer.format}"'
+        return response
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create, update or delete many recipes in one transaction.
+
+        POST takes a list of recipes, PATCH a list of partial recipes with
+        their id and DELETE a list of recipe ids. Nothing is written unless
+        every item is valid, otherwise the errors are returned by position.
+        """
+        items = self._get_bulk_items(request)
+        if request.method == 'POST':
+            return self._bulk_create(items)
+        if request.method == 'PATCH':
+            return self._bulk_update(items)
+        return self._bulk_delete(items)
+
+    def _get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': [_('Expected a list of items.')]})
+        max_items = getattr(settings, 'RECIPE_BULK_MAX_ITEMS', 500)
+        if len(items) > max_items:
+            msg = _('Ensure this list has no more than %(max)d items.') % {'max': max_items}
+            raise ValidationError({'non_field_errors': [msg]})
+        return items
+
+    @staticmethod
+    def _get_bulk_id(value):
+        return value if type(value) is int else None
+
+    def _bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic(), CollectionVersion.objects.deferred():
+            serializer.save(user=self.request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _bulk_update(self, items):
+        ids = [self._get_bulk_id(item.get('id') if isinstance(item, dict) else None) for item in items]
+        found = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+        id_errors = [{} for _item in items]
+        seen = set()
+        for index, pk in enumerate(ids):
+            if pk not in found:
+                id_errors[index] = {'id': [_('Not found.')]}
+            elif pk in seen:
+                id_errors[index] = {'id': [_('Duplicate id.')]}
+            seen.add(pk)
+
+        instances = [found.get(pk) for pk in ids]
+        serializer = self.get_serializer(instances, data=items, many=True, partial=True)
+        errors = serializer.errors if not serializer.is_valid() else [{} for _item in items]
+        if isinstance(errors, dict):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        errors = [{**id_error, **error} for id_error, error in zip(id_errors, errors)]
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic(), CollectionVersion.objects.deferred():
+            serializer.save()
+        return Response(serializer.data)
+
+    def _bulk_delete(self, items):
+        ids = [self._get_bulk_id(pk) for pk in items]
+        found = set(
+            self.get_queryset().filter(id__in=[pk for pk in ids if pk is not None]).values_list('id', flat=True)
+        )
+        errors = [{} if pk in found else {'id': [_('Not found.')]} for pk in ids]
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic(), CollectionVersion.objects.deferred():
+            self.get_queryset().filter(id__in=found).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TagView(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsetMixin, FastListMixin,
+              mixins.ListModelMixin, viewsets.GenericViewSet):
     """Manage tags in the database"""
-    serializer_class = TagSerializer
+    serializer_class = TagUsageSerializer
     queryset = Tag.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    filter_backends = (TagOrderingFilter,)
+    ordering_fields = ('name', 'usage')
+    ordering = ('-name',)
+    conditional_actions = cached_actions = ('list', 'popular')
+    sparse_actions = ('list', 'popular')
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        return self.queryset.filter(user=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """
+        Return the most used tags of the user, `?limit=` of them.
+
+        Read from the maintained usage counts through the (user, usage)
+        index, no recipe is counted.
+        """
+        params = PopularTagsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        tags = self.prune_queryset(self.get_queryset().filter(usage__gt=0).order_by('-usage', 'name'))
+        tags = tags[:params.validated_data['limit']]
+        return Response(self.get_serializer(tags, many=True).data)
+
+
+class RecipeStatsView(ResponseCacheMixin, ConditionalGetMixin, viewsets.ViewSet):
+    """
+    Return the recipe count, the average and median cooking time, the
+    price histogram and the most used tags of the user.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    conditional_actions = cached_actions = ('list',)
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def list(self, request):
+        return Response(get_recipe_stats(request.user))
+
+
+class ResponseCacheMetricsView(APIView):
+    """Response cache hits and misses of the process serving the request, for staff"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response(get_response_cache_stats())
@@ -0,0 +1,58 @@
+"""
+Account deletion in the background
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from core import jobs
+from core.models import CollectionVersion, Recipe, Tag
+
+DELETE_ACCOUNT = 'user.delete_account'
+
+
+def get_batch_size():
+    return getattr(settings, 'ACCOUNT_DELETION_BATCH_SIZE', 500)
+
+
+def request_account_deletion(user):
+    """
+    Deactivate the user and queue the deletion of their account.
+
+    The user can't log in or use their tokens from now on, their recipes
+    and tags are deleted by the job a batch at a time, then the user.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+        return jobs.enqueue(DELETE_ACCOUNT, {'user_id': user.id}, progress={
+            'recipes_total': Recipe.objects.filter(user=user).count(),
+            'tags_total': Tag.objects.filter(user=user).count(),
+            'recipes_deleted': 0,
+            'tags_deleted': 0,
+        })
+
+
+@jobs.register(DELETE_ACCOUNT)
+def delete_account_step(job):
+    """
+    Delete the next batch of recipes or tags of the user, or the user.
+
+    Each batch is a small deletion for the collector, with the tag links
+    of the recipes, and holds its locks for one short transaction.
+    """
+    user_id = job.payload['user_id']
+    with CollectionVersion.objects.deferred():
+        for model, counter in ((Recipe, 'recipes_deleted'), (Tag, 'tags_deleted')):
+            ids = list(model.objects.filter(user_id=user_id).order_by('id').values_list('id', flat=True)[
+                :get_batch_size()
+            ])
+            if ids:
+                _total, deleted = model.objects.filter(id__in=ids).delete()
+                job.progress[counter] = job.progress.get(counter, 0) + deleted.get(model._meta.label, 0)
+                return False
+        # nothing left to collect but the tokens and permissions
+        get_user_model().objects.filter(id=user_id).delete()
+    return True
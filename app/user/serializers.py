@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers, authentication
 from django.utils.translation import gettext as _
 
+from core.models import Job
+from core.validators import is_valid_email
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the users object"""
@@ -27,6 +30,12 @@ class UserSerializer(serializers.ModelSerializer):
     # override the create function
     # validated_data is the data that has been validated and is correct from the Meta fields
 
+    def validate_email(self, value):
+        """Reject the addresses the user manager would refuse"""
+        if not is_valid_email(value):
+            raise serializers.ValidationError(_('Email address is not valid'), code='invalid')
+        return value
+
     def create(self, validated_data):
         """Create a new user with encrypted password and return it"""
         return get_user_model().objects.create_user(**validated_data)
@@ -34,12 +43,23 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Update current user, setting the password correctly and return it"""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        fields = list(validated_data)
         if password is not None:
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+            fields.append('password')
+        # only the changed columns, whatever else changed meanwhile is kept
+        if fields:
+            instance.save(update_fields=fields)
+        return instance
+
+
+class BulkUserSerializer(UserSerializer):
+    """Serializer for users created in bulk, emails are checked for the whole list at once"""
 
-        return user
+    class Meta(UserSerializer.Meta):
+        extra_kwargs = {**UserSerializer.Meta.extra_kwargs, 'email': {'validators': []}}
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -67,3 +87,12 @@ class AuthTokenSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code='authentication')
         attrs['user'] = user
         return attrs
+
+
+class AccountDeletionSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of an account deletion"""
+
+    class Meta:
+        model = Job
+        fields = ['id', 'status', 'progress', 'attempts', 'created_at', 'finished_at']
+        read_only_fields = fields
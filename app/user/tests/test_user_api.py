@@ -1,11 +1,20 @@
 """
 User API Tests
 """
-from django.test import TestCase
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from core.jobs import JobRunner
+from core.models import CollectionVersion, Job, Recipe, RecipeStats, Tag
+from core.testing import QueryBudgetTestMixin
+from user.deletion import delete_account_step
 
 
 CREATE_USER_URL = reverse('user:create')
@@ -16,6 +25,11 @@ TEST_USER_DETAILS = {
 }
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+BULK_URL = reverse('user:bulk')
+
+
+def deletion_url(job_id):
+    return reverse('user:deletion', args=[job_id])
 
 
 def create_user(**params):
@@ -23,7 +37,7 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
-class PublicUserApiTest(TestCase):
+class PublicUserApiTest(QueryBudgetTestMixin, TestCase):
     """Test the users API (public)"""
 
     def setUp(self):
@@ -48,6 +62,13 @@ class PublicUserApiTest(TestCase):
         res = self.client.post(CREATE_USER_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_user_invalid_email(self):
+        """Test emails the user manager refuses are a 400, not a server error"""
+        payload = {**TEST_USER_DETAILS, 'email': 'a/b@example.com'}
+        res = self.client.post(CREATE_USER_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', res.data)
+
     def test_password_too_short(self):
         """Test that password must be more than 8 characters"""
         payload = TEST_USER_DETAILS.copy()
@@ -78,13 +99,38 @@ class PublicUserApiTest(TestCase):
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(PASSWORD_HASHING_QUEUE=0)
+    def test_create_token_hashing_unavailable(self):
+        """Test logins answer 503 when the hashing pool is full"""
+        payload = TEST_USER_DETAILS.copy()
+        payload.pop('name')
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_create_token_upgrades_hash(self):
+        """Test logging in rehashes passwords of an older hasher"""
+        user = create_user(**TEST_USER_DETAILS)
+        user.password = make_password(TEST_USER_DETAILS['password'], hasher='md5')
+        user.save()
+        payload = TEST_USER_DETAILS.copy()
+        payload.pop('name')
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
     def test_retrive_user_unauthorized(self):
         """Test that authentication is required for users"""
         res = self.client.get(ME_URL)
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateUserApiTest(TestCase):
+class PrivateUserApiTest(QueryBudgetTestMixin, TestCase):
     """Test API requests that require authentication"""
 
     def setUp(self):
@@ -115,3 +161,128 @@ class PrivateUserApiTest(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+
+class BulkCreateUserApiTest(QueryBudgetTestMixin, TestCase):
+    """Test provisioning users in bulk"""
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser('admin@example.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def payload(self, count):
+        return [{'email': f'user{i}@example.com', 'password': f'pass{i}word', 'name': f'User {i}'}
+                for i in range(count)]
+
+    def test_admin_required(self):
+        """Test regular users can't provision users"""
+        self.client.force_authenticate(create_user(**TEST_USER_DETAILS))
+        res = self.client.post(BULK_URL, self.payload(1), format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_create(self):
+        """Test the users are created with a constant number of queries"""
+        # the ids are read back on backends not returning them from the insert
+        with self.assertNumQueries(5 if connection.features.can_return_rows_from_bulk_insert else 6):
+            res = self.client.post(BULK_URL, self.payload(20), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 20)
+        self.assertNotIn('password', res.data[0])
+        user = get_user_model().objects.get(email='user7@example.com')
+        self.assertTrue(user.check_password('pass7word'))
+        self.assertFalse(user.is_staff)
+
+    def test_errors_by_position(self):
+        """Test nothing is created when an item is invalid, taken or repeated"""
+        create_user(**TEST_USER_DETAILS)
+        payload = self.payload(2) + [
+            {**TEST_USER_DETAILS},
+            {'email': 'user0@EXAMPLE.COM', 'password': 'pass1234', 'name': 'Again'},
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'][:2], [{}, {}])
+        self.assertIn('email', res.data['errors'][2])
+        self.assertIn('email', res.data['errors'][3])
+        self.assertFalse(get_user_model().objects.filter(email='user1@example.com').exists())
+
+        res = self.client.post(BULK_URL, [{'email': 'a/b@example.com', 'password': 'short'}], format='json')
+        self.assertEqual(set(res.data['errors'][0]), {'email', 'password', 'name'})
+
+    @override_settings(USER_BULK_MAX_ITEMS=2)
+    def test_list_required_and_bounded(self):
+        res = self.client.post(BULK_URL, {'email': 'x@example.com'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(BULK_URL, self.payload(3), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AccountDeletionApiTest(QueryBudgetTestMixin, TestCase):
+    """Test deleting accounts in the background"""
+
+    def setUp(self):
+        self.user = create_user(**TEST_USER_DETAILS)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        for i in range(5):
+            recipe = Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=5, price=Decimal('2.00'))
+            recipe.tags.set(tags[:i % 3 + 1])
+        self.other = create_user(email='other@example.com', password='pass1234')
+        Recipe.objects.create(user=self.other, title='Kept', time_minutes=5, price=Decimal('2.00'))
+
+    def test_delete_deactivates_and_queues(self):
+        """Test the account is deactivated at once and its data left to the job"""
+        res = self.client.delete(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], Job.PENDING)
+        self.assertEqual(res.data['progress']['recipes_total'], 5)
+        self.assertEqual(res.data['progress']['tags_total'], 3)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        # the cached token is forgotten
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(ACCOUNT_DELETION_BATCH_SIZE=2)
+    def test_job_deletes_in_batches(self):
+        """Test the job deletes the recipes, then the tags, a batch per step, then the user"""
+        job = Job.objects.get(pk=self.client.delete(ME_URL).data['id'])
+        progress = []
+        while not delete_account_step(job):
+            progress.append((job.progress['recipes_deleted'], job.progress['tags_deleted']))
+        self.assertEqual(progress, [(2, 0), (4, 0), (5, 0), (5, 2), (5, 3)])
+        self.assertFalse(get_user_model().objects.filter(id=self.user.id).exists())
+
+    def test_job_run(self):
+        """Test the worker deletes the account and leaves the others"""
+        job_id = self.client.delete(ME_URL).data['id']
+        version = CollectionVersion.objects.get_version(self.user.id)
+        self.assertEqual(JobRunner().run_pending(), 1)
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.progress['recipes_deleted'], 5)
+        self.assertEqual(job.progress['tags_deleted'], 3)
+        self.assertFalse(get_user_model().objects.filter(id=self.user.id).exists())
+        self.assertFalse(Tag.objects.filter(user_id=self.user.id).exists())
+        self.assertFalse(Recipe.tags.through.objects.exists())
+        self.assertFalse(RecipeStats.objects.filter(user_id=self.user.id).exists())
+        self.assertGreater(CollectionVersion.objects.get_version(self.user.id), version)
+        self.assertEqual(Recipe.objects.get().user, self.other)
+
+    def test_deletion_progress_for_admins(self):
+        job_id = self.client.delete(ME_URL).data['id']
+        admin = get_user_model().objects.create_superuser('admin@example.com', 'pass1234')
+        client = APIClient()
+        client.force_authenticate(self.other)
+        res = client.get(deletion_url(job_id))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        client.force_authenticate(admin)
+        res = client.get(deletion_url(job_id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['progress']['recipes_deleted'], 0)
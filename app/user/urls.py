@@ -10,4 +10,6 @@ urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.AuthTokenView.as_view(), name='token'),
     path('me/', views.ManageUserView.as_view(), name='me'),
+    path('bulk/', views.BulkCreateUserView.as_view(), name='bulk'),
+    path('deletions/<int:pk>/', views.AccountDeletionView.as_view(), name='deletion'),
 ]
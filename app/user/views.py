@@ -1,7 +1,18 @@
 """user API views"""
 
-from rest_framework import generics, authentication, permissions
-from user.serializers import UserSerializer, AuthTokenSerializer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.utils.translation import gettext as _
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from core.authentication import CachedTokenAuthentication
+from core.models import Job
+from user.deletion import DELETE_ACCOUNT, request_account_deletion
+from user.serializers import AccountDeletionSerializer, BulkUserSerializer, UserSerializer, AuthTokenSerializer
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 # generics.CreateAPIView is a generic view that allows you to create an object in a database
@@ -20,12 +31,79 @@ class AuthTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         """Retrieve and return authenticated user"""
+        # the authenticated user may come from the token cache, load the
+        # current row, unsafe requests read it from the primary
         # only return email and name because password is write only
-        return self.request.user
+        return generics.get_object_or_404(get_user_model().objects, pk=self.request.user.pk)
+
+    @extend_schema(responses={202: AccountDeletionSerializer})
+    def delete(self, request, *args, **kwargs):
+        """
+        Deactivate the account now and delete it in the background.
+
+        Deleting a large account at once would load all of its recipes and
+        tags in one long transaction, the run_jobs worker deletes them a
+        batch at a time instead.
+        """
+        job = request_account_deletion(request.user)
+        return Response(AccountDeletionSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class AccountDeletionView(generics.RetrieveAPIView):
+    """Return the progress of an account deletion, for admins"""
+    serializer_class = AccountDeletionSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+    queryset = Job.objects.filter(kind=DELETE_ACCOUNT)
+
+
+class BulkCreateUserView(APIView):
+    """
+    Create a list of users in one request, for admins onboarding teams.
+
+    Nothing is created unless every user is valid and no email is taken
+    or repeated, otherwise the errors are returned by position.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(request=BulkUserSerializer(many=True), responses={201: BulkUserSerializer(many=True)})
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': [_('Expected a list of items.')]})
+        max_items = getattr(settings, 'USER_BULK_MAX_ITEMS', 1000)
+        if len(items) > max_items:
+            msg = _('Ensure this list has no more than %(max)d items.') % {'max': max_items}
+            raise ValidationError({'non_field_errors': [msg]})
+
+        serializer = BulkUserSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        manager = get_user_model().objects
+        emails = [manager.normalize_email(item['email']) for item in serializer.validated_data]
+        taken = set(manager.filter(email__in=emails).values_list('email', flat=True))
+        errors = [{} for _item in emails]
+        seen = set()
+        for index, email in enumerate(emails):
+            if email in taken:
+                errors[index] = {'email': [_('user with this email already exists.')]}
+            elif email in seen:
+                errors[index] = {'email': [_('Duplicate email.')]}
+            seen.add(email)
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            users = manager.bulk_create_users(serializer.validated_data)
+        except IntegrityError:
+            # an email was taken since it was checked
+            raise ValidationError({'non_field_errors': [_('An email was taken meanwhile, try again.')]})
+        return Response(BulkUserSerializer(users, many=True).data, status=status.HTTP_201_CREATED)